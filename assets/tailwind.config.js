@@ -0,0 +1,17 @@
+// Конфигурация сборки CSS (python manage.py build_assets).
+// content — где искать классы: всё, чего нет в шаблонах, в бандл не попадёт.
+// Классы, которые добавляются из JS, тоже должны встречаться в шаблонах целиком.
+module.exports = {
+    content: ['./users/templates/**/*.html', './static/js/**/*.js'],
+    // Тема переключается классом .dark на <html> (кнопка в шапке)
+    darkMode: 'class',
+    theme: {
+        extend: {
+            // Иначе класс font-sans на <body> перебивает font-family: 'Inter' из шаблонов
+            fontFamily: {
+                sans: ['Inter', 'ui-sans-serif', 'system-ui', 'sans-serif', '"Apple Color Emoji"', '"Segoe UI Emoji"'],
+            },
+        },
+    },
+    plugins: [],
+};
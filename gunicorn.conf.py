@@ -0,0 +1,54 @@
+import multiprocessing
+import os
+
+# --- GUNICORN: ПРОДАКШЕН-ПРОФИЛЬ ---
+# Запуск: gunicorn mg_project.wsgi:application -c gunicorn.conf.py (см. Procfile.txt)
+# Представления в основном ждут MySQL и Redis, поэтому воркеры — gthread:
+# несколько процессов, в каждом пул потоков. Пока один поток ждёт ответа БД,
+# другие обслуживают запросы, а процессов (и памяти) нужно меньше, чем с sync.
+# Каждый поток держит своё постоянное соединение с БД (DB_CONN_MAX_AGE в
+# settings): воркеров × потоков должно укладываться в max_connections MySQL.
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+
+worker_class = 'gthread'
+workers = int(os.environ.get('WEB_CONCURRENCY', min(multiprocessing.cpu_count() * 2 + 1, 8)))
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+
+# Приложение импортируется один раз в мастере до fork: воркеры стартуют быстрее
+# и делят страницы памяти с кодом Django (copy-on-write)
+preload_app = True
+
+# Перезапуск воркера после N запросов (со случайным разбросом, чтобы не все сразу) —
+# страховка от медленного роста памяти (Pillow, кэши шаблонов)
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 1000))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', 100))
+
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+graceful_timeout = 30
+# Keep-alive за балансировщиком: переиспользуем TCP-соединение с ним
+keepalive = 5
+
+accesslog = '-'
+errorlog = '-'
+loglevel = os.environ.get('GUNICORN_LOG_LEVEL', 'info')
+
+
+def post_fork(server, worker):
+    # Соединения с БД, открытые в мастере при импорте (preload_app), не должны
+    # достаться воркерам: один сокет MySQL в нескольких процессах — перепутанные ответы.
+    # Фоновые потоки (экспорт трасс, подписка на сброс кэша) создаются лениво,
+    # при первом запросе, — в мастере их ещё нет. Тяжёлая обработка (фото команды)
+    # идёт не в веб-воркерах, а в очереди заданий: её выполняет отдельный процесс
+    # manage.py run_jobs со своими соединениями с БД.
+    from django.db import connections
+    connections.close_all()
+
+
+def when_ready(server):
+    # С preload_app приложение уже загружено в мастере; загружаем и URLconf
+    # (все views и их импорты) — иначе его импортирует каждый воркер на первом
+    # запросе, в том числе перезапущенный по max_requests
+    if server.cfg.preload_app:
+        from django.urls import get_resolver
+        get_resolver().url_patterns
@@ -26,14 +26,20 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'users.middleware.TracingMiddleware',
+    'users.middleware.PerformanceMiddleware',
+    'users.query_budget.QueryBudgetMiddleware',
+    'users.db_router.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'users.middleware.LoginExemptMiddleware',
+    'users.middleware.ProfilerMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'users.middleware.TracingViewMiddleware',  # последним: спан только вокруг view
 ]
 
 ROOT_URLCONF = 'mg_project.urls'
@@ -57,6 +63,13 @@ TEMPLATES = [
 WSGI_APPLICATION = 'mg_project.wsgi.application'
 
 # Database — MySQL
+# Постоянные соединения: воркер держит соединение DB_CONN_MAX_AGE секунд и не
+# открывает новое (TCP + авторизация MySQL) на каждый запрос. Перед повторным
+# использованием Django проверяет его (CONN_HEALTH_CHECKS) — разорванное сервером
+# соединение заменяется новым, а не роняет запрос. Соединение держит каждый поток:
+# воркеров × потоков (gunicorn.conf.py) должно быть меньше max_connections MySQL,
+# а wait_timeout сервера — больше DB_CONN_MAX_AGE. 0 — соединение на запрос, как раньше.
+DB_CONN_MAX_AGE = int(os.environ.get('DB_CONN_MAX_AGE', 60))
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.mysql',
@@ -65,6 +78,8 @@ DATABASES = {
         'PASSWORD': 'Coffe.456',
         'HOST': '127.0.0.1',
         'PORT': '3306',
+        'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+        'CONN_HEALTH_CHECKS': True,
         'OPTIONS': {
             'init_command': "SET sql_mode='STRICT_TRANS_TABLES'",
             'charset': 'utf8mb4',
@@ -72,6 +87,21 @@ DATABASES = {
     }
 }
 
+# Реплика для чтения (необязательно): тот же MySQL-пользователь на другом хосте.
+# Чтение с неё — только в READ_REPLICA_VIEWS и в блоках users.db_router.replica_reads()
+if os.environ.get('DB_REPLICA_HOST'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'HOST': os.environ['DB_REPLICA_HOST'],
+        'PORT': os.environ.get('DB_REPLICA_PORT', '3306'),
+        'TEST': {'MIRROR': 'default'},
+    }
+DATABASE_ROUTERS = ['users.db_router.ReplicaRouter']
+# url name представлений, которые только читают и могут идти на реплику
+READ_REPLICA_VIEWS = ['tasks', 'user_list', 'reports']
+# Сколько секунд после записи пользователь читает с основной БД (отставание реплики)
+REPLICA_PIN_SECONDS = 5
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},
@@ -89,6 +119,21 @@ USE_TZ = True
 # Static files (CSS, JavaScript, Images)
 STATIC_URL = '/static/'
 STATICFILES_DIRS = [BASE_DIR / 'static']  # ← Правильно: BASE_DIR / 'static'
+# CSS-бандл, спрайт иконок и шрифты собирает python manage.py build_assets.
+# collectstatic кладёт в STATIC_ROOT файлы с хэшем в имени и копии .gz/.br;
+# в DEBUG статика отдаётся как есть из static/
+STATIC_ROOT = BASE_DIR / 'staticfiles'
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {
+        'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage' if DEBUG
+        else 'users.static_storage.CompressedManifestStaticFilesStorage',
+    },
+}
+# Отдавать STATIC_ROOT из Django без DEBUG (users.views.serve_static), если нет nginx
+SERVE_STATIC = True
+# Путь к автономному бинарнику Tailwind CLI (None — tailwindcss из PATH или npx)
+TAILWIND_CLI = None
 
 # Media files (avatars, uploads)
 MEDIA_URL = '/media/'
@@ -121,22 +166,151 @@ LOGIN_EXEMPT_URLS = [
     '^reset/[A-Za-z0-9_-]+/[A-Za-z0-9_-]+/$',
     '^reset/done/$',
     '^api/tasks/create/$',
+    '^api/telegram/login-token/$',
+    '^telegram-login/$',
     '^get-positions/',
 ]
 
+# Сессии: 'cached_db' — чтение из Redis (кэш 'default'), запись в БД как резерв.
+# Кэш 'default' — за предохранителем: при отключении Redis сессии читаются из БД,
+# а удалённые за это время (выход) стираются из Redis до возврата к нему, так что
+# старая копия сессии не «оживает»;
+# 'signed_cookies' — без хранилища на сервере (сессии маленькие: id пользователя,
+# pending_telegram_id); 'db' — как раньше, каждый запрос читает сессию из БД.
+SESSION_STRATEGY = os.environ.get('SESSION_STRATEGY', 'cached_db')
+SESSION_ENGINE = {
+    'db': 'django.contrib.sessions.backends.db',
+    'cached_db': 'django.contrib.sessions.backends.cached_db',
+    'signed_cookies': 'django.contrib.sessions.backends.signed_cookies',
+}[SESSION_STRATEGY]
+SESSION_CACHE_ALIAS = 'default'
+
+# Сообщения (messages) — сначала в cookie, чтобы не вызывать UPDATE сессии на каждое
+# уведомление; то, что не влезло в cookie (~4 КБ), — в сессию, а не молча теряется
+MESSAGE_STORAGE = 'django.contrib.messages.storage.fallback.FallbackStorage'
+
+# Telegram-бот: токен для API (заголовок Authorization) и срок жизни ссылок входа (сек)
+TELEGRAM_BOT_API_TOKEN = 'Token aB3dE9gH2jK4mN6pQ8rT1uV5wX7yZ0cF2vL9oPqRsTuVxYzAbCdEfGhIjKlMnOp'
+TELEGRAM_LOGIN_TOKEN_TTL = 600
+
+# Массовый импорт пользователей (users.onboarding): ссылка установки пароля живёт
+# PASSWORD_RESET_TIMEOUT, ссылка входа через Telegram — USER_INVITE_TTL (сек).
+# SITE_URL — адрес сайта для ссылок, которые печатает manage.py import_users
+PASSWORD_RESET_TIMEOUT = 60 * 60 * 24 * 3
+USER_INVITE_TTL = PASSWORD_RESET_TIMEOUT
+SITE_URL = os.environ.get('SITE_URL', 'http://127.0.0.1:8000')
+
+# Кэш: Redis за предохранителем (users.cache.CircuitBreakerCache).
+# При недоступности Redis запросы не ждут таймаутов, а идут в локальный кэш процесса.
 CACHES = {
     "default": {
+        "BACKEND": "users.cache.CircuitBreakerCache",
+        "TIMEOUT": 300,
+        "KEY_PREFIX": "mg_task",
+        "OPTIONS": {
+            "PRIMARY": "redis",
+            "FAILURE_THRESHOLD": 3,  # ошибок подряд до перехода на локальный кэш
+            "RESET_TIMEOUT": 30,     # как часто (сек) фоновый поток проверяет Redis
+        },
+    },
+    "redis": {
         "BACKEND": "django_redis.cache.RedisCache",
         "LOCATION": "redis://127.0.0.1:6379/1",
         "OPTIONS": {
             "CLIENT_CLASS": "django_redis.client.DefaultClient",
             "CONNECTION_POOL_KWARGS": {
-                "socket_connect_timeout": 5,
-                "socket_timeout": 5,
-                "retry_on_timeout": True,
+                "socket_connect_timeout": 0.5,
+                "socket_timeout": 0.5,
+                "retry_on_timeout": False,
             },
         },
         "TIMEOUT": 300,
         "KEY_PREFIX": "mg_task",
-    }
+    },
+}
+
+# Метрики запросов (users.middleware.PerformanceMiddleware): Server-Timing для
+# сотрудников, агрегаты по url name на /metrics/, лог медленных запросов (сек)
+PERFORMANCE_METRICS_ENABLED = True
+SLOW_REQUEST_THRESHOLD = 1.0
+
+# Бюджеты SQL-запросов по url name (users.query_budget). Превышение — предупреждение
+# в лог (или исключение при QUERY_BUDGET_STRICT); в DEBUG ещё и поиск N+1.
+# Значения — для холодного кэша справочников; проверяются тестами users/tests.py.
+QUERY_BUDGETS = {
+    'home': 7,  # 4 из них — виджеты при промахе кэша (users.dashboard)
+    'profile': 3,
+    'tasks': 5,
+    'user_list': 4,
+    'get_positions': 3,
+    'reports': 2,
+    'settings': 3,
+    'api_create_task': 4,
+}
+QUERY_BUDGET_STRICT = False
+QUERY_DETECT_N_PLUS_ONE = DEBUG
+
+# Профилирование запроса по флагу сотрудника (?_profile=1 или заголовок X-Profile);
+# профили — в админке «Профили запросов», хранятся последние PROFILER_KEEP
+PROFILER_ENABLED = True
+PROFILER_KEEP = 50
+
+# Виджеты главной страницы (users.dashboard): кэш на пользователя, сек.
+# Изменения задач и записей сбрасывают его сразу (версии в ключе кэша)
+DASHBOARD_CACHE_TIMEOUT = 60
+
+# Трассировка (users.tracing): доля запросов в выборке, экспорт в JSON-lines
+# файл ('jsonl') или в локальный OTLP/HTTP-коллектор ('otlp').
+# Файл поворачивается по размеру (байт, 0 — не поворачивать) с N старыми копиями
+TRACING_SAMPLE_RATE = 0.05
+TRACING_EXPORTER = 'jsonl'
+TRACING_JSONL_PATH = BASE_DIR / 'traces.jsonl'
+TRACING_JSONL_MAX_BYTES = 50 * 1024 * 1024
+TRACING_JSONL_BACKUPS = 3
+TRACING_OTLP_ENDPOINT = 'http://127.0.0.1:4318/v1/traces'
+TRACING_SERVICE_NAME = 'mg_project'
+
+# Фоновые задания (users.jobs): 'db' — таблица users.Job (брокер не нужен),
+# 'redis' — Redis кэша django_redis. Выполняет их python manage.py run_jobs
+JOB_QUEUE_BACKEND = os.environ.get('JOB_QUEUE_BACKEND', 'db')
+# Пул воркера: 'thread' (задания ждут БД/сеть) или 'process' (тяжёлый CPU)
+JOB_WORKER_POOL = 'thread'
+JOB_WORKER_CONCURRENCY = 4
+# Пауза опроса пустой очереди, сек
+JOB_POLL_INTERVAL = 1.0
+# Повторы: задержка JOB_RETRY_BASE_DELAY × 2^(попытка-1) сек, не больше JOB_RETRY_MAX_DELAY
+JOB_MAX_ATTEMPTS = 3
+JOB_RETRY_BASE_DELAY = 10
+JOB_RETRY_MAX_DELAY = 3600
+# Воркер продлевает блокировку своих заданий; не продлил за столько секунд — считается упавшим
+JOB_LOCK_TIMEOUT = 300
+# Сколько дней хранить выполненные и упавшие задания
+JOB_KEEP_FINISHED_DAYS = 7
+# Входные файлы заданий (загрузки до обработки) — общий каталог веб-процессов и воркера
+JOB_FILES_ROOT = BASE_DIR / 'job_files'
+
+# Логи: в каждой строке — trace_id запроса (см. X-Trace-Id в ответе)
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'filters': {
+        'trace_id': {'()': 'users.tracing.TraceIdFilter'},
+        'require_debug_false': {'()': 'django.utils.log.RequireDebugFalse'},
+    },
+    'formatters': {
+        'default': {'format': '%(asctime)s %(levelname)s [%(trace_id)s] %(name)s: %(message)s'},
+    },
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler', 'filters': ['trace_id'], 'formatter': 'default'},
+        'mail_admins': {
+            'level': 'ERROR',
+            'filters': ['require_debug_false'],
+            'class': 'django.utils.log.AdminEmailHandler',
+        },
+    },
+    'loggers': {
+        # Как в настройках Django по умолчанию, но с trace_id и без дублей через root
+        'django': {'handlers': ['console', 'mail_admins'], 'level': 'INFO', 'propagate': False},
+    },
+    'root': {'handlers': ['console'], 'level': 'INFO'},
 }
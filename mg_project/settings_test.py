@@ -0,0 +1,35 @@
+"""
+Настройки для тестов: две SQLite вместо MySQL — основная и реплика
+(отдельная БД без репликации: тесты маршрутизации кладут в неё свои данные
+и видят, откуда читало представление), локальный кэш вместо Redis.
+
+    python manage.py test --settings=mg_project.settings_test
+"""
+import tempfile
+from pathlib import Path
+
+from .settings import *  # noqa: F401,F403
+
+# Сами тесты идут в SQLite в памяти, но Django открывает и файлы NAME (проверки
+# до создания тестовых БД) — держим их во временном каталоге, а не в репозитории
+TEST_DB_DIR = Path(tempfile.gettempdir())
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': TEST_DB_DIR / 'mg_project_test_primary.sqlite3',
+    },
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': TEST_DB_DIR / 'mg_project_test_replica.sqlite3',
+    },
+}
+
+CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+}
+
+PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+
+# Трассы в тестах не пишем: иначе в корне репозитория копится traces.jsonl
+TRACING_SAMPLE_RATE = 0
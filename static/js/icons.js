@@ -0,0 +1,52 @@
+/*
+ * Иконки Lucide из локального спрайта (собирается командой build_assets).
+ * Заменяет lucide.createIcons(): <i data-lucide="name" class="..."> превращается
+ * в <svg class="lucide lucide-name ..."><use href="<спрайт>#name"></use></svg>.
+ * Повторный вызов пересоздаёт иконки, у которых поменяли data-lucide.
+ * Адрес спрайта (с хэшем в имени) — в атрибуте data-sprite у этого <script>.
+ */
+(function () {
+    'use strict';
+
+    var SVG_NS = 'http://www.w3.org/2000/svg';
+    var SPRITE = document.currentScript.getAttribute('data-sprite');
+    var DEFAULTS = {
+        width: '24', height: '24', viewBox: '0 0 24 24', fill: 'none', stroke: 'currentColor',
+        'stroke-width': '2', 'stroke-linecap': 'round', 'stroke-linejoin': 'round', 'aria-hidden': 'true'
+    };
+
+    function createIcon(element) {
+        var name = element.getAttribute('data-lucide');
+        var svg = document.createElementNS(SVG_NS, 'svg');
+        var key, i, attr;
+
+        for (key in DEFAULTS) {
+            svg.setAttribute(key, DEFAULTS[key]);
+        }
+        for (i = 0; i < element.attributes.length; i++) {
+            attr = element.attributes[i];
+            if (attr.name !== 'class') {
+                svg.setAttribute(attr.name, attr.value);
+            }
+        }
+        var classes = (element.getAttribute('class') || '').split(/\s+/).filter(function (cls) {
+            return cls && cls !== 'lucide' && cls.indexOf('lucide-') !== 0;
+        });
+        svg.setAttribute('class', ['lucide', 'lucide-' + name].concat(classes).join(' '));
+
+        var use = document.createElementNS(SVG_NS, 'use');
+        use.setAttribute('href', SPRITE + '#' + name);
+        svg.appendChild(use);
+        element.parentNode.replaceChild(svg, element);
+    }
+
+    function createIcons() {
+        var elements = document.querySelectorAll('[data-lucide]');
+        for (var i = 0; i < elements.length; i++) {
+            createIcon(elements[i]);
+        }
+    }
+
+    // Тот же интерфейс, что у библиотеки lucide: шаблоны вызывают lucide.createIcons()
+    window.lucide = {createIcons: createIcons};
+})();
@@ -1,3 +1,74 @@
-from django.contrib import admin
+from django import forms
+from django.contrib import admin, messages
+from django.contrib.admin.helpers import ActionForm
+from django.db import transaction
+from django.db.models import Count
 
-# Register your models here.
+from users.dashboard import bump_tasks_version
+from users.models import District
+
+from .models import Task
+
+
+class TaskActionForm(ActionForm):
+    """Панель действий: кроме выбора действия — новый статус и район для массовой смены"""
+    status = forms.ChoiceField(choices=[('', 'Статус…')] + Task.STATUS_CHOICES, required=False, label="")
+    district = forms.ModelChoiceField(
+        queryset=District.objects.order_by('name'), required=False, empty_label="Район…", label="",
+    )
+
+
+# === ЗАДАЧИ — для больших таблиц ===
+# Один запрос на страницу списка (район — JOIN, записавшиеся — COUNT в том же
+# запросе), без COUNT(*) по всей таблице, массовые действия — одним UPDATE.
+@admin.register(Task)
+class TaskAdmin(admin.ModelAdmin):
+    list_display = ('title', 'type', 'status', 'deadline', 'district', 'signup_count', 'is_overdue')
+    list_filter = ('status', 'type')
+    list_select_related = ('district',)
+    search_fields = ('title',)
+    date_hierarchy = 'deadline'
+    show_full_result_count = False
+    autocomplete_fields = ('district', 'users_signed_up')
+    action_form = TaskActionForm
+    actions = ['archive_tasks', 'change_status', 'reassign_district']
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(signup_count=Count('users_signed_up'))
+
+    @admin.display(description='Записалось', ordering='signup_count')
+    def signup_count(self, obj):
+        return obj.signup_count
+
+    # --- Массовые действия: UPDATE без сохранения каждого объекта ---
+    # post_save не вызывается — версию задач для виджетов главной сбрасываем сами
+
+    def bulk_update(self, queryset, **fields):
+        with transaction.atomic():
+            count = queryset.update(**fields)
+            transaction.on_commit(bump_tasks_version)
+        return count
+
+    @admin.action(description="Архивировать выбранные задачи", permissions=['change'])
+    def archive_tasks(self, request, queryset):
+        count = self.bulk_update(queryset, status='archived')
+        self.message_user(request, f"Архивировано задач: {count}")
+
+    @admin.action(description="Сменить статус (выбрать в поле «Статус»)", permissions=['change'])
+    def change_status(self, request, queryset):
+        status = request.POST.get('status')
+        if status not in dict(Task.STATUS_CHOICES):
+            self.message_user(request, "Выберите новый статус рядом со списком действий", messages.WARNING)
+            return
+        count = self.bulk_update(queryset, status=status)
+        self.message_user(request, f"Статус «{dict(Task.STATUS_CHOICES)[status]}» у задач: {count}")
+
+    @admin.action(description="Передать другому району (выбрать в поле «Район»)", permissions=['change'])
+    def reassign_district(self, request, queryset):
+        district_id = request.POST.get('district', '')
+        district = District.objects.filter(pk=district_id).first() if district_id.isdigit() else None
+        if district is None:
+            self.message_user(request, "Выберите район рядом со списком действий", messages.WARNING)
+            return
+        count = self.bulk_update(queryset, district=district)
+        self.message_user(request, f"Передано району «{district}» задач: {count}")
@@ -0,0 +1,137 @@
+import asyncio
+import json
+import random
+import time
+from datetime import date, timedelta
+from urllib.parse import urlsplit
+
+from .models import Task
+
+# --- ИМИТАЦИЯ TELEGRAM-БОТА ДЛЯ НАГРУЗОЧНЫХ ТЕСТОВ ---
+# Бот отправляет POST /api/tasks/create/ с токеном в Authorization и JSON задачи.
+# FakeBotClient делает то же самое поверх asyncio (без сторонних HTTP-библиотек),
+# чтобы нагрузку можно было дать без сети и без настоящего бота.
+
+CREATE_TASK_PATH = '/api/tasks/create/'
+LOADTEST_TITLE_PREFIX = '[loadtest] '
+
+# Сценарий → какой ответ считается правильным
+SCENARIOS = {
+    'single': 201,          # обычное создание задачи
+    'burst': 201,           # пачка одновременных созданий от одного руководителя
+    'invalid_token': 403,   # неверный токен бота
+    'unknown_user': 403,    # telegram_id, не привязанный к пользователю
+}
+
+
+class FakeBotClient:
+    """HTTP/1.1-клиент бота: одно соединение на запрос (как requests без сессии)"""
+
+    def __init__(self, base_url, token, timeout=30.0):
+        parts = urlsplit(base_url)
+        self.host = parts.hostname or '127.0.0.1'
+        self.port = parts.port or 80
+        self.token = token
+        self.timeout = timeout
+
+    def task_payload(self, telegram_id, rng):
+        task_type = rng.choice([code for code, _ in Task.TYPE_CHOICES])
+        deadline = date.today() + timedelta(days=rng.randint(1, 30))
+        payload = {
+            'title': f"{LOADTEST_TITLE_PREFIX}Задача {rng.randint(1, 10 ** 6)}",
+            'description': "Создано нагрузочным тестом",
+            'type': task_type,
+            'deadline': deadline.isoformat(),
+            'deadline_time': '18:00',
+            'created_by_telegram_id': telegram_id,
+        }
+        if rng.random() < 0.5:
+            payload['event_date'] = deadline.isoformat()
+            payload['event_time'] = '10:00'
+        return payload
+
+    async def create_task(self, payload, token=None):
+        """(HTTP-статус, тело ответа) — статус 0 при ошибке соединения/таймауте"""
+        body = json.dumps(payload, ensure_ascii=False).encode()
+        request = (
+            f"POST {CREATE_TASK_PATH} HTTP/1.1\r\n"
+            f"Host: {self.host}:{self.port}\r\n"
+            f"Authorization: {token if token is not None else self.token}\r\n"
+            "Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            "Connection: close\r\n\r\n"
+        ).encode() + body
+
+        try:
+            reader, writer = await asyncio.wait_for(asyncio.open_connection(self.host, self.port), self.timeout)
+        except (OSError, asyncio.TimeoutError) as e:
+            return 0, str(e)
+        try:
+            writer.write(request)
+            await writer.drain()
+            raw = await asyncio.wait_for(reader.read(), self.timeout)
+        except (OSError, asyncio.TimeoutError) as e:
+            return 0, str(e) or type(e).__name__
+        finally:
+            writer.close()
+
+        head, _, response_body = raw.partition(b'\r\n\r\n')
+        try:
+            status = int(head.split(b' ', 2)[1])
+        except (IndexError, ValueError):
+            return 0, 'Некорректный HTTP-ответ'
+        return status, response_body.decode(errors='replace')
+
+
+class LoadResult:
+    """Результаты по сценариям: задержки (мс) и коды ответов"""
+
+    def __init__(self):
+        self.latencies = {name: [] for name in SCENARIOS}
+        self.statuses = {name: {} for name in SCENARIOS}
+        self.errors = {name: 0 for name in SCENARIOS}
+        self.started = self.finished = None
+
+    def add(self, scenario, status, elapsed_ms):
+        self.latencies[scenario].append(elapsed_ms)
+        self.statuses[scenario][status] = self.statuses[scenario].get(status, 0) + 1
+        if status != SCENARIOS[scenario]:
+            self.errors[scenario] += 1
+
+
+async def run_load(client, telegram_ids, requests, concurrency, weights, burst_size, seed=None):
+    """
+    Отправляет requests запросов (сценарии — по весам weights) не более чем
+    concurrency одновременно. Сценарий burst отправляет burst_size запросов
+    одного пользователя разом и занимает столько же «слотов».
+    """
+    rng = random.Random(seed)
+    result = LoadResult()
+    semaphore = asyncio.Semaphore(concurrency)
+    unknown_id = max(telegram_ids) + 1_000_000
+
+    async def send(scenario, payload, token=None):
+        async with semaphore:
+            started = time.perf_counter()
+            status, _ = await client.create_task(payload, token=token)
+            result.add(scenario, status, (time.perf_counter() - started) * 1000)
+
+    plan = []
+    names = list(weights)
+    while len(plan) < requests:
+        scenario = rng.choices(names, weights=[weights[name] for name in names])[0]
+        if scenario == 'burst':
+            telegram_id = rng.choice(telegram_ids)
+            for _ in range(min(burst_size, requests - len(plan))):
+                plan.append(send('burst', client.task_payload(telegram_id, rng)))
+        elif scenario == 'invalid_token':
+            plan.append(send(scenario, client.task_payload(rng.choice(telegram_ids), rng), token='Token invalid'))
+        elif scenario == 'unknown_user':
+            plan.append(send(scenario, client.task_payload(unknown_id, rng)))
+        else:
+            plan.append(send('single', client.task_payload(rng.choice(telegram_ids), rng)))
+
+    result.started = time.perf_counter()
+    await asyncio.gather(*plan)
+    result.finished = time.perf_counter()
+    return result
@@ -0,0 +1,211 @@
+import asyncio
+import json
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from tasks_app.fake_bot import LOADTEST_TITLE_PREFIX, SCENARIOS, FakeBotClient, run_load
+from tasks_app.models import Task
+from users.lookups import all_positions
+from users.benchmarks import percentile
+from users.models import CustomUser
+
+DEFAULT_MIX = 'single=70,burst=20,invalid_token=5,unknown_user=5'
+
+# Счётчики ожиданий блокировок MySQL/InnoDB (глобальные, считаем разницу)
+MYSQL_LOCK_COUNTERS = ('Innodb_row_lock_waits', 'Innodb_row_lock_time', 'Table_locks_waited')
+
+
+def parse_mix(value):
+    weights = {}
+    for part in value.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in SCENARIOS:
+            raise CommandError(f"Неизвестный сценарий '{name}'. Доступны: {', '.join(SCENARIOS)}")
+        weights[name] = float(weight or 1)
+    return weights
+
+
+def db_lock_counters():
+    """Счётчики ожиданий блокировок БД или None (SQLite их не ведёт)"""
+    if connection.vendor != 'mysql':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SHOW GLOBAL STATUS WHERE Variable_name IN (%s, %s, %s)", MYSQL_LOCK_COUNTERS,
+        )
+        return {name: int(value) for name, value in cursor.fetchall()}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class Command(BaseCommand):
+    help = (
+        "Нагрузочный тест API бота (create_task_from_telegram): одиночные создания, пачки, "
+        "неверный токен, неизвестный telegram_id. Показывает пропускную способность, "
+        "задержки, долю ошибок и ожидания блокировок БД."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000', help="Адрес запущенного сервера")
+        parser.add_argument('--serve', action='store_true', help="Запустить runserver на свободном порту на время теста")
+        parser.add_argument('--requests', type=int, default=500)
+        parser.add_argument('--concurrency', type=int, default=20)
+        parser.add_argument('--burst-size', type=int, default=10)
+        parser.add_argument('--mix', default=DEFAULT_MIX, help=f"Веса выбора сценариев; burst даёт --burst-size запросов (по умолчанию {DEFAULT_MIX})")
+        parser.add_argument('--seed', type=int)
+        parser.add_argument('--output', help="Сохранить результат в JSON-файл")
+        parser.add_argument('--keep', action='store_true', help="Не удалять созданные тестом задачи")
+
+    def handle(self, *args, **options):
+        weights = parse_mix(options['mix'])
+        telegram_ids = self.creator_telegram_ids()
+
+        server = None
+        url = options['url']
+        if options['serve']:
+            server, url = self.start_server()
+
+        try:
+            locks_before = db_lock_counters()
+            client = FakeBotClient(url, settings.TELEGRAM_BOT_API_TOKEN)
+            result = asyncio.run(run_load(
+                client, telegram_ids, options['requests'], options['concurrency'],
+                weights, options['burst_size'], seed=options['seed'],
+            ))
+            locks_after = db_lock_counters()
+        finally:
+            if server is not None:
+                server.terminate()
+                server.wait(timeout=10)
+
+        report = self.build_report(result, locks_before, locks_after, options)
+        self.print_report(report)
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+            self.stdout.write(f"Результат сохранён в {options['output']}")
+
+        if not options['keep']:
+            deleted = Task.objects.filter(title__startswith=LOADTEST_TITLE_PREFIX).delete()[0]
+            self.stdout.write(f"Удалено задач нагрузочного теста: {deleted}")
+
+    def creator_telegram_ids(self):
+        """telegram_id руководителей и заместителей — только они могут создавать задачи"""
+        position_ids = [
+            position.pk for position in all_positions()
+            if 'руководитель' in position.title.lower() or 'заместитель' in position.title.lower()
+        ]
+        telegram_ids = list(
+            CustomUser.objects
+            .filter(position_id__in=position_ids, telegram_id__isnull=False, district__isnull=False)
+            .values_list('telegram_id', flat=True)[:1000]
+        )
+        if not telegram_ids:
+            raise CommandError("Нет руководителей с telegram_id — сначала запустите generate_dataset")
+        return telegram_ids
+
+    def start_server(self):
+        port = free_port()
+        server = subprocess.Popen(
+            [sys.executable, str(settings.BASE_DIR / 'manage.py'), 'runserver', f'127.0.0.1:{port}', '--noreload',
+             f'--settings={settings.SETTINGS_MODULE}'],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            try:
+                socket.create_connection(('127.0.0.1', port), timeout=0.5).close()
+                return server, f'http://127.0.0.1:{port}'
+            except OSError:
+                if server.poll() is not None:
+                    raise CommandError("runserver завершился при запуске")
+                time.sleep(0.2)
+        server.terminate()
+        raise CommandError("runserver не начал принимать соединения за 30 с")
+
+    def build_report(self, result, locks_before, locks_after, options):
+        elapsed = result.finished - result.started
+        total = sum(len(latencies) for latencies in result.latencies.values())
+        all_latencies = sorted(latency for latencies in result.latencies.values() for latency in latencies)
+
+        scenarios = {}
+        for name, latencies in result.latencies.items():
+            if not latencies:
+                continue
+            latencies = sorted(latencies)
+            scenarios[name] = {
+                'requests': len(latencies),
+                'expected_status': SCENARIOS[name],
+                'status_codes': {str(code): count for code, count in sorted(result.statuses[name].items())},
+                'error_rate': round(result.errors[name] / len(latencies), 4),
+                'latency_ms': {
+                    'p50': round(percentile(latencies, 50), 2),
+                    'p95': round(percentile(latencies, 95), 2),
+                    'p99': round(percentile(latencies, 99), 2),
+                    'max': round(latencies[-1], 2),
+                },
+            }
+
+        lock_waits = None
+        if locks_before is not None and locks_after is not None:
+            lock_waits = {name: locks_after.get(name, 0) - locks_before.get(name, 0) for name in MYSQL_LOCK_COUNTERS}
+
+        return {
+            'database': connection.vendor,
+            'requests': total,
+            'concurrency': options['concurrency'],
+            'burst_size': options['burst_size'],
+            'mix': options['mix'],
+            'duration_s': round(elapsed, 3),
+            'throughput_rps': round(total / elapsed, 1) if elapsed else None,
+            'latency_ms': {
+                'p50': round(percentile(all_latencies, 50), 2),
+                'p90': round(percentile(all_latencies, 90), 2),
+                'p99': round(percentile(all_latencies, 99), 2),
+                'mean': round(statistics.fmean(all_latencies), 2),
+                'max': round(all_latencies[-1], 2),
+            },
+            'error_rate': round(sum(result.errors.values()) / total, 4) if total else 0,
+            'server_errors': sum(
+                count for statuses in result.statuses.values()
+                for code, count in statuses.items() if code >= 500 or code == 0
+            ),
+            'db_lock_waits': lock_waits,
+            'scenarios': scenarios,
+        }
+
+    def print_report(self, report):
+        latency = report['latency_ms']
+        self.stdout.write(
+            f"БД {report['database']}: {report['requests']} запросов за {report['duration_s']} с "
+            f"({report['throughput_rps']} запр/с), параллельно {report['concurrency']}"
+        )
+        self.stdout.write(
+            f"Задержка, мс: p50 {latency['p50']}, p90 {latency['p90']}, p99 {latency['p99']}, max {latency['max']}"
+        )
+        self.stdout.write(
+            f"Ошибок (неожиданный код): {report['error_rate']:.1%}, из них 5xx/обрывов: {report['server_errors']}"
+        )
+        for name, stats in report['scenarios'].items():
+            self.stdout.write(
+                f"  {name:<14}{stats['requests']:>6}  p50 {stats['latency_ms']['p50']:>8.1f}  "
+                f"p99 {stats['latency_ms']['p99']:>8.1f}  ошибок {stats['error_rate']:.1%}  {stats['status_codes']}"
+            )
+        if report['db_lock_waits'] is not None:
+            self.stdout.write(f"Ожидания блокировок БД: {report['db_lock_waits']}")
+        else:
+            # SQLite не считает ожидания: исчерпанный timeout блокировки виден как 500 (database is locked)
+            self.stdout.write("Ожидания блокировок БД: SQLite их не считает — смотрите 5xx выше")
@@ -1,3 +1,117 @@
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from users.dashboard import TASKS_VERSION_KEY
+from users.lookups import lookup_cache
+from users.models import CustomUser, District, Position
+from users.query_budget import QueryBudgetTestMixin
+
+from .models import Task
+
+
+class CreateTaskFromTelegramQueryBudgetTests(QueryBudgetTestMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.district = District.objects.create(name="Северный")
+        cls.head = Position.objects.create(title="Руководитель районного отделения")
+        cls.leader = CustomUser.objects.create_user(
+            'leader', password='x', district=cls.district, position=cls.head, telegram_id=1001,
+        )
+
+    def setUp(self):
+        cache.clear()
+        lookup_cache.local.clear()
+
+    def post_task(self, **overrides):
+        payload = {
+            'title': "Субботник",
+            'description': "Уборка территории",
+            'type': 'district',
+            'deadline': (timezone.now().date() + timedelta(days=3)).isoformat(),
+            'created_by_telegram_id': 1001,
+            **overrides,
+        }
+        return self.assertQueryBudget(
+            '/api/tasks/create/', method='post', data=json.dumps(payload),
+            content_type='application/json', HTTP_AUTHORIZATION=settings.TELEGRAM_BOT_API_TOKEN,
+        )
+
+    def test_create_district_task_within_budget(self):
+        response = self.post_task()
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Task.objects.get().district, self.district)
+
+    def test_unknown_telegram_id_within_budget(self):
+        response = self.post_task(created_by_telegram_id=999)
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(Task.objects.exists())
+
+
+class TaskAdminTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.north = District.objects.create(name="Северный", code="N")
+        cls.south = District.objects.create(name="Южный", code="S")
+        cls.admin = CustomUser.objects.create_superuser('admin', 'admin@example.com', 'x')
+        cls.members = [CustomUser.objects.create_user(f'member{i}', password='x') for i in range(3)]
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.admin)
+
+    def create_tasks(self, count):
+        deadline = timezone.now().date() + timedelta(days=3)
+        tasks = Task.objects.bulk_create(
+            Task(title=f"Задача {i}", description="Описание", deadline=deadline, district=self.north)
+            for i in range(count)
+        )
+        for task in tasks:
+            task.users_signed_up.add(*self.members)
+        return tasks
+
+    def changelist_queries(self):
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get('/admin/tasks_app/task/')
+        self.assertEqual(response.status_code, 200)
+        return response, len(captured)
+
+    def test_changelist_queries_do_not_grow_with_rows(self):
+        self.create_tasks(2)
+        _, few = self.changelist_queries()
+        self.create_tasks(20)
+        response, many = self.changelist_queries()
+        self.assertEqual(few, many)
+        self.assertEqual(response.context['cl'].result_list[0].signup_count, 3)
+
+    def run_action(self, action, tasks, **extra):
+        with CaptureQueriesContext(connection) as captured, self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/admin/tasks_app/task/', {
+                'action': action, '_selected_action': [task.pk for task in tasks], **extra,
+            })
+        self.assertEqual(response.status_code, 302)
+        updates = [query['sql'] for query in captured if query['sql'].startswith('UPDATE "tasks_app_task"')]
+        self.assertEqual(len(updates), 1)
+
+    def test_archive_is_single_update_and_resets_dashboard(self):
+        tasks = self.create_tasks(5)
+        cache.set(TASKS_VERSION_KEY, 1, None)
+        self.run_action('archive_tasks', tasks[:3])
+        self.assertEqual(Task.objects.filter(status='archived').count(), 3)
+        self.assertNotEqual(cache.get(TASKS_VERSION_KEY), 1)
+
+    def test_change_status_and_reassign_district(self):
+        tasks = self.create_tasks(4)
+        self.run_action('change_status', tasks, status='in_progress')
+        self.assertEqual(Task.objects.filter(status='in_progress').count(), 4)
 
-# Create your tests here.
+        self.run_action('reassign_district', tasks[:2], district=self.south.pk)
+        self.assertEqual(Task.objects.filter(district=self.south).count(), 2)
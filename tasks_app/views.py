@@ -1,5 +1,6 @@
 import json
 import logging
+from django.conf import settings
 from django.views.decorators.csrf import csrf_exempt
 from django.http import JsonResponse
 from django.contrib.auth.models import User
@@ -30,7 +31,7 @@ def create_task_from_telegram(request):
 
     # Защита токеном
     auth_header = request.headers.get('Authorization')
-    expected_token = 'Token aB3dE9gH2jK4mN6pQ8rT1uV5wX7yZ0cF2vL9oPqRsTuVxYzAbCdEfGhIjKlMnOp'
+    expected_token = settings.TELEGRAM_BOT_API_TOKEN
     if auth_header != expected_token:
         logger.warning(f"Неверный токен: {auth_header}")
         return JsonResponse({'error': 'Доступ запрещён. Неверный токен.'}, status=403)
@@ -59,10 +60,10 @@ def create_task_from_telegram(request):
             return JsonResponse({'error': 'Пользователь не привязан к Telegram.'}, status=403)
 
         # Проверка должности
-        if not creator.position:
+        if not creator.position_id:
             return JsonResponse({'error': 'У вас нет должности.'}, status=403)
 
-        position_title = creator.position.title.lower()
+        position_title = creator.position_title
         if "руководитель" not in position_title and "заместитель" not in position_title:
             logger.warning(f"Пользователь {creator.username} ({position_title}) не имеет прав на создание задач")
             return JsonResponse({'error': 'Только руководители и заместители могут создавать задачи.'}, status=403)
@@ -91,9 +92,9 @@ def create_task_from_telegram(request):
         # Автоматическая привязка района для районных задач
         district = None
         if type_code == 'district':
-            if not creator.district:
+            if not creator.district_id:
                 return JsonResponse({'error': 'У вас нет района для создания районной задачи.'}, status=400)
-            district = creator.district
+            district = creator.cached_district
 
         # Создание задачи
         task = Task.objects.create(
@@ -137,7 +138,7 @@ class TaskUpdateView(LoginRequiredMixin, UpdateView):
     def dispatch(self, request, *args, **kwargs):
         task = self.get_object()
         user = request.user
-        if not user.position or "руководитель" not in user.position.title.lower():
+        if not user.is_leader:
             messages.error(request, "Только руководитель может редактировать задачи.")
             return redirect('tasks')
         if task.type != 'district':
@@ -157,7 +158,7 @@ class TaskDeleteView(LoginRequiredMixin, DeleteView):
     def dispatch(self, request, *args, **kwargs):
         task = self.get_object()
         user = request.user
-        if not user.position or "руководитель" not in user.position.title.lower():
+        if not user.is_leader:
             messages.error(request, "Только руководитель может удалять задачи.")
             return redirect('tasks')
         if task.type != 'district':
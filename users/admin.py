@@ -1,14 +1,90 @@
-from django.contrib import admin
+from django import forms
+from django.contrib import admin, messages
 from django.contrib.auth.admin import UserAdmin
-from .models import CustomUser, District, Position, EventImportance, Event, Participation
+from django.contrib.auth.hashers import UNUSABLE_PASSWORD_PREFIX
+from django.core.exceptions import PermissionDenied
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q, QuerySet
+from django.http import HttpResponse
+from django.shortcuts import get_object_or_404
+from django.template.response import TemplateResponse
+from django.urls import path, reverse
+from django.utils import timezone
+from django.utils.functional import cached_property
+from django.utils.html import format_html
+from .lookups import get_importance
+from .models import CustomUser, District, Position, EventImportance, Event, Participation, RequestProfile, Job
+from .onboarding import CSV_COLUMNS, import_users, invite_links, invite_row, read_rows, write_invites_csv
+
+
+# === БОЛЬШИЕ ТАБЛИЦЫ: ОЦЕНКА ЧИСЛА СТРОК ===
+def estimated_row_count(model, using):
+    """Число строк таблицы по статистике СУБД (без COUNT(*)) или None, если оценки нет"""
+    connection = connections[using]
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'mysql':
+            cursor.execute(
+                "SELECT TABLE_ROWS FROM information_schema.TABLES "
+                "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s", [table],
+            )
+        elif connection.vendor == 'postgresql':
+            cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass", [table])
+        else:
+            return None
+        row = cursor.fetchone()
+    return int(row[0]) if row and row[0] is not None and row[0] >= 0 else None
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Список без фильтров и поиска: число строк — оценка из статистики таблицы
+    вместо COUNT(*) по всей таблице (в InnoDB это полный проход по индексу).
+    С фильтрами — обычный COUNT(*): условие сужает выборку по индексу.
+    Маленькие таблицы (меньше ESTIMATE_THRESHOLD) считаются точно.
+    """
+    ESTIMATE_THRESHOLD = 10_000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if isinstance(queryset, QuerySet) and not queryset.query.where:
+            estimate = estimated_row_count(queryset.model, queryset.db)
+            if estimate is not None and estimate >= self.ESTIMATE_THRESHOLD:
+                return estimate
+        return super().count
+
+
+# === ИМПОРТ ПОЛЬЗОВАТЕЛЕЙ ИЗ CSV (users.onboarding) ===
+class UserImportForm(forms.Form):
+    file = forms.FileField(label="CSV-файл", help_text="UTF-8, разделитель «,» или «;», первая строка — названия колонок")
+    dry_run = forms.BooleanField(label="Только проверить", required=False)
+
+
+def invites_response(rows, name):
+    response = HttpResponse(content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="{name}-{timezone.now():%Y%m%d-%H%M}.csv"'
+    # BOM — чтобы Excel открыл кириллицу без настройки кодировки
+    response.write('\ufeff')
+    write_invites_csv(response, rows)
+    return response
 
 
 # Регистрация кастомной модели пользователя
 @admin.register(CustomUser)
 class CustomUserAdmin(UserAdmin):
     list_display = ('username', 'email', 'first_name', 'last_name', 'is_staff', 'district', 'position')
-    search_fields = ('username', 'email', 'first_name', 'last_name')
+    # Поиск по началу строки — по индексам (username уникален, last_name и email — Meta.indexes);
+    # он же используется автодополнением в других админках
+    search_fields = ('^username', '^last_name', '^email')
+    search_help_text = "Начало логина, фамилии или email"
     list_filter = ('is_staff', 'is_superuser', 'is_active', 'district', 'position')
+    list_select_related = ('district', 'position')
+    autocomplete_fields = ('district', 'position')
+    show_full_result_count = False
+    paginator = EstimatedCountPaginator
+    actions = ['issue_invites']
 
     fieldsets = UserAdmin.fieldsets + (
         ('Дополнительная информация', {
@@ -20,6 +96,47 @@ class CustomUserAdmin(UserAdmin):
         }),
     )
 
+    # --- Массовый импорт: пароли не хэшируются, вход — по ссылкам-приглашениям ---
+
+    def get_urls(self):
+        urls = [
+            path('import/', self.admin_site.admin_view(self.import_users_view), name='users_customuser_import'),
+        ]
+        return urls + super().get_urls()
+
+    def import_users_view(self, request):
+        """Загрузка CSV; в ответ — отчёт CSV со ссылками-приглашениями и причинами отказа"""
+        if not self.has_add_permission(request):
+            raise PermissionDenied
+        form = UserImportForm(request.POST or None, request.FILES or None)
+        if request.method == 'POST' and form.is_valid():
+            try:
+                rows = read_rows(form.cleaned_data['file'])
+            except ValueError as e:
+                form.add_error('file', str(e))
+            else:
+                result = import_users(rows, dry_run=form.cleaned_data['dry_run'])
+                return invites_response(result.rows(request.build_absolute_uri('/')), 'import')
+
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': "Импорт пользователей из CSV",
+            'form': form,
+            'columns': CSV_COLUMNS,
+        }
+        return TemplateResponse(request, 'admin/users/customuser/import_users.html', context)
+
+    @admin.action(description="Выдать ссылки-приглашения (CSV)", permissions=['change'])
+    def issue_invites(self, request, queryset):
+        # Только тем, кто ещё не задал пароль; новые ссылки не отменяют выданные ранее
+        users = list(queryset.filter(password__startswith=UNUSABLE_PASSWORD_PREFIX).order_by('pk'))
+        if not users:
+            self.message_user(request, "Все выбранные пользователи уже задали пароль", messages.WARNING)
+            return None
+        links = invite_links(users, request.build_absolute_uri('/'))
+        return invites_response([invite_row(user, link) for user, link in zip(users, links)], 'invites')
+
 
 # === РАЙОНЫ — с ограничением на редактирование team_photo ===
 @admin.register(District)
@@ -36,9 +153,8 @@ class DistrictAdmin(admin.ModelAdmin):
         if obj:  # obj — это редактируемый район
             is_leader = (
                 request.user.is_authenticated and
-                request.user.district == obj and
-                request.user.position and
-                "руководитель" in request.user.position.title.lower()
+                request.user.district_id == obj.pk and
+                request.user.is_leader
             )
             if not is_leader:
                 form.base_fields['team_photo'].disabled = True
@@ -51,7 +167,7 @@ class DistrictAdmin(admin.ModelAdmin):
         if obj and request.user.is_authenticated:
             if request.user.is_superuser:
                 return True
-            if request.user.district == obj and request.user.position and "руководитель" in request.user.position.title.lower():
+            if request.user.district_id == obj.pk and request.user.is_leader:
                 return True
             return False
         return super().has_change_permission(request, obj)
@@ -77,13 +193,108 @@ class EventImportanceAdmin(admin.ModelAdmin):
 
 @admin.register(Event)
 class EventAdmin(admin.ModelAdmin):
-    list_display = ('name', 'date', 'event_type', 'importance', 'participants_count')
+    list_display = ('name', 'date', 'event_type', 'importance_level', 'participants_count')
     list_filter = ('event_type', 'importance', 'date')
     search_fields = ('name',)
 
+    @admin.display(description='Важность', ordering='importance__weight')
+    def importance_level(self, obj):
+        # Справочник важности — из кэша, без запроса на каждую строку
+        return get_importance(obj.importance_id) or '-'
+
 
 @admin.register(Participation)
 class ParticipationAdmin(admin.ModelAdmin):
     list_display = ('user', 'event', 'role', 'status')
     list_filter = ('role', 'status')
-    search_fields = ('user__username', 'event__name')
\ No newline at end of file
+    search_fields = ('user__username', 'event__name')
+    search_help_text = "Начало логина пользователя или названия мероприятия"
+    autocomplete_fields = ('user', 'event')
+    show_full_result_count = False
+    paginator = EstimatedCountPaginator
+
+    def get_queryset(self, request):
+        # Пользователь и мероприятие — JOIN: их читают и список, и __str__
+        # (заголовок формы, подтверждение массового удаления)
+        return super().get_queryset(request).select_related('user', 'event')
+
+    def get_search_results(self, request, queryset, search_term):
+        # LIKE по JOIN просматривал бы всю таблицу участий. Пользователи и мероприятия
+        # с таким началом ищутся подзапросами по их индексам, участия — по user_id/event_id
+        term = search_term.strip()
+        if not term:
+            return queryset, False
+        users = CustomUser.objects.filter(username__istartswith=term).values('pk')
+        events = Event.objects.filter(name__istartswith=term).values('pk')
+        return queryset.filter(Q(user__in=users) | Q(event__in=events)), False
+
+
+# === ПРОФИЛИ ЗАПРОСОВ (только просмотр) ===
+@admin.register(RequestProfile)
+class RequestProfileAdmin(admin.ModelAdmin):
+    list_display = ('created_at', 'method', 'path', 'view_name', 'status_code', 'duration_ms', 'query_count', 'user')
+    list_filter = ('view_name', 'method')
+    list_select_related = ('user',)
+    search_fields = ('path', 'view_name')
+    fields = ('created_at', 'user', 'method', 'path', 'view_name', 'status_code', 'duration_ms',
+              'query_count', 'samples', 'flame_graph', 'stats_summary')
+    readonly_fields = fields
+
+    def get_urls(self):
+        urls = [
+            path('<int:pk>/stacks.folded', self.admin_site.admin_view(self.download_stacks),
+                 name='users_requestprofile_stacks'),
+        ]
+        return urls + super().get_urls()
+
+    def download_stacks(self, request, pk):
+        """Свёрнутые стеки файлом — для flamegraph.pl или speedscope.app"""
+        if not self.has_view_permission(request):
+            return HttpResponse(status=403)
+        profile = get_object_or_404(RequestProfile, pk=pk)
+        response = HttpResponse(profile.stacks, content_type='text/plain; charset=utf-8')
+        response['Content-Disposition'] = f'attachment; filename="profile-{profile.pk}.folded"'
+        return response
+
+    @admin.display(description='Flame graph')
+    def flame_graph(self, obj):
+        return format_html(
+            '<a href="{}">Скачать свёрнутые стеки</a> (открыть в speedscope.app или flamegraph.pl)',
+            reverse('admin:users_requestprofile_stacks', args=[obj.pk]),
+        )
+
+    @admin.display(description='Сводка cProfile')
+    def stats_summary(self, obj):
+        return format_html('<pre style="white-space: pre; overflow-x: auto;">{}</pre>', obj.stats)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+# === ФОНОВЫЕ ЗАДАНИЯ (просмотр и повтор упавших) ===
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'name', 'status', 'priority', 'attempts', 'run_at', 'created_at', 'finished_at')
+    list_filter = ('status', 'name')
+    search_fields = ('name', 'unique_key')
+    fields = ('name', 'status', 'priority', 'payload', 'unique_key', 'attempts', 'max_attempts',
+              'run_at', 'locked_by', 'locked_at', 'created_at', 'finished_at', 'last_error')
+    readonly_fields = fields
+    actions = ['retry_jobs']
+
+    @admin.action(description="Повторить выбранные упавшие задания")
+    def retry_jobs(self, request, queryset):
+        # Один UPDATE; unique_key у упавших уже освобождён
+        count = queryset.filter(status=Job.FAILED).update(
+            status=Job.QUEUED, attempts=0, run_at=timezone.now(), finished_at=None, locked_by='',
+        )
+        self.message_user(request, f"Поставлено в очередь заданий: {count}")
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
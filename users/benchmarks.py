@@ -0,0 +1,24 @@
+import subprocess
+
+from django.conf import settings
+
+# --- ОБЩЕЕ ДЛЯ КОМАНД-БЕНЧМАРКОВ (benchmark_*, loadtest_bot_api) ---
+
+
+def percentile(sorted_values, p):
+    """Перцентиль методом ближайшего ранга (без интерполяции — стабильно на малых выборках)"""
+    if not sorted_values:
+        return None
+    rank = max(1, -(-p * len(sorted_values) // 100))
+    return sorted_values[rank - 1]
+
+
+def git_revision():
+    """Короткий хэш текущего коммита — метка результата для сравнения между коммитами"""
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+            stderr=subprocess.DEVNULL, text=True,
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
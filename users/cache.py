@@ -0,0 +1,466 @@
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.core.cache.backends.locmem import LocMemCache
+
+from . import metrics, tracing
+
+logger = logging.getLogger(__name__)
+
+# Сообщение «сбросить всё» (после переподключения к Redis)
+INVALIDATE_ALL = '*'
+
+
+# --- ЛОКАЛЬНЫЙ (ВНУТРИПРОЦЕССНЫЙ) УРОВЕНЬ ---
+
+class LRUCache:
+    """Потокобезопасный LRU-словарь с TTL для записей (один на gunicorn-воркер)"""
+
+    def __init__(self, maxsize=256, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+# --- РАССЫЛКА СБРОСОВ МЕЖДУ ВОРКЕРАМИ ---
+
+class LocalInvalidationBus:
+    """Без Redis (тесты, locmem-кэш): сброс рассылается только внутри процесса"""
+
+    def __init__(self):
+        self._handlers = []
+
+    def subscribe(self, handler):
+        self._handlers.append(handler)
+
+    def ensure_listening(self):
+        pass
+
+    def publish(self, message):
+        self._dispatch(message)
+
+    def _dispatch(self, message):
+        for handler in self._handlers:
+            try:
+                handler(message)
+            except Exception as e:
+                logger.error(f"Ошибка обработчика сброса кэша: {e}", exc_info=True)
+
+
+class RedisInvalidationBus(LocalInvalidationBus):
+    """
+    Сброс через Redis pub/sub: каждый воркер слушает канал в фоновом потоке.
+    Поток запускается лениво и перезапускается после fork (проверка pid).
+    Если соединение с Redis терялось, после переподключения локальный уровень
+    очищается целиком — сообщения за это время могли быть пропущены.
+    """
+    RECONNECT_DELAY = 1.0
+
+    def __init__(self, channel, alias='default'):
+        super().__init__()
+        self.channel = channel
+        self.alias = alias
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def publish(self, message):
+        # Свой процесс сбрасываем сразу, не дожидаясь сообщения из канала
+        self._dispatch(message)
+        # Redis недоступен (предохранитель разомкнут) — не ждём таймаута
+        if getattr(cache, 'state', None) == CircuitBreakerCache.OPEN:
+            return
+        try:
+            self._connection().publish(self.channel, message)
+        except Exception as e:
+            logger.warning(f"Не удалось опубликовать сброс кэша '{message}': {e}")
+
+    def _connection(self):
+        from django_redis import get_redis_connection
+        return get_redis_connection(self.alias)
+
+    def ensure_listening(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            thread = threading.Thread(target=self._listen, name='cache-invalidation', daemon=True)
+            thread.start()
+
+    def _listen(self):
+        first_connect = True
+        connected = False
+        while True:
+            try:
+                pubsub = self._connection().pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.channel)
+                if not first_connect:
+                    self._dispatch(INVALIDATE_ALL)
+                first_connect = False
+                connected = True
+                while True:
+                    message = pubsub.get_message(timeout=1.0)
+                    if message and message['type'] == 'message':
+                        data = message['data']
+                        self._dispatch(data.decode() if isinstance(data, bytes) else data)
+            except Exception as e:
+                # Пишем в лог один раз на каждое отключение, а не каждую секунду
+                if connected or first_connect:
+                    logger.warning(f"Подписка на сброс кэша прервана: {e}")
+                first_connect = False
+                connected = False
+                time.sleep(self.RECONNECT_DELAY)
+
+
+def redis_cache_alias(alias='default'):
+    """Алиас кэша django_redis (за CircuitBreakerCache — его PRIMARY) или None"""
+    config = settings.CACHES.get(alias, {})
+    backend = config.get('BACKEND', '')
+    if backend.startswith('django_redis'):
+        return alias
+    if backend == f'{__name__}.CircuitBreakerCache':
+        return redis_cache_alias(config.get('OPTIONS', {}).get('PRIMARY', 'redis'))
+    return None
+
+
+def make_invalidation_bus(channel):
+    """Redis pub/sub, если кэш — django_redis; иначе — локальная рассылка"""
+    alias = redis_cache_alias()
+    if alias:
+        return RedisInvalidationBus(channel, alias=alias)
+    return LocalInvalidationBus()
+
+
+# --- ПРЕДОХРАНИТЕЛЬ (CIRCUIT BREAKER) ДЛЯ REDIS ---
+
+def cache_connection_errors():
+    """Ошибки связи с кэшем (а не ошибки использования вроде incr несуществующего ключа)"""
+    errors = [OSError]
+    try:
+        from django_redis.exceptions import ConnectionInterrupted
+        from redis.exceptions import RedisError
+        errors += [ConnectionInterrupted, RedisError]
+    except ImportError:
+        pass
+    return tuple(errors)
+
+
+class CircuitBreakerCache(BaseCache):
+    """
+    Бэкенд кэша-обёртка над основным кэшем (Redis) с предохранителем.
+
+    После FAILURE_THRESHOLD ошибок подряд предохранитель «размыкается»: все
+    вызовы сразу идут в локальный locmem-кэш процесса, не дожидаясь таймаутов
+    Redis. Фоновый поток раз в RESET_TIMEOUT секунд проверяет Redis и, когда
+    он отвечает, замыкает предохранитель обратно. Запросы проверку не ждут.
+
+    Ключи, записанные или удалённые в обход Redis, запоминаются. Перед
+    замыканием их копии в Redis удаляются (сброс версий главной, справочников,
+    удалённые сессии) — иначе Redis вернул бы значения до отключения. Если
+    таких ключей больше DIRTY_KEYS_LIMIT (или был вызван clear()), Redis очищается целиком.
+
+    settings.CACHES['default'] = {
+        'BACKEND': 'users.cache.CircuitBreakerCache',
+        'OPTIONS': {'PRIMARY': 'redis', 'FAILURE_THRESHOLD': 3, 'RESET_TIMEOUT': 30},
+    }
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    PROBE_KEY = 'circuit_breaker_probe'
+    WRITE_METHODS = ('set', 'add', 'touch', 'delete', 'incr', 'decr')
+    DIRTY_KEYS_LIMIT = 10000
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self.primary_alias = options.get('PRIMARY', 'redis')
+        self.failure_threshold = options.get('FAILURE_THRESHOLD', 3)
+        self.reset_timeout = options.get('RESET_TIMEOUT', 30)
+        self.fallback = LocMemCache(f'circuit-breaker-{self.primary_alias}', {
+            'TIMEOUT': params.get('TIMEOUT', 300),
+            'KEY_PREFIX': params.get('KEY_PREFIX', ''),
+            'OPTIONS': {'MAX_ENTRIES': options.get('FALLBACK_MAX_ENTRIES', 1000)},
+        })
+
+        self.state = self.CLOSED
+        self._failures = 0
+        # Изменённые в обход Redis: {(ключ, версия)} и флаг «нужен clear()»
+        self._dirty = set()
+        self._cleared = False
+        self._lock = threading.Lock()
+        self._probe_thread = None
+        self.counters = {'hits': 0, 'misses': 0, 'errors': 0, 'fallback_calls': 0, 'trips': 0}
+        self.connection_errors = cache_connection_errors()
+
+    @property
+    def primary(self):
+        return caches[self.primary_alias]
+
+    def stats(self):
+        """Счётчики процесса: попадания, промахи, ошибки Redis, вызовы в обход Redis"""
+        return {'state': self.state, **self.counters}
+
+    # --- Управление состоянием ---
+
+    def _record_success(self):
+        if self._failures:
+            with self._lock:
+                self._failures = 0
+
+    def _record_failure(self, error):
+        with self._lock:
+            self.counters['errors'] += 1
+            self._failures += 1
+            if self.state == self.CLOSED and self._failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.counters['trips'] += 1
+                # Данные с прошлого отключения могли устареть
+                self.fallback.clear()
+                logger.warning(f"Кэш '{self.primary_alias}' недоступен, работаем локально: {error}")
+                self._start_probe()
+
+    def _start_probe(self):
+        if self._probe_thread and self._probe_thread.is_alive():
+            return
+        self._probe_thread = threading.Thread(target=self._probe, name='cache-probe', daemon=True)
+        self._probe_thread.start()
+
+    def _probe(self):
+        while True:
+            time.sleep(self.reset_timeout)
+            try:
+                self.primary.get(self.PROBE_KEY)
+                self._reconcile()
+            except Exception:
+                continue
+            logger.info(f"Кэш '{self.primary_alias}' снова доступен")
+            return
+
+    def _track_write(self, method, args, kwargs):
+        """Запоминает ключи, изменённые в локальном кэше вместо Redis"""
+        if method == 'clear':
+            keys = None
+        elif method in ('set_many', 'delete_many'):
+            keys = list(args[0])
+        elif method in self.WRITE_METHODS:
+            keys = [args[0]]
+        else:
+            return
+        version = kwargs.get('version')
+        with self._lock:
+            if keys is None or len(self._dirty) + len(keys) > self.DIRTY_KEYS_LIMIT:
+                self._dirty = set()
+                self._cleared = True
+            elif not self._cleared:
+                self._dirty.update((key, version) for key in keys)
+
+    def _reconcile(self):
+        """
+        Удаляет из Redis ключи, изменённые локально, и замыкает предохранитель.
+        Пока идёт удаление, запросы ещё пишут в локальный кэш — повторяем, пока
+        не останется ключей; замыкание — под той же блокировкой, что и проверка.
+        """
+        while True:
+            with self._lock:
+                dirty, cleared = self._dirty, self._cleared
+                self._dirty, self._cleared = set(), False
+                if not dirty and not cleared:
+                    self.state = self.CLOSED
+                    self._failures = 0
+                    return
+            try:
+                if cleared:
+                    self.primary.clear()
+                else:
+                    by_version = {}
+                    for key, version in dirty:
+                        by_version.setdefault(version, []).append(key)
+                    for version, keys in by_version.items():
+                        self.primary.delete_many(keys, version=version)
+            except Exception:
+                # Redis снова пропал — вернём ключи, удалим при следующей проверке
+                with self._lock:
+                    self._dirty |= dirty
+                    self._cleared = self._cleared or cleared
+                raise
+
+    def _call(self, method, *args, **kwargs):
+        with tracing.span(f'cache.{method}') as span:
+            if self.state == self.OPEN:
+                self.counters['fallback_calls'] += 1
+                span.set_attribute('cache.fallback', True)
+                self._track_write(method, args, kwargs)
+                return getattr(self.fallback, method)(*args, **kwargs)
+            try:
+                result = getattr(self.primary, method)(*args, **kwargs)
+            except self.connection_errors as e:
+                self._record_failure(e)
+                self.counters['fallback_calls'] += 1
+                span.set_attribute('cache.fallback', True)
+                self._track_write(method, args, kwargs)
+                return getattr(self.fallback, method)(*args, **kwargs)
+            self._record_success()
+            return result
+
+    # --- API кэша Django ---
+
+    def get(self, key, default=None, version=None):
+        value = self._call('get', key, self._missing_key, version=version)
+        if value is self._missing_key:
+            self.counters['misses'] += 1
+            metrics.record_cache(misses=1)
+            return default
+        self.counters['hits'] += 1
+        metrics.record_cache(hits=1)
+        return value
+
+    def get_many(self, keys, version=None):
+        values = self._call('get_many', keys, version=version)
+        self.counters['hits'] += len(values)
+        self.counters['misses'] += len(keys) - len(values)
+        metrics.record_cache(hits=len(values), misses=len(keys) - len(values))
+        return values
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        return self._call('set', key, value, timeout=timeout, version=version)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        return self._call('add', key, value, timeout=timeout, version=version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        return self._call('set_many', data, timeout=timeout, version=version)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self._call('touch', key, timeout=timeout, version=version)
+
+    def delete(self, key, version=None):
+        return self._call('delete', key, version=version)
+
+    def delete_many(self, keys, version=None):
+        return self._call('delete_many', keys, version=version)
+
+    def has_key(self, key, version=None):
+        return self._call('has_key', key, version=version)
+
+    def incr(self, key, delta=1, version=None):
+        return self._call('incr', key, delta=delta, version=version)
+
+    def decr(self, key, delta=1, version=None):
+        return self._call('decr', key, delta=delta, version=version)
+
+    def clear(self):
+        self.fallback.clear()
+        return self._call('clear')
+
+    def close(self, **kwargs):
+        try:
+            self.primary.close(**kwargs)
+        except Exception:
+            pass
+
+
+# --- ДВУХУРОВНЕВЫЙ КЭШ ---
+
+class TieredCache:
+    """
+    Read-through кэш: локальный LRU → общий кэш Django (Redis) → loader().
+    invalidate() удаляет ключ из Redis и рассылает сброс всем воркерам.
+    Возвращаемые значения общие для всех запросов — их нельзя изменять.
+
+    У каждого ключа есть поколение (счётчик в Redis, растёт при invalidate()),
+    и значение хранится под ключом с поколением. Воркер, который загружал
+    данные, пока другой их менял, запишет результат под старое поколение —
+    его никто не прочитает. Локально так же: сброс, пришедший во время
+    loader(), отменяет запись в LRU.
+    """
+
+    def __init__(self, namespace, timeout=3600, local_maxsize=256, local_ttl=300):
+        self.namespace = namespace
+        self.timeout = timeout
+        self.local = LRUCache(maxsize=local_maxsize, ttl=local_ttl)
+        # Сколько сбросов получил этот процесс: по ключу и «сбросить всё»
+        self._local_generations = {}
+        self._local_epoch = 0
+        self.bus = make_invalidation_bus(f'{namespace}:invalidate')
+        self.bus.subscribe(self._on_invalidate)
+
+    def generation_key(self, key):
+        return f'{self.namespace}:{key}:generation'
+
+    def shared_key(self, key, generation):
+        return f'{self.namespace}:{key}:{generation}'
+
+    def _local_generation(self, key):
+        return self._local_epoch, self._local_generations.get(key, 0)
+
+    def get_or_load(self, key, loader):
+        self.bus.ensure_listening()
+        value = self.local.get(key)
+        if value is not None:
+            return value
+
+        local_generation = self._local_generation(key)
+        generation = cache.get(self.generation_key(key), 0)
+        value = cache.get(self.shared_key(key, generation))
+        if value is None:
+            value = loader()
+            cache.set(self.shared_key(key, generation), value, self.timeout)
+
+        if self._local_generation(key) == local_generation:
+            self.local.set(key, value)
+        return value
+
+    def invalidate(self, key):
+        generation_key = self.generation_key(key)
+        generation = cache.get(generation_key, 0)
+        cache.delete(self.shared_key(key, generation))
+        # Поколение живёт без срока: его потеря вернула бы ключ к поколению 0
+        if not cache.add(generation_key, generation + 1, None):
+            try:
+                cache.incr(generation_key)
+            except ValueError:
+                cache.set(generation_key, generation + 1, None)
+        self.bus.publish(key)
+
+    def _on_invalidate(self, key):
+        if key == INVALIDATE_ALL:
+            self._local_epoch += 1
+            self.local.clear()
+        else:
+            self._local_generations[key] = self._local_generations.get(key, 0) + 1
+            self.local.delete(key)
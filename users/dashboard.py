@@ -0,0 +1,169 @@
+import time
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import models
+from django.utils import timezone
+
+from tasks_app.models import Task
+
+from .models import Participation
+
+# --- ВИДЖЕТЫ ГЛАВНОЙ СТРАНИЦЫ ---
+# Открытые задачи района по типам, мои ближайшие задачи, дедлайны в ближайшие
+# 48 часов и мои последние участия. Считаются несколькими сгруппированными
+# запросами и кэшируются на пользователя на DASHBOARD_CACHE_TIMEOUT секунд.
+# Ключ кэша содержит две версии: общую версию задач (меняется при любом
+# изменении Task) и версию пользователя (его записи на задачи и участия).
+# Сброс — смена версии (см. signals.py), старые записи просто истекают.
+DASHBOARD_CACHE_PREFIX = 'dashboard'
+TASKS_VERSION_KEY = 'dashboard_tasks_version'
+USER_VERSION_PREFIX = 'dashboard_user_version_'
+
+DEADLINE_WINDOW = timedelta(hours=48)
+WIDGET_LIMIT = 5
+# Задачи в этих статусах на главной не показываем
+CLOSED_STATUSES = ('done', 'archived')
+
+
+def dashboard_cache_timeout():
+    return getattr(settings, 'DASHBOARD_CACHE_TIMEOUT', 60)
+
+
+def _new_version():
+    return time.time_ns()
+
+
+def bump_tasks_version():
+    """Изменилась задача — устаревают главные страницы всех пользователей"""
+    cache.set(TASKS_VERSION_KEY, _new_version(), None)
+
+
+def bump_user_versions(user_ids):
+    """Изменились записи/участия пользователей — устаревают только их главные"""
+    version = _new_version()
+    cache.set_many({f'{USER_VERSION_PREFIX}{pk}': version for pk in user_ids}, None)
+
+
+def _versions(user_id):
+    """(версия задач, версия пользователя) — одним обращением к кэшу"""
+    user_key = f'{USER_VERSION_PREFIX}{user_id}'
+    versions = cache.get_many([TASKS_VERSION_KEY, user_key])
+    missing = {key: _new_version() for key in (TASKS_VERSION_KEY, user_key) if key not in versions}
+    if missing:
+        # add(), а не set(): параллельный сброс версии не должен затираться
+        for key, version in missing.items():
+            cache.add(key, version, None)
+        versions.update(cache.get_many(list(missing)))
+    return versions.get(TASKS_VERSION_KEY, 0), versions.get(user_key, 0)
+
+
+def visible_tasks(user):
+    """Задачи, которые пользователь видит в ленте (как в tasks_view)"""
+    tasks = Task.objects.exclude(status__in=CLOSED_STATUSES)
+    if user.district_id:
+        tasks = tasks.filter(
+            models.Q(district_id=user.district_id) |
+            models.Q(district__isnull=True) |
+            ~models.Q(type='district')
+        )
+    return tasks
+
+
+TASK_TYPES = dict(Task.TYPE_CHOICES)
+TASK_FIELDS = ('id', 'title', 'type', 'deadline', 'deadline_time')
+
+
+def _task_row(task, is_signed_up):
+    return {
+        'id': task['id'],
+        'title': task['title'],
+        'type': task['type'],
+        'type_display': TASK_TYPES.get(task['type'], task['type']),
+        'deadline': task['deadline'],
+        'deadline_time': task['deadline_time'],
+        'is_signed_up': is_signed_up,
+    }
+
+
+def build_dashboard(user):
+    """Данные виджетов (простые dict/list — хранятся в кэше как есть)"""
+    now = timezone.localtime()
+    today = now.date()
+    tasks = visible_tasks(user).filter(deadline__gte=today)
+
+    # 1. Открытые задачи по типам — один GROUP BY
+    counts = dict(
+        tasks.filter(status='open')
+        .order_by()
+        .values_list('type')
+        .annotate(count=models.Count('id'))
+    )
+    open_by_type = [
+        {'type': code, 'title': title, 'count': counts.get(code, 0)}
+        for code, title in Task.TYPE_CHOICES
+    ]
+
+    # 2. Мои ближайшие задачи
+    my_tasks = list(
+        user.signed_up_tasks
+        .exclude(status__in=CLOSED_STATUSES)
+        .filter(deadline__gte=today)
+        .order_by('deadline', 'deadline_time')
+        .values(*TASK_FIELDS)[:WIDGET_LIMIT]
+    )
+
+    # 3. Дедлайны в ближайшие 48 часов. По дате выбираем с запасом, точное
+    # окно (с учётом времени дедлайна) проверяем ниже; «записан ли я» — подзапросом
+    deadline_until = now + DEADLINE_WINDOW
+    soon = (
+        tasks.filter(deadline__lte=deadline_until.date())
+        .annotate(signed_up=models.Exists(
+            Task.users_signed_up.through.objects.filter(task_id=models.OuterRef('pk'), customuser_id=user.pk)
+        ))
+        .order_by('deadline', 'deadline_time')
+        .values(*TASK_FIELDS, 'signed_up')
+    )
+    deadlines = []
+    tz = timezone.get_current_timezone()
+    for task in soon:
+        if task['deadline_time'] is not None:
+            at = datetime.combine(task['deadline'], task['deadline_time'], tz)
+            if not now <= at <= deadline_until:
+                continue
+        # Без времени дедлайна задача актуальна до конца дня — по дате уже отобрана
+        deadlines.append(_task_row(task, task['signed_up']))
+        if len(deadlines) == WIDGET_LIMIT:
+            break
+
+    # 4. Мои последние участия в мероприятиях
+    participations = list(
+        Participation.objects
+        .filter(user_id=user.pk)
+        .order_by('-event__date')
+        .values('role', 'status', 'event__name', 'event__date')[:WIDGET_LIMIT]
+    )
+    roles = dict(Participation.ROLE_CHOICES)
+    for participation in participations:
+        participation['role_display'] = str(roles.get(participation['role'], participation['role']))
+        participation['status'] = str(participation['status'])
+
+    return {
+        'open_by_type': open_by_type,
+        'open_total': sum(counts.values()),
+        'my_tasks': [_task_row(task, True) for task in my_tasks],
+        'deadlines': deadlines,
+        'participations': participations,
+    }
+
+
+def get_dashboard(user):
+    """Виджеты из кэша; при промахе — build_dashboard() и запись в кэш"""
+    tasks_version, user_version = _versions(user.pk)
+    key = f'{DASHBOARD_CACHE_PREFIX}_{user.pk}_{tasks_version}_{user_version}'
+    data = cache.get(key)
+    if data is None:
+        data = build_dashboard(user)
+        cache.set(key, data, dashboard_cache_timeout())
+    return data
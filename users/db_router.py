@@ -0,0 +1,114 @@
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+# --- РЕПЛИКА ДЛЯ ЧТЕНИЯ ---
+# Необязательная БД 'replica' (см. DATABASES в settings). Читают с неё только
+# представления из READ_REPLICA_VIEWS (список задач, пользователи, отчёты)
+# и код внутри replica_reads() (выгрузки, тяжёлые команды). Всё остальное —
+# с основной БД, как раньше.
+# Запись в запросе закрепляет его за основной БД до конца (чтение после записи
+# видит свои изменения), а cookie закрепляет за ней и следующие запросы
+# пользователя на REPLICA_PIN_SECONDS — пока реплика догоняет (редирект после POST).
+REPLICA_DB_ALIAS = 'replica'
+REPLICA_PIN_COOKIE = 'db_primary'
+
+
+class _RoutingState:
+    __slots__ = ('use_replica', 'wrote')
+
+    def __init__(self, use_replica=False):
+        self.use_replica = use_replica
+        self.wrote = False
+
+
+_state = ContextVar('db_routing_state', default=None)
+
+
+def replica_configured():
+    return REPLICA_DB_ALIAS in connections.settings
+
+
+def replica_pin_seconds():
+    return getattr(settings, 'REPLICA_PIN_SECONDS', 5)
+
+
+class ReplicaRouter:
+    """
+    Чтение — с реплики, только если текущий запрос (или блок replica_reads())
+    разрешил это и ещё ничего не записывал. Запись — всегда в основную БД.
+    """
+
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if state is None or not state.use_replica or state.wrote or not replica_configured():
+            return DEFAULT_DB_ALIAS
+        # Внутри транзакции читаем там же, где пишем
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return REPLICA_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплика — копия основной БД: связи между объектами из них допустимы
+        return True
+
+
+class replica_reads:
+    """
+    Чтение с реплики внутри блока (если она настроена):
+
+        with replica_reads():
+            rows = list(Task.objects.values(...))
+
+    Запись внутри блока переключает оставшееся чтение на основную БД.
+    """
+
+    def __enter__(self):
+        self._token = _state.set(_RoutingState(use_replica=True))
+        return self
+
+    def __exit__(self, *exc_info):
+        _state.reset(self._token)
+        return False
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Состояние маршрутизации на запрос: реплика разрешается в process_view для
+    представлений из READ_REPLICA_VIEWS, если пользователь не закреплён за
+    основной БД cookie после недавней записи.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.replica_views = frozenset(getattr(settings, 'READ_REPLICA_VIEWS', ()))
+
+    def __call__(self, request):
+        state = _RoutingState()
+        token = _state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.reset(token)
+
+        if state.wrote and replica_configured():
+            response.set_cookie(
+                REPLICA_PIN_COOKIE, '1', max_age=replica_pin_seconds(), httponly=True, samesite='Lax',
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        state = _state.get()
+        if state is None or request.method not in ('GET', 'HEAD'):
+            return None
+        url_name = getattr(request.resolver_match, 'url_name', None)
+        if url_name in self.replica_views and REPLICA_PIN_COOKIE not in request.COOKIES:
+            state.use_replica = True
+        return None
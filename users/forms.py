@@ -1,6 +1,56 @@
 from django import forms
 from django.contrib.auth.forms import AuthenticationForm, UserCreationForm
-from .models import CustomUser, District, Position
+from django.forms.models import ModelChoiceIterator
+from .lookups import LOOKUP_MODELS, head_position_id, lookup_table, occupied_position_ids
+from .models import CustomUser
+
+
+# Выбор из справочника (District, Position, EventImportance) через кэш users.lookups
+class LookupChoiceIterator(ModelChoiceIterator):
+    def __iter__(self):
+        if self.field.empty_label is not None:
+            yield ("", self.field.empty_label)
+        for obj in self.field.lookup_objects():
+            yield self.choice(obj)
+
+    def __len__(self):
+        return len(self.field.lookup_objects()) + (1 if self.field.empty_label is not None else 0)
+
+    def __bool__(self):
+        return self.field.empty_label is not None or bool(self.field.lookup_objects())
+
+
+class LookupChoiceField(forms.ModelChoiceField):
+    """
+    ModelChoiceField, который берёт варианты и проверяет выбор по кэшу справочника,
+    не делая запросов к БД. exclude_ids — скрытые варианты (например, занятые должности).
+    """
+    iterator = LookupChoiceIterator
+
+    def __init__(self, lookup_name, *args, **kwargs):
+        self.lookup_name = lookup_name
+        self.exclude_ids = set()
+        kwargs.setdefault('queryset', LOOKUP_MODELS[lookup_name].objects.all())
+        super().__init__(*args, **kwargs)
+
+    def lookup_objects(self):
+        return [obj for pk, obj in lookup_table(self.lookup_name).items() if pk not in self.exclude_ids]
+
+    def to_python(self, value):
+        if value in self.empty_values:
+            return None
+        try:
+            pk = int(value.pk if isinstance(value, LOOKUP_MODELS[self.lookup_name]) else value)
+        except (TypeError, ValueError):
+            pk = None
+        obj = lookup_table(self.lookup_name).get(pk)
+        if obj is None or pk in self.exclude_ids:
+            raise forms.ValidationError(
+                self.error_messages['invalid_choice'],
+                code='invalid_choice',
+                params={'value': value},
+            )
+        return obj
 
 # Миксин для Tailwind-классов (без изменений — он хороший)
 class TailwindInputMixin:
@@ -75,15 +125,15 @@ class UserRegistrationForm(TailwindInputMixin, UserCreationForm):
     middle_name = forms.CharField(label="Отчество", max_length=150, required=False, widget=forms.TextInput(attrs={'placeholder': 'Отчество (при наличии)'}))
     email = forms.EmailField(label="Email", required=True, widget=forms.EmailInput(attrs={'placeholder': 'your@email.com'}))
 
-    district = forms.ModelChoiceField(
+    district = LookupChoiceField(
+        'district',
         label="Район",
-        queryset=District.objects.all(),
         required=False,
         empty_label="Выберите район",
     )
-    position = forms.ModelChoiceField(
+    position = LookupChoiceField(
+        'position',
         label="Должность",
-        queryset=Position.objects.all(),
         required=False,
         empty_label="Выберите должность",
     )
@@ -121,7 +171,7 @@ class UserRegistrationForm(TailwindInputMixin, UserCreationForm):
             if field_name in self.fields:
                 self.fields[field_name].label = ''
 
-        # Динамическая фильтрация должностей
+        # Динамическая фильтрация должностей (занятые руководящие — из кэша, без запросов к БД)
         selected_district_id = None
         if self.data and 'district' in self.data:
             try:
@@ -130,20 +180,7 @@ class UserRegistrationForm(TailwindInputMixin, UserCreationForm):
                 pass
 
         if selected_district_id:
-            try:
-                selected_district = District.objects.get(id=selected_district_id)
-                head_position = Position.objects.filter(title__iexact="руководитель районного отделения").first()
-                if head_position:
-                    if CustomUser.objects.filter(district=selected_district, position=head_position).exists():
-                        self.fields['position'].queryset = Position.objects.exclude(id=head_position.id)
-                    else:
-                        self.fields['position'].queryset = Position.objects.all()
-                else:
-                    self.fields['position'].queryset = Position.objects.all()
-            except District.DoesNotExist:
-                self.fields['position'].queryset = Position.objects.all()
-        else:
-            self.fields['position'].queryset = Position.objects.all()
+            self.fields['position'].exclude_ids = occupied_position_ids(selected_district_id)
 
     def clean(self):
         cleaned_data = super().clean()
@@ -160,9 +197,8 @@ class UserRegistrationForm(TailwindInputMixin, UserCreationForm):
             position = cleaned_data.get('position')
             district = cleaned_data.get('district')
             if position and district:
-                if position.title.lower() == "руководитель районного отделения":
-                    if CustomUser.objects.filter(district=district, position=position).exists():
-                        self.add_error('position', 'В этом районе уже есть Руководитель.')
+                if position.pk == head_position_id() and position.pk in occupied_position_ids(district.pk):
+                    self.add_error('position', 'В этом районе уже есть Руководитель.')
 
         return cleaned_data
 
@@ -0,0 +1,175 @@
+import hashlib
+import re
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+from . import tracing
+
+# Pillow импортируется внутри функций: модуль загружается вместе с моделями при
+# каждом старте (manage.py, воркеры gunicorn), а Pillow нужен только при обработке загрузок
+
+# --- АВАТАРЫ ---
+# Каждый аватар при загрузке нормализуется (поворот по EXIF, без метаданных)
+# и кодируется в фиксированный набор квадратных размеров в JPEG и WebP.
+# Имена файлов строятся по хэшу содержимого, поэтому их можно кэшировать навсегда.
+AVATAR_SIZES = (48, 96, 256)
+AVATAR_DEFAULT_SIZE = 256
+AVATAR_FORMATS = {
+    'jpg': {'format': 'JPEG', 'quality': 85, 'progressive': True},
+    'webp': {'format': 'WEBP', 'quality': 80, 'method': 4},
+}
+AVATAR_DIR = 'avatars'
+# Ограничения загрузки — проверяются до декодирования (check_image_limits)
+AVATAR_MAX_BYTES = 10 * 1024 * 1024
+AVATAR_MAX_PIXELS = 40_000_000
+
+# avatars/<хэш>-<размер>.<jpg|webp> — имена вариантов (в CustomUser.avatar хранится JPEG)
+AVATAR_VARIANT_RE = re.compile(
+    rf'^(?P<base>{AVATAR_DIR}/[0-9a-f]{{20}})-(?P<size>\d+)\.(?P<ext>jpg|webp)$'
+)
+
+
+def avatar_variant_name(base, size, ext='jpg'):
+    """Имя файла варианта аватара: avatars/<хэш>-<размер>.<ext>"""
+    return f'{base}-{size}.{ext}'
+
+
+def avatar_variant_names(name):
+    """Все файлы аватара (все размеры и форматы) по имени основного JPEG"""
+    match = AVATAR_VARIANT_RE.match(name or '')
+    if not match:
+        return [name] if name else []
+    return [
+        avatar_variant_name(match['base'], size, ext)
+        for size in AVATAR_SIZES
+        for ext in AVATAR_FORMATS
+    ]
+
+
+def normalize_image(uploaded_file):
+    """
+    Открывает загруженное изображение, поворачивает его по EXIF
+    и возвращает RGB-копию без метаданных.
+    """
+    from PIL import Image, ImageOps
+
+    img = Image.open(uploaded_file)
+    # JPEG: декодер сразу уменьшает в 2/4/8 раз (draft mode), но не меньше чем вдвое
+    # от самого крупного варианта — запаса хватает для качественного LANCZOS
+    img.draft('RGB', (AVATAR_DEFAULT_SIZE * 2,) * 2)
+    img = ImageOps.exif_transpose(img)
+    if img.mode != 'RGB':
+        img = img.convert('RGB')
+    # Новое изображение из пикселей — EXIF/ICC/XMP не переносятся
+    clean = Image.new('RGB', img.size)
+    clean.paste(img)
+    return clean
+
+
+def _content_hash(uploaded_file):
+    digest = hashlib.sha256()
+    for chunk in uploaded_file.chunks():
+        digest.update(chunk)
+    uploaded_file.seek(0)
+    return digest.hexdigest()[:20]
+
+
+def process_avatar(uploaded_file, storage=None):
+    """
+    Сохраняет все варианты аватара и возвращает имя основного файла
+    (JPEG размера AVATAR_DEFAULT_SIZE) для записи в CustomUser.avatar.
+    """
+    from PIL import Image, ImageOps
+
+    storage = storage or default_storage
+    base = f'{AVATAR_DIR}/{_content_hash(uploaded_file)}'
+    main_name = avatar_variant_name(base, AVATAR_DEFAULT_SIZE)
+
+    # Тот же файл уже загружали — варианты уже лежат в хранилище. Контентно-адресуемое
+    # хранилище сначала регистрирует все варианты (иначе cleanup_media может удалить
+    # файл между проверкой и назначением полю): если хоть одной строки не было — пересобираем
+    register = getattr(storage, 'register', None)
+    created = register(*avatar_variant_names(main_name)) if register else []
+    if not created and storage.exists(main_name):
+        return main_name
+
+    with tracing.span('image.decode', kind='avatar'):
+        img = normalize_image(uploaded_file)
+
+    for size in sorted(AVATAR_SIZES, reverse=True):
+        with tracing.span('image.resize', size=size):
+            variant = ImageOps.fit(img, (size, size), Image.LANCZOS)
+        for ext, options in AVATAR_FORMATS.items():
+            output = BytesIO()
+            with tracing.span('image.encode', size=size, format=options['format']):
+                variant.save(output, **options)
+            name = avatar_variant_name(base, size, ext)
+            if not storage.exists(name):
+                storage.save(name, ContentFile(output.getvalue()))
+        # Следующий (меньший) размер считаем от уже уменьшенной копии
+        img = variant
+
+    return main_name
+
+
+# --- ФОТО КОМАНДЫ РАЙОНА ---
+# Ограничения проверяются ДО декодирования: размер файла — по загрузке,
+# количество пикселей — по заголовку изображения (Image.open не читает пиксели).
+TEAM_PHOTO_MAX_BYTES = 25 * 1024 * 1024
+TEAM_PHOTO_MAX_PIXELS = 60_000_000
+TEAM_PHOTO_MAX_WIDTH = 1920
+TEAM_PHOTO_QUALITY = 90
+
+
+class ImageTooLargeError(ValueError):
+    """Изображение превышает допустимый размер файла или количество пикселей"""
+
+
+def check_image_limits(uploaded_file, max_bytes, max_pixels):
+    """Проверяет размер файла и разрешение по заголовку, не декодируя пиксели"""
+    from PIL import Image
+
+    if uploaded_file.size > max_bytes:
+        raise ImageTooLargeError(f'Файл больше {max_bytes // (1024 * 1024)} МБ')
+
+    with Image.open(uploaded_file) as img:
+        width, height = img.size
+    uploaded_file.seek(0)
+
+    if width * height > max_pixels:
+        raise ImageTooLargeError(f'Изображение больше {max_pixels // 1_000_000} Мп')
+
+
+def encode_team_photo(source):
+    """
+    Уменьшает фото команды (source — путь или открытый файл) до TEAM_PHOTO_MAX_WIDTH
+    по ширине и кодирует в JPEG. Выполняется в воркере очереди заданий (users.jobs)
+    внутри трассы задания. Возвращает байты JPEG.
+    """
+    from PIL import Image, ImageOps
+
+    with Image.open(source) as img:
+        # Повторная проверка по заголовку: файл мог попасть в очередь в обход представления.
+        # Глобальный Image.MAX_IMAGE_PIXELS не трогаем — он общий для всех в процессе
+        if img.width * img.height > TEAM_PHOTO_MAX_PIXELS:
+            raise ImageTooLargeError(f'Изображение больше {TEAM_PHOTO_MAX_PIXELS // 1_000_000} Мп')
+        with tracing.span('image.decode', kind='team_photo', width=img.width, height=img.height):
+            # JPEG: декодер сразу уменьшает в 2/4/8 раз (draft mode) — полный кадр в память не попадает
+            img.draft('RGB', (TEAM_PHOTO_MAX_WIDTH, TEAM_PHOTO_MAX_WIDTH * img.height // img.width))
+            img = ImageOps.exif_transpose(img)
+
+            if img.mode != 'RGB':
+                img = img.convert('RGB')
+
+        with tracing.span('image.resize'):
+            # thumbnail() уменьшает на месте и сохраняет пропорции
+            img.thumbnail((TEAM_PHOTO_MAX_WIDTH, img.height), Image.LANCZOS, reducing_gap=2.0)
+
+        output = BytesIO()
+        with tracing.span('image.encode', format='JPEG'):
+            img.save(output, format='JPEG', quality=TEAM_PHOTO_QUALITY, progressive=True)
+
+    return output.getvalue()
+
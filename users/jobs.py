@@ -0,0 +1,553 @@
+import json
+import logging
+import multiprocessing
+import os
+import random
+import socket
+import threading
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.storage import FileSystemStorage
+from django.db import IntegrityError, close_old_connections, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+# --- ОЧЕРЕДЬ ФОНОВЫХ ЗАДАНИЙ ---
+# Медленная работа (обработка изображений, уведомления, пересборка отчётов,
+# выгрузки) выполняется не в потоке запроса, а воркером очереди:
+#
+#     @job(max_attempts=3, on_failure=report_failed)
+#     def rebuild_report(district_id): ...
+#
+#     enqueue(rebuild_report, args=[district.pk], priority=10, delay=60,
+#             unique_key=f'report_{district.pk}')
+#
+# Воркер — python manage.py run_jobs (пул потоков или процессов). Хранилище —
+# JOB_QUEUE_BACKEND: 'db' (таблица users.Job, внешний брокер не нужен) или
+# 'redis' (Redis из CACHES, БД не опрашивается).
+# Аргументы — JSON (id объектов, а не сами объекты). Упавшее задание повторяется
+# с экспоненциальной задержкой до max_attempts раз, после последней неудачи
+# вызывается on_failure(*args, **kwargs). Больше приоритет — раньше выполнение.
+# Если воркер упал посреди работы, через JOB_LOCK_TIMEOUT задание вернётся
+# в очередь — задания должны быть идемпотентными.
+
+_registry = {}
+
+
+class JobSpec:
+    __slots__ = ('name', 'func', 'max_attempts', 'priority', 'on_failure')
+
+    def __init__(self, name, func, max_attempts, priority, on_failure):
+        self.name = name
+        self.func = func
+        self.max_attempts = max_attempts
+        self.priority = priority
+        self.on_failure = on_failure
+
+
+def job(max_attempts=None, priority=0, on_failure=None):
+    """Регистрирует функцию как задание (имя — 'модуль.функция')"""
+    def decorator(func):
+        name = f'{func.__module__}.{func.__qualname__}'
+        _registry[name] = JobSpec(name, func, max_attempts, priority, on_failure)
+        func.job_name = name
+        return func
+    return decorator
+
+
+def get_spec(name):
+    """Задание по имени; модуль импортируется, если воркер его ещё не загружал"""
+    if name not in _registry:
+        try:
+            import_string(name)
+        except ImportError:
+            pass
+    try:
+        return _registry[name]
+    except KeyError:
+        raise LookupError(f"Неизвестное задание '{name}' (нет декоратора @job?)")
+
+
+def default_max_attempts():
+    return getattr(settings, 'JOB_MAX_ATTEMPTS', 3)
+
+
+def retry_delay(attempt):
+    """Задержка перед повтором: JOB_RETRY_BASE_DELAY × 2^(попытка-1), ±20%, не больше JOB_RETRY_MAX_DELAY"""
+    base = getattr(settings, 'JOB_RETRY_BASE_DELAY', 10)
+    limit = getattr(settings, 'JOB_RETRY_MAX_DELAY', 3600)
+    return min(base * 2 ** (attempt - 1), limit) * random.uniform(0.8, 1.2)
+
+
+def job_files_storage():
+    """Входные файлы заданий (загрузки, которые обработает воркер)"""
+    return FileSystemStorage(location=getattr(settings, 'JOB_FILES_ROOT', os.path.join(settings.BASE_DIR, 'job_files')))
+
+
+class ClaimedJob:
+    """Задание, взятое воркером в работу"""
+    __slots__ = ('id', 'name', 'args', 'kwargs', 'attempts', 'max_attempts')
+
+    def __init__(self, id, name, args, kwargs, attempts, max_attempts):
+        self.id = id
+        self.name = name
+        self.args = args
+        self.kwargs = kwargs
+        self.attempts = attempts
+        self.max_attempts = max_attempts
+
+    def __str__(self):
+        return f"{self.name} #{self.id}"
+
+
+def enqueue(func, args=(), kwargs=None, priority=None, delay=None, run_at=None, unique_key=None, max_attempts=None):
+    """
+    Ставит задание в очередь. delay — секунды или timedelta (либо точное run_at).
+    Возвращает id задания; если в очереди уже есть задание с тем же unique_key —
+    его id, новое не создаётся.
+    """
+    name = func if isinstance(func, str) else getattr(func, 'job_name', None)
+    if name is None:
+        raise TypeError(f"{func!r} не зарегистрирована как задание (@job)")
+    spec = get_spec(name)
+
+    if run_at is None:
+        if isinstance(delay, (int, float)):
+            delay = timedelta(seconds=delay)
+        run_at = timezone.now() + (delay or timedelta())
+
+    return get_backend().enqueue(
+        name,
+        list(args),
+        dict(kwargs or {}),
+        spec.priority if priority is None else priority,
+        run_at,
+        unique_key,
+        max_attempts or spec.max_attempts or default_max_attempts(),
+    )
+
+
+# --- ХРАНИЛИЩЕ: БД ---
+
+class DatabaseBackend:
+    """Задания в таблице users.Job. Воркеры разбирают их через SELECT ... FOR UPDATE SKIP LOCKED"""
+
+    def enqueue(self, name, args, kwargs, priority, run_at, unique_key, max_attempts):
+        from .models import Job
+
+        fields = {
+            'name': name,
+            'payload': {'args': args, 'kwargs': kwargs},
+            'priority': priority,
+            'run_at': run_at,
+            'unique_key': unique_key,
+            'max_attempts': max_attempts,
+        }
+        if unique_key is None:
+            return Job.objects.create(**fields).pk
+        # Две попытки: задание с этим ключом могло завершиться между INSERT и SELECT
+        for _ in range(2):
+            try:
+                with transaction.atomic():
+                    return Job.objects.create(**fields).pk
+            except IntegrityError:
+                existing = Job.objects.filter(unique_key=unique_key).values_list('pk', flat=True).first()
+                if existing is not None:
+                    return existing
+        raise IntegrityError(f"Не удалось поставить задание с ключом '{unique_key}'")
+
+    def claim(self, worker_id, limit):
+        from .models import Job
+
+        now = timezone.now()
+        with transaction.atomic():
+            ids = list(
+                Job.objects
+                .select_for_update(skip_locked=connection.features.has_select_for_update_skip_locked)
+                .filter(status=Job.QUEUED, run_at__lte=now)
+                .order_by('-priority', 'run_at', 'pk')
+                .values_list('pk', flat=True)[:limit]
+            )
+            if not ids:
+                return []
+            # status=queued в условии — защита там, где нет блокировок строк (SQLite)
+            Job.objects.filter(pk__in=ids, status=Job.QUEUED).update(
+                status=Job.RUNNING, locked_by=worker_id, locked_at=now, attempts=F('attempts') + 1,
+            )
+            rows = (
+                Job.objects
+                .filter(pk__in=ids, status=Job.RUNNING, locked_by=worker_id, locked_at=now)
+                .order_by('-priority', 'run_at', 'pk')
+                .values('pk', 'name', 'payload', 'attempts', 'max_attempts')
+            )
+            return [self._claimed(row) for row in rows]
+
+    def _claimed(self, row):
+        payload = row['payload']
+        return ClaimedJob(
+            row['pk'], row['name'], payload.get('args', []), payload.get('kwargs', {}),
+            row['attempts'], row['max_attempts'],
+        )
+
+    def heartbeat(self, worker_id, jobs):
+        from .models import Job
+        Job.objects.filter(pk__in=[job.id for job in jobs], locked_by=worker_id).update(locked_at=timezone.now())
+
+    def complete(self, job):
+        from .models import Job
+        Job.objects.filter(pk=job.id).update(
+            status=Job.DONE, finished_at=timezone.now(), unique_key=None, locked_by='', last_error='',
+        )
+
+    def retry(self, job, error, delay):
+        from .models import Job
+        Job.objects.filter(pk=job.id).update(
+            status=Job.QUEUED, run_at=timezone.now() + timedelta(seconds=delay), last_error=error, locked_by='',
+        )
+
+    def fail(self, job, error):
+        from .models import Job
+        Job.objects.filter(pk=job.id).update(
+            status=Job.FAILED, finished_at=timezone.now(), unique_key=None, last_error=error, locked_by='',
+        )
+
+    def requeue_stale(self, timeout):
+        """Задания упавших воркеров — обратно в очередь; исчерпавшие попытки возвращаются списком"""
+        from .models import Job
+
+        stale = Job.objects.filter(status=Job.RUNNING, locked_at__lt=timezone.now() - timedelta(seconds=timeout))
+        exhausted = [
+            self._claimed(row)
+            for row in stale.filter(attempts__gte=F('max_attempts'))
+            .values('pk', 'name', 'payload', 'attempts', 'max_attempts')
+        ]
+        for job in exhausted:
+            self.fail(job, "Воркер не завершил задание (упал или был остановлен)")
+        stale.update(status=Job.QUEUED, locked_by='')
+        return exhausted
+
+    def purge(self, before):
+        from .models import Job
+        deleted, _ = Job.objects.filter(status__in=(Job.DONE, Job.FAILED), finished_at__lt=before).delete()
+        return deleted
+
+
+# --- ХРАНИЛИЩЕ: REDIS ---
+
+# Переносит наступившие отложенные задания в очередь и атомарно забирает
+# до ARGV[2] готовых (по приоритету) в running
+_CLAIM_SCRIPT = """
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1])
+for _, id in ipairs(due) do
+    redis.call('ZREM', KEYS[1], id)
+    redis.call('ZADD', KEYS[2], redis.call('HGET', ARGV[3] .. id, 'score'), id)
+end
+local ids = redis.call('ZRANGE', KEYS[2], 0, tonumber(ARGV[2]) - 1)
+for _, id in ipairs(ids) do
+    redis.call('ZREM', KEYS[2], id)
+    redis.call('ZADD', KEYS[3], ARGV[1], id)
+    redis.call('HINCRBY', ARGV[3] .. id, 'attempts', 1)
+end
+return ids
+"""
+
+
+class RedisBackend:
+    """
+    Задания в Redis (соединение кэша django_redis): хэш на задание,
+    сортированные множества ready (по приоритету), delayed (по run_at),
+    running (по времени блокировки) и failed. Выполненные задания удаляются сразу.
+    Внутри транзакции БД задание ставится после commit — воркер не увидит
+    данных, которых ещё нет; enqueue() тогда возвращает None.
+    """
+
+    def __init__(self, alias, prefix='jobs'):
+        self.alias = alias
+        self.prefix = prefix
+        self._script = None
+
+    def _connection(self):
+        from django_redis import get_redis_connection
+        return get_redis_connection(self.alias)
+
+    def _key(self, *parts):
+        return ':'.join((self.prefix,) + parts)
+
+    def _job_key(self, job_id):
+        return self._key('job', str(job_id))
+
+    @staticmethod
+    def _score(priority, job_id):
+        # Больше приоритет — меньше score (ZRANGE от меньшего); при равном — по порядку постановки
+        return -priority * 10 ** 10 + job_id
+
+    def enqueue(self, name, args, kwargs, priority, run_at, unique_key, max_attempts):
+        def push():
+            return self._push(name, args, kwargs, priority, run_at, unique_key, max_attempts)
+
+        if connection.in_atomic_block:
+            transaction.on_commit(push)
+            return None
+        return push()
+
+    def _push(self, name, args, kwargs, priority, run_at, unique_key, max_attempts):
+        redis = self._connection()
+        job_id = redis.incr(self._key('seq'))
+        if unique_key is not None:
+            if not redis.set(self._key('unique', unique_key), job_id, nx=True):
+                existing = redis.get(self._key('unique', unique_key))
+                return int(existing) if existing is not None else None
+
+        pipe = redis.pipeline()
+        pipe.hset(self._job_key(job_id), mapping={
+            'name': name,
+            'payload': json.dumps({'args': args, 'kwargs': kwargs}),
+            'score': self._score(priority, job_id),
+            'attempts': 0,
+            'max_attempts': max_attempts,
+            'unique_key': unique_key or '',
+        })
+        if run_at > timezone.now():
+            pipe.zadd(self._key('delayed'), {job_id: run_at.timestamp()})
+        else:
+            pipe.zadd(self._key('ready'), {job_id: self._score(priority, job_id)})
+        pipe.execute()
+        return job_id
+
+    def claim(self, worker_id, limit):
+        redis = self._connection()
+        if self._script is None:
+            self._script = redis.register_script(_CLAIM_SCRIPT)
+        ids = self._script(
+            keys=[self._key('delayed'), self._key('ready'), self._key('running')],
+            args=[time.time(), limit, self._key('job', '')],
+        )
+        return self._load([int(job_id) for job_id in ids])
+
+    def _load(self, ids):
+        pipe = self._connection().pipeline()
+        for job_id in ids:
+            pipe.hgetall(self._job_key(job_id))
+        jobs = []
+        for job_id, data in zip(ids, pipe.execute()):
+            if not data:
+                continue
+            data = {key.decode(): value.decode() for key, value in data.items()}
+            payload = json.loads(data['payload'])
+            jobs.append(ClaimedJob(
+                job_id, data['name'], payload['args'], payload['kwargs'],
+                int(data['attempts']), int(data['max_attempts']),
+            ))
+        return jobs
+
+    def heartbeat(self, worker_id, jobs):
+        if jobs:
+            self._connection().zadd(self._key('running'), {job.id: time.time() for job in jobs}, xx=True)
+
+    def _release_unique(self, pipe, job_id):
+        unique_key = self._connection().hget(self._job_key(job_id), 'unique_key')
+        if unique_key:
+            pipe.delete(self._key('unique', unique_key.decode()))
+
+    def complete(self, job):
+        pipe = self._connection().pipeline()
+        self._release_unique(pipe, job.id)
+        pipe.zrem(self._key('running'), job.id)
+        pipe.delete(self._job_key(job.id))
+        pipe.execute()
+
+    def retry(self, job, error, delay):
+        pipe = self._connection().pipeline()
+        pipe.hset(self._job_key(job.id), 'last_error', error)
+        pipe.zrem(self._key('running'), job.id)
+        pipe.zadd(self._key('delayed'), {job.id: time.time() + delay})
+        pipe.execute()
+
+    def fail(self, job, error):
+        pipe = self._connection().pipeline()
+        self._release_unique(pipe, job.id)
+        pipe.hset(self._job_key(job.id), 'last_error', error)
+        pipe.zrem(self._key('running'), job.id)
+        pipe.zadd(self._key('failed'), {job.id: time.time()})
+        pipe.execute()
+
+    def requeue_stale(self, timeout):
+        redis = self._connection()
+        stale = [int(job_id) for job_id in redis.zrangebyscore(self._key('running'), '-inf', time.time() - timeout)]
+        exhausted = []
+        for job in self._load(stale):
+            # zrem == 1 — задание вернул этот воркер, а не параллельный
+            if not redis.zrem(self._key('running'), job.id):
+                continue
+            if job.attempts >= job.max_attempts:
+                self.fail(job, "Воркер не завершил задание (упал или был остановлен)")
+                exhausted.append(job)
+            else:
+                score = redis.hget(self._job_key(job.id), 'score')
+                redis.zadd(self._key('ready'), {job.id: float(score)})
+        return exhausted
+
+    def purge(self, before):
+        redis = self._connection()
+        ids = redis.zrangebyscore(self._key('failed'), '-inf', before.timestamp())
+        if ids:
+            pipe = redis.pipeline()
+            for job_id in ids:
+                pipe.delete(self._job_key(int(job_id)))
+            pipe.zrem(self._key('failed'), *ids)
+            pipe.execute()
+        return len(ids)
+
+
+_backends = {}
+
+
+def get_backend():
+    """Хранилище очереди по JOB_QUEUE_BACKEND ('db' или 'redis')"""
+    name = getattr(settings, 'JOB_QUEUE_BACKEND', 'db')
+    if name not in _backends:
+        if name == 'db':
+            _backends[name] = DatabaseBackend()
+        elif name == 'redis':
+            from .cache import redis_cache_alias
+            alias = redis_cache_alias()
+            if alias is None:
+                raise ImproperlyConfigured("JOB_QUEUE_BACKEND='redis' требует кэш django_redis в CACHES")
+            _backends[name] = RedisBackend(alias, getattr(settings, 'JOB_QUEUE_REDIS_PREFIX', 'jobs'))
+        else:
+            raise ImproperlyConfigured(f"Неизвестный JOB_QUEUE_BACKEND: {name!r}")
+    return _backends[name]
+
+
+# --- ВОРКЕР ---
+
+def execute(name, args, kwargs):
+    """Выполняет задание в потоке или процессе пула воркера"""
+    spec = get_spec(name)
+    close_old_connections()
+    try:
+        spec.func(*args, **kwargs)
+    finally:
+        close_old_connections()
+
+
+def _init_process():
+    # Процессы пула запускаются через spawn — Django в них настраивается заново
+    import django
+    django.setup()
+
+
+class Worker:
+    """
+    Забирает готовые задания (не больше свободных мест в пуле), выполняет их
+    в пуле потоков ('thread') или процессов ('process') и записывает результат.
+    Раз в HOUSEKEEPING_INTERVAL продлевает блокировки своих заданий, возвращает
+    в очередь задания упавших воркеров и удаляет старые завершённые.
+    """
+    HOUSEKEEPING_INTERVAL = 30
+
+    def __init__(self, concurrency=None, pool=None, poll_interval=None, backend=None):
+        self.concurrency = concurrency or getattr(settings, 'JOB_WORKER_CONCURRENCY', 4)
+        self.pool = pool or getattr(settings, 'JOB_WORKER_POOL', 'thread')
+        self.poll_interval = poll_interval or getattr(settings, 'JOB_POLL_INTERVAL', 1.0)
+        self.backend = backend or get_backend()
+        self.worker_id = f'{socket.gethostname()}:{os.getpid()}'
+        self.processed = 0
+        self.failed = 0
+        self._stop = threading.Event()
+
+    def stop(self):
+        """Перестать брать задания; начатые будут доделаны"""
+        self._stop.set()
+
+    def _make_executor(self):
+        if self.pool == 'process':
+            return ProcessPoolExecutor(
+                max_workers=self.concurrency,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_process,
+            )
+        return ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='job')
+
+    def run(self, burst=False):
+        """Основной цикл. burst=True — выполнить готовые задания и выйти"""
+        executor = self._make_executor()
+        running = {}
+        last_housekeeping = 0
+        try:
+            while not self._stop.is_set():
+                if time.monotonic() - last_housekeeping > self.HOUSEKEEPING_INTERVAL:
+                    self.housekeeping(running.values())
+                    last_housekeeping = time.monotonic()
+
+                free = self.concurrency - len(running)
+                claimed = self.backend.claim(self.worker_id, free) if free > 0 else []
+                for claimed_job in claimed:
+                    running[executor.submit(execute, claimed_job.name, claimed_job.args, claimed_job.kwargs)] = claimed_job
+
+                if not running:
+                    if burst:
+                        break
+                    self._stop.wait(self.poll_interval)
+                    continue
+
+                done, _ = wait(running, timeout=self.poll_interval, return_when=FIRST_COMPLETED)
+                for future in done:
+                    if self._finish(running.pop(future), future):
+                        # Процесс пула погиб (например, OOM) — остальные задания пула тоже упадут
+                        executor.shutdown(wait=False)
+                        executor = self._make_executor()
+
+            # Остановка: дожидаемся начатых заданий
+            if running:
+                for future in wait(running).done:
+                    self._finish(running.pop(future), future)
+        finally:
+            executor.shutdown(wait=True)
+            close_old_connections()
+
+    def _finish(self, claimed_job, future):
+        """Записывает результат; True — если пул процессов сломан"""
+        error = future.exception()
+        if error is None:
+            self.backend.complete(claimed_job)
+            self.processed += 1
+            logger.info(f"Задание {claimed_job} выполнено (попытка {claimed_job.attempts})")
+            return False
+
+        text = ''.join(traceback.format_exception(error))
+        if claimed_job.attempts < claimed_job.max_attempts:
+            delay = retry_delay(claimed_job.attempts)
+            self.backend.retry(claimed_job, text, delay)
+            logger.warning(f"Задание {claimed_job} упало (попытка {claimed_job.attempts}), повтор через {delay:.0f} с: {error}")
+        else:
+            self.backend.fail(claimed_job, text)
+            self.failed += 1
+            logger.error(f"Задание {claimed_job} не выполнено за {claimed_job.attempts} попыток: {error}")
+            self.on_failure(claimed_job)
+        return isinstance(error, BrokenProcessPool)
+
+    def on_failure(self, claimed_job):
+        try:
+            spec = get_spec(claimed_job.name)
+            if spec.on_failure:
+                spec.on_failure(*claimed_job.args, **claimed_job.kwargs)
+        except Exception as e:
+            logger.error(f"Ошибка в on_failure задания {claimed_job}: {e}", exc_info=True)
+
+    def housekeeping(self, running_jobs):
+        self.backend.heartbeat(self.worker_id, list(running_jobs))
+        for claimed_job in self.backend.requeue_stale(getattr(settings, 'JOB_LOCK_TIMEOUT', 300)):
+            logger.error(f"Задание {claimed_job} не завершено воркером за {claimed_job.attempts} попыток")
+            self.on_failure(claimed_job)
+        keep_days = getattr(settings, 'JOB_KEEP_FINISHED_DAYS', 7)
+        self.backend.purge(timezone.now() - timedelta(days=keep_days))
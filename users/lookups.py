@@ -0,0 +1,115 @@
+from django.core.cache import cache
+
+from .cache import TieredCache
+from .models import CustomUser, District, EventImportance, Position
+
+# --- СПРАВОЧНИКИ (District, Position, EventImportance) ---
+# Маленькие таблицы, которые почти не меняются. Читаются через двухуровневый
+# кэш: LRU внутри воркера → Redis → БД. При изменении строки (см. signals.py)
+# ключ удаляется из Redis, а сброс рассылается всем воркерам через pub/sub.
+# Возвращаемые объекты общие для всех запросов — изменять их нельзя.
+LOOKUPS_CACHE_TIMEOUT = 60 * 60 * 24
+
+LOOKUP_MODELS = {
+    'district': District,
+    'position': Position,
+    'importance': EventImportance,
+}
+
+lookup_cache = TieredCache('lookups', timeout=LOOKUPS_CACHE_TIMEOUT)
+
+
+def lookup_table(name):
+    """Весь справочник: {pk: объект} в порядке сортировки модели"""
+    model = LOOKUP_MODELS[name]
+
+    def load():
+        queryset = model.objects.all()
+        if not queryset.ordered:
+            queryset = queryset.order_by('pk')
+        return {obj.pk: obj for obj in queryset}
+
+    return lookup_cache.get_or_load(name, load)
+
+
+def invalidate_lookup(name):
+    lookup_cache.invalidate(name)
+
+
+def get_district(pk):
+    return lookup_table('district').get(pk) if pk else None
+
+
+def get_position(pk):
+    return lookup_table('position').get(pk) if pk else None
+
+
+def get_importance(pk):
+    return lookup_table('importance').get(pk) if pk else None
+
+
+def all_districts():
+    return list(lookup_table('district').values())
+
+
+def all_positions():
+    return list(lookup_table('position').values())
+
+
+def all_importances():
+    return list(lookup_table('importance').values())
+
+
+# --- КЭШ ДОЛЖНОСТЕЙ ДЛЯ РЕГИСТРАЦИИ ---
+# Карта «район → занятые руководящие должности» зависит от пользователей,
+# поэтому живёт только в общем кэше и сбрасывается при изменении
+# района/должности пользователя.
+HEAD_POSITION_TITLE = "руководитель районного отделения"
+
+OCCUPIED_POSITIONS_CACHE_KEY = 'lookups_occupied_positions'
+
+
+def cached_positions():
+    """Все должности: [{'id': ..., 'title': ...}, ...]"""
+    return [{'id': position.pk, 'title': position.title} for position in all_positions()]
+
+
+def head_position_id():
+    """id должности «Руководитель районного отделения» (None — если её нет)"""
+    for position in all_positions():
+        if position.title.strip().lower() == HEAD_POSITION_TITLE:
+            return position.pk
+    return None
+
+
+def occupied_positions():
+    """Карта {id района: {id занятых руководящих должностей}} — одним запросом"""
+    occupied = cache.get(OCCUPIED_POSITIONS_CACHE_KEY)
+    if occupied is None:
+        occupied = {}
+        head_id = head_position_id()
+        if head_id:
+            rows = (
+                CustomUser.objects
+                .filter(position_id=head_id, district__isnull=False)
+                .values_list('district_id', 'position_id')
+                .distinct()
+            )
+            for district_id, position_id in rows:
+                occupied.setdefault(district_id, set()).add(position_id)
+        cache.set(OCCUPIED_POSITIONS_CACHE_KEY, occupied, LOOKUPS_CACHE_TIMEOUT)
+    return occupied
+
+
+def occupied_position_ids(district_id):
+    return occupied_positions().get(district_id, set())
+
+
+def available_positions(district_id=None):
+    """Должности, которые можно выбрать при регистрации в районе"""
+    occupied = occupied_position_ids(district_id) if district_id else set()
+    return [position for position in cached_positions() if position['id'] not in occupied]
+
+
+def invalidate_occupied_positions():
+    cache.delete(OCCUPIED_POSITIONS_CACHE_KEY)
@@ -0,0 +1,93 @@
+import time
+
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand
+from django.core.signals import request_finished, request_started
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.backends.signals import connection_created
+
+from users.benchmarks import percentile
+
+
+class Command(BaseCommand):
+    help = (
+        "Сравнивает цену соединения с БД на запрос: новое соединение на каждый запрос "
+        "(CONN_MAX_AGE=0) и постоянное с проверкой перед повторным использованием "
+        "(CONN_MAX_AGE>0, CONN_HEALTH_CHECKS). Цикл запроса воспроизводится сигналами "
+        "request_started/request_finished, как в WSGIHandler; в запросе — один SELECT 1."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help="Запросов на вариант")
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS, help="Алиас БД из DATABASES")
+
+    def handle(self, *args, **options):
+        conn = connections[options['database']]
+        settings_dict = conn.settings_dict
+        saved = settings_dict['CONN_MAX_AGE'], settings_dict['CONN_HEALTH_CHECKS']
+        max_age = saved[0] or getattr(settings, 'DB_CONN_MAX_AGE', 60) or 60
+
+        self.stdout.write(f"БД '{conn.alias}' ({conn.vendor}), текущая настройка: "
+                          f"CONN_MAX_AGE={saved[0]}, CONN_HEALTH_CHECKS={saved[1]}\n")
+        self.stdout.write(f"{'вариант':<34}{'соединений':>12}{'p50, мс':>10}{'p95, мс':>10}{'среднее, мс':>14}")
+
+        variants = [
+            ('соединение на запрос', 0, False),
+            ('постоянное', max_age, False),
+            ('постоянное + проверка', max_age, True),
+        ]
+        results = {}
+        try:
+            for title, conn_max_age, health_checks in variants:
+                settings_dict['CONN_MAX_AGE'] = conn_max_age
+                settings_dict['CONN_HEALTH_CHECKS'] = health_checks
+                opened, timings = self.measure(conn, options['requests'])
+                results[title] = timings
+                self.stdout.write(
+                    f"{title:<34}{opened:>12}{percentile(timings, 50):>10.3f}"
+                    f"{percentile(timings, 95):>10.3f}{sum(timings) / len(timings):>14.3f}"
+                )
+        finally:
+            settings_dict['CONN_MAX_AGE'], settings_dict['CONN_HEALTH_CHECKS'] = saved
+            conn.close()
+
+        baseline = sum(results['соединение на запрос'])
+        pooled = sum(results['постоянное + проверка'])
+        self.stdout.write(
+            f"\nЭкономия на запрос: {(baseline - pooled) / options['requests']:.3f} мс "
+            f"({baseline / pooled if pooled else 0:.1f}× быстрее)"
+        )
+
+    def measure(self, conn, count):
+        opened = 0
+
+        def on_created(sender, connection, **kwargs):
+            nonlocal opened
+            if connection.alias == conn.alias:
+                opened += 1
+
+        # Вариант начинается «с нуля»: соединение предыдущего не переиспользуем
+        conn.close()
+        # Прогрев: загрузка драйвера, первое соединение не считаем
+        self.request(conn)
+
+        timings = []
+        connection_created.connect(on_created)
+        try:
+            for _ in range(count):
+                started = time.perf_counter()
+                self.request(conn)
+                timings.append((time.perf_counter() - started) * 1000)
+        finally:
+            connection_created.disconnect(on_created)
+        timings.sort()
+        return opened, timings
+
+    def request(self, conn):
+        # Как в WSGIHandler: close_old_connections() на входе и на выходе запроса
+        request_started.send(sender=WSGIHandler)
+        with conn.cursor() as cursor:
+            cursor.execute('SELECT 1')
+            cursor.fetchone()
+        request_finished.send(sender=WSGIHandler)
@@ -0,0 +1,74 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from users.models import CustomUser
+
+SESSION_ENGINES = {
+    'db': 'django.contrib.sessions.backends.db',
+    'cached_db': 'django.contrib.sessions.backends.cached_db',
+    'signed_cookies': 'django.contrib.sessions.backends.signed_cookies',
+}
+MESSAGE_STORAGES = {
+    'fallback': 'django.contrib.messages.storage.fallback.FallbackStorage',
+    'cookie': 'django.contrib.messages.storage.cookie.CookieStorage',
+}
+PAGES = {
+    'home_dashboard_view': '/',
+    'tasks_view': '/tasks/',
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Сравнивает число запросов к БД на страницу (home_dashboard_view, tasks_view) "
+        "для разных хранилищ сессий и сообщений. Данные создаются во временной транзакции."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=20, help="Запросов на страницу")
+        parser.add_argument('--username', help="Существующий пользователь (по умолчанию — временный)")
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"Текущая настройка: SESSION_ENGINE={settings.SESSION_ENGINE}, "
+                          f"MESSAGE_STORAGE={settings.MESSAGE_STORAGE}\n")
+        self.stdout.write(f"{'сессии':<16}{'сообщения':<12}{'страница':<22}{'запросов/стр.':>14}{'мс/стр.':>10}")
+
+        # «До» — как было в проекте (db + fallback), «после» — остальные варианты
+        variants = [('db', 'fallback'), ('cached_db', 'cookie'), ('signed_cookies', 'cookie')]
+        for session, storage in variants:
+            with override_settings(
+                SESSION_ENGINE=SESSION_ENGINES[session],
+                MESSAGE_STORAGE=MESSAGE_STORAGES[storage],
+                ALLOWED_HOSTS=['*'],
+            ):
+                for page, url in PAGES.items():
+                    queries, elapsed = self.measure(url, options)
+                    self.stdout.write(f"{session:<16}{storage:<12}{page:<22}{queries:>14.1f}{elapsed:>10.1f}")
+
+    def measure(self, url, options):
+        with transaction.atomic():
+            if options['username']:
+                user = CustomUser.objects.get(username=options['username'])
+            else:
+                user = CustomUser.objects.create_user('benchmark_sessions_user', password=None)
+
+            client = Client()
+            client.force_login(user)
+            client.get(url)  # прогрев: кэш справочников, шаблоны
+
+            total_queries = 0
+            started = time.perf_counter()
+            for _ in range(options['requests']):
+                with CaptureQueriesContext(connection) as captured:
+                    client.get(url)
+                total_queries += len(captured)
+            elapsed = (time.perf_counter() - started) * 1000
+
+            transaction.set_rollback(True)
+
+        return total_queries / options['requests'], elapsed / options['requests']
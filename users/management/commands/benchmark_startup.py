@@ -0,0 +1,118 @@
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from users.benchmarks import git_revision, percentile
+
+# Выполняется в новом процессе: этапы холодного старта воркера до первого ответа
+STARTUP_SCRIPT = '''
+import json, time
+started = time.perf_counter()
+marks = {}
+import django
+django.setup()
+marks['setup'] = time.perf_counter()
+from django.core.wsgi import get_wsgi_application
+get_wsgi_application()
+marks['wsgi'] = time.perf_counter()
+from django.urls import get_resolver
+get_resolver().url_patterns
+marks['urls'] = time.perf_counter()
+from django.conf import settings
+from django.test import Client
+settings.ALLOWED_HOSTS = [*settings.ALLOWED_HOSTS, 'testserver']
+status = Client().get(%(path)r).status_code
+marks['first_request'] = time.perf_counter()
+previous, result = started, {'status': status}
+for name, mark in marks.items():
+    result[name] = (mark - previous) * 1000
+    previous = mark
+print(json.dumps(result))
+'''
+PHASES = ('python', 'setup', 'wsgi', 'urls', 'first_request', 'total')
+
+
+class Command(BaseCommand):
+    help = (
+        "Замеряет холодный старт: запуск интерпретатора, django.setup(), WSGI-приложение, "
+        "URLconf и первый запрос — каждый прогон в новом процессе (как новый или "
+        "перезапущенный воркер без preload). Результат — JSON для сравнения между коммитами."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=5, help="Число запусков")
+        parser.add_argument('--path', default='/login/', help="URL первого запроса")
+        parser.add_argument('--output', help="Сохранить результат в JSON-файл")
+        parser.add_argument('--compare', help="JSON предыдущего прогона: показать изменения")
+
+    def handle(self, *args, **options):
+        env = {**os.environ, 'DJANGO_SETTINGS_MODULE': settings.SETTINGS_MODULE}
+        code = STARTUP_SCRIPT % {'path': options['path']}
+
+        # Прогон для прогрева кэша ОС и .pyc — не учитывается
+        runs = [self.run_once(code, env) for _ in range(options['runs'] + 1)][1:]
+
+        result = {
+            'revision': git_revision(),
+            'created_at': timezone.now().isoformat(),
+            'python': platform.python_version(),
+            'runs': options['runs'],
+            'path': options['path'],
+            'status_code': runs[-1]['status'],
+            'phases_ms': {},
+        }
+        for phase in PHASES:
+            timings = sorted(run[phase] for run in runs)
+            result['phases_ms'][phase] = {
+                'p50': round(percentile(timings, 50), 1),
+                'max': round(timings[-1], 1),
+                'mean': round(statistics.fmean(timings), 1),
+            }
+
+        self.report(result, options['compare'])
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(result, f, ensure_ascii=False, indent=2)
+            self.stdout.write(f"Результат сохранён в {options['output']}")
+
+    def run_once(self, code, env):
+        started = time.perf_counter()
+        process = subprocess.run(
+            [sys.executable, '-c', code], cwd=settings.BASE_DIR, env=env, capture_output=True, text=True,
+        )
+        total = (time.perf_counter() - started) * 1000
+        if process.returncode != 0:
+            raise CommandError(f"Старт завершился с ошибкой:\n{process.stderr.strip()[-2000:]}")
+        run = json.loads(process.stdout.strip().splitlines()[-1])
+        run['total'] = total
+        # Запуск интерпретатора и выход — всё, что не попало в этапы внутри процесса
+        run['python'] = total - sum(run[phase] for phase in ('setup', 'wsgi', 'urls', 'first_request'))
+        return run
+
+    def report(self, result, compare_path):
+        baseline = {}
+        if compare_path:
+            with open(compare_path, encoding='utf-8') as f:
+                baseline = json.load(f)
+            self.stdout.write(f"Сравнение с {baseline.get('revision') or compare_path}")
+
+        self.stdout.write(
+            f"Ревизия {result['revision'] or '—'}, Python {result['python']}, запусков {result['runs']}, "
+            f"первый запрос {result['path']} → {result['status_code']}"
+        )
+        self.stdout.write(f"{'этап':<16}{'p50, мс':>10}{'max, мс':>10}")
+        for phase, stats in result['phases_ms'].items():
+            line = f"{phase:<16}{stats['p50']:>10.1f}{stats['max']:>10.1f}"
+            previous = baseline.get('phases_ms', {}).get(phase)
+            if previous:
+                line += f"  ({stats['p50'] - previous['p50']:+.1f} мс)"
+            self.stdout.write(line)
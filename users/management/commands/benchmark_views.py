@@ -0,0 +1,174 @@
+import json
+import platform
+import statistics
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+
+from tasks_app.models import Task
+from users.benchmarks import git_revision, percentile
+from users.lookups import head_position_id
+from users.models import CustomUser, Participation
+
+PERCENTILES = (50, 90, 95, 99)
+
+
+class Command(BaseCommand):
+    help = (
+        "Замеряет задержку (перцентили) и число SQL-запросов основных страниц: tasks/, users/, "
+        "reports/, get-positions/, api/tasks/create/. Результат — JSON для сравнения между коммитами. "
+        "Данные — через generate_dataset."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=50, help="Запросов на каждую страницу")
+        parser.add_argument('--warmup', type=int, default=3, help="Запросов на прогрев (не учитываются)")
+        parser.add_argument('--username', help="Пользователь (по умолчанию — руководитель района с наибольшим числом людей)")
+        parser.add_argument('--only', nargs='+', help="Только указанные страницы (tasks, user_list, ...)")
+        parser.add_argument('--output', help="Сохранить результат в JSON-файл")
+        parser.add_argument('--compare', help="JSON предыдущего прогона: показать изменения")
+
+    def handle(self, *args, **options):
+        user = self.benchmark_user(options['username'])
+        targets = self.targets(user)
+        if options['only']:
+            targets = [target for target in targets if target['name'] in options['only']]
+
+        result = {
+            'revision': git_revision(),
+            'created_at': timezone.now().isoformat(),
+            'database': connection.vendor,
+            'python': platform.python_version(),
+            'requests': options['requests'],
+            'dataset': {
+                'users': CustomUser.objects.count(),
+                'tasks': Task.objects.count(),
+                'signups': Task.users_signed_up.through.objects.count(),
+                'participations': Participation.objects.count(),
+            },
+            'user': user.username,
+            'results': {},
+        }
+
+        # Как в продакшене: без поиска N+1 (обход стека на каждый запрос исказил бы замер)
+        with override_settings(ALLOWED_HOSTS=['*'], QUERY_DETECT_N_PLUS_ONE=False):
+            for target in targets:
+                result['results'][target['name']] = self.measure(user, target, options)
+
+        self.report(result, options['compare'])
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(result, f, ensure_ascii=False, indent=2)
+            self.stdout.write(f"Результат сохранён в {options['output']}")
+
+    def benchmark_user(self, username):
+        if username:
+            try:
+                return CustomUser.objects.get(username=username)
+            except CustomUser.DoesNotExist:
+                raise CommandError(f"Пользователь '{username}' не найден")
+
+        # Руководитель самого большого района — для него tasks/ показывает записавшихся
+        largest_district_ids = (
+            CustomUser.objects.filter(district__isnull=False)
+            .values('district_id').annotate(size=Count('pk')).order_by('-size')
+            .values_list('district_id', flat=True)
+        )
+        user = (
+            CustomUser.objects
+            .filter(position_id=head_position_id(), district_id__in=list(largest_district_ids[:5]),
+                    telegram_id__isnull=False)
+            .first()
+        )
+        if user is None:
+            raise CommandError("Нет руководителя района с telegram_id — сначала запустите generate_dataset")
+        return user
+
+    def targets(self, user):
+        deadline = (timezone.now().date() + timedelta(days=7)).isoformat()
+        return [
+            {'name': 'tasks', 'method': 'get', 'path': '/tasks/'},
+            {'name': 'user_list', 'method': 'get', 'path': '/users/'},
+            {'name': 'reports', 'method': 'get', 'path': '/reports/'},
+            {'name': 'get_positions', 'method': 'get', 'path': f'/get-positions/?district_id={user.district_id}'},
+            {
+                'name': 'api_create_task', 'method': 'post', 'path': '/api/tasks/create/',
+                'anonymous': True, 'writes': True,
+                'data': json.dumps({
+                    'title': "Нагрузочная задача", 'description': "benchmark_views",
+                    'type': 'district', 'deadline': deadline,
+                    'created_by_telegram_id': user.telegram_id,
+                }),
+                'extra': {
+                    'content_type': 'application/json',
+                    'HTTP_AUTHORIZATION': settings.TELEGRAM_BOT_API_TOKEN,
+                },
+            },
+        ]
+
+    def measure(self, user, target, options):
+        client = Client()
+        if not target.get('anonymous'):
+            client.force_login(user)
+
+        def request():
+            return getattr(client, target['method'])(target['path'], target.get('data'), **target.get('extra', {}))
+
+        timings = []
+        queries = []
+        statuses = {}
+        # Пишущие запросы откатываются, чтобы прогоны не меняли данные
+        with transaction.atomic():
+            for _ in range(options['warmup']):
+                request()
+            for _ in range(options['requests']):
+                with CaptureQueriesContext(connection) as captured:
+                    started = time.perf_counter()
+                    response = request()
+                    timings.append((time.perf_counter() - started) * 1000)
+                queries.append(len(captured))
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+            if target.get('writes'):
+                transaction.set_rollback(True)
+
+        timings.sort()
+        return {
+            'latency_ms': {
+                **{f'p{p}': round(percentile(timings, p), 2) for p in PERCENTILES},
+                'mean': round(statistics.fmean(timings), 2),
+                'max': round(timings[-1], 2),
+            },
+            'queries': {'mean': round(statistics.fmean(queries), 2), 'max': max(queries)},
+            'status_codes': {str(code): count for code, count in sorted(statuses.items())},
+        }
+
+    def report(self, result, compare_path):
+        baseline = {}
+        if compare_path:
+            with open(compare_path, encoding='utf-8') as f:
+                baseline = json.load(f)
+            self.stdout.write(f"Сравнение с {baseline.get('revision') or compare_path}")
+
+        self.stdout.write(
+            f"Ревизия {result['revision'] or '—'}, БД {result['database']}, "
+            f"пользователей {result['dataset']['users']}, задач {result['dataset']['tasks']}"
+        )
+        self.stdout.write(f"{'страница':<18}{'p50':>9}{'p95':>9}{'p99':>9}{'SQL':>7}  коды ответов")
+        for name, stats in result['results'].items():
+            latency = stats['latency_ms']
+            line = (f"{name:<18}{latency['p50']:>9.1f}{latency['p95']:>9.1f}{latency['p99']:>9.1f}"
+                    f"{stats['queries']['mean']:>7.1f}  {stats['status_codes']}")
+            previous = baseline.get('results', {}).get(name)
+            if previous:
+                delta = latency['p50'] - previous['latency_ms']['p50']
+                query_delta = stats['queries']['mean'] - previous['queries']['mean']
+                line += f"  (p50 {delta:+.1f} мс, SQL {query_delta:+.1f})"
+            self.stdout.write(line)
@@ -0,0 +1,176 @@
+import re
+import shutil
+import subprocess
+import time
+import urllib.request
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+
+# --- СБОРКА СТАТИКИ (вместо Tailwind CDN, unpkg и Google Fonts) ---
+# Результат кладётся в static/ и коммитится — на сервере Node.js не нужен:
+#   static/build/app.css   — Tailwind только с классами из шаблонов, минифицирован;
+#   static/build/icons.svg — спрайт с иконками Lucide, которые есть в шаблонах;
+#   static/fonts/*.woff2   — Inter 400/600/700, кириллица и латиница.
+# Имена с хэшем и сжатые копии .gz/.br делает collectstatic (users.static_storage).
+TAILWIND_VERSION = '3.4.17'
+LUCIDE_VERSION = '0.468.0'
+FONTSOURCE_INTER_VERSION = '5.1.1'
+
+LUCIDE_ICON_URL = 'https://cdn.jsdelivr.net/npm/lucide-static@{version}/icons/{name}.svg'
+FONT_URL = 'https://cdn.jsdelivr.net/npm/@fontsource/inter@{version}/files/{name}'
+FONT_WEIGHTS = (400, 600, 700)
+FONT_SUBSETS = ('cyrillic', 'latin')
+
+# Старые имена иконок (шаблоны писались под lucide@latest, где они — псевдонимы)
+# → имена файлов в lucide-static. В спрайте символ называется как в шаблоне.
+ICON_ALIASES = {
+    'alert-circle': 'circle-alert',
+    'alert-triangle': 'triangle-alert',
+    'bar-chart-3': 'chart-column',
+    'check-circle': 'circle-check-big',
+    'home': 'house',
+    'plus-circle': 'circle-plus',
+    'upload-cloud': 'cloud-upload',
+}
+
+# data-lucide="name" в разметке и setAttribute('data-lucide', 'name') в скриптах
+ICON_NAME_RES = (
+    re.compile(r'data-lucide="([a-z0-9-]+)"'),
+    re.compile(r"""['"]data-lucide['"]\s*,\s*['"]([a-z0-9-]+)['"]"""),
+)
+SVG_ROOT_RE = re.compile(r'<svg\b[^>]*>(.*)</svg>', re.S)
+
+
+def template_dirs():
+    return [Path(settings.BASE_DIR) / 'users' / 'templates']
+
+
+def find_icon_names(dirs):
+    names = set()
+    for directory in dirs:
+        for path in directory.rglob('*.html'):
+            text = path.read_text(encoding='utf-8')
+            for regex in ICON_NAME_RES:
+                names.update(regex.findall(text))
+    return sorted(names)
+
+
+def download(url, timeout=30):
+    with urllib.request.urlopen(url, timeout=timeout) as response:
+        return response.read()
+
+
+class Command(BaseCommand):
+    help = (
+        "Собирает статику: CSS-бандл Tailwind (только используемые классы, минифицирован), "
+        "спрайт иконок Lucide и локальные шрифты Inter. --collect — сразу collectstatic "
+        "(имена с хэшем, .gz/.br)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--skip-css', action='store_true', help="Не пересобирать CSS (нет Node.js/Tailwind CLI)")
+        parser.add_argument('--refresh', action='store_true', help="Заново скачать иконки и шрифты")
+        parser.add_argument('--collect', action='store_true', help="После сборки выполнить collectstatic")
+
+    def handle(self, *args, **options):
+        self.base_dir = Path(settings.BASE_DIR)
+        self.static_dir = self.base_dir / 'static'
+        self.cache_dir = self.base_dir / 'assets' / '.cache'
+        (self.static_dir / 'build').mkdir(parents=True, exist_ok=True)
+
+        started = time.perf_counter()
+        self.build_fonts(options['refresh'])
+        self.build_icons(options['refresh'])
+        if not options['skip_css']:
+            self.build_css()
+
+        self.stdout.write(self.style.SUCCESS(f"Статика собрана за {time.perf_counter() - started:.1f} с"))
+
+        if options['collect']:
+            call_command('collectstatic', interactive=False, verbosity=options['verbosity'])
+
+    def log(self, message):
+        self.stdout.write(f"  {message}")
+
+    def fetch(self, url, target, refresh):
+        """Скачивает файл, если его ещё нет (или --refresh)"""
+        if target.exists() and not refresh:
+            return target.read_bytes()
+        try:
+            data = download(url)
+        except OSError as e:
+            raise CommandError(f"Не удалось скачать {url}: {e}")
+        target.parent.mkdir(parents=True, exist_ok=True)
+        target.write_bytes(data)
+        return data
+
+    # --- Шрифты ---
+
+    def build_fonts(self, refresh):
+        fonts_dir = self.static_dir / 'fonts'
+        total = 0
+        for subset in FONT_SUBSETS:
+            for weight in FONT_WEIGHTS:
+                name = f'inter-{subset}-{weight}-normal.woff2'
+                url = FONT_URL.format(version=FONTSOURCE_INTER_VERSION, name=name)
+                total += len(self.fetch(url, fonts_dir / name, refresh))
+        self.log(f"Шрифты: {len(FONT_SUBSETS) * len(FONT_WEIGHTS)} файлов, {total // 1024} КБ")
+
+    # --- Иконки ---
+
+    def build_icons(self, refresh):
+        names = find_icon_names(template_dirs())
+        if not names:
+            raise CommandError("В шаблонах не найдено ни одной иконки data-lucide")
+
+        symbols = []
+        for name in names:
+            file_name = ICON_ALIASES.get(name, name)
+            url = LUCIDE_ICON_URL.format(version=LUCIDE_VERSION, name=file_name)
+            svg = self.fetch(url, self.cache_dir / f'lucide-{LUCIDE_VERSION}' / f'{file_name}.svg', refresh).decode()
+            match = SVG_ROOT_RE.search(svg)
+            if not match:
+                raise CommandError(f"Неожиданный формат иконки {name}")
+            # Атрибуты stroke/fill задаёт внешний <svg> (static/js/icons.js) — символ их наследует
+            body = re.sub(r'>\s+<', '><', match.group(1).strip())
+            symbols.append(f'<symbol id="{name}" viewBox="0 0 24 24">{body}</symbol>')
+
+        sprite = (
+            '<svg xmlns="http://www.w3.org/2000/svg">'
+            + ''.join(symbols)
+            + '</svg>\n'
+        )
+        target = self.static_dir / 'build' / 'icons.svg'
+        target.write_text(sprite, encoding='utf-8')
+        self.log(f"Иконки: {len(names)} в спрайте, {len(sprite.encode()) // 1024} КБ")
+
+    # --- CSS ---
+
+    def tailwind_command(self):
+        """Автономный бинарник tailwindcss (TAILWIND_CLI или из PATH), иначе npx"""
+        cli = getattr(settings, 'TAILWIND_CLI', None) or shutil.which('tailwindcss')
+        if cli:
+            return [str(cli)]
+        if shutil.which('npx'):
+            return ['npx', '--yes', f'tailwindcss@{TAILWIND_VERSION}']
+        raise CommandError(
+            "Не найден Tailwind CLI: установите автономный бинарник tailwindcss "
+            "(или Node.js для npx), укажите путь в TAILWIND_CLI, либо запустите с --skip-css"
+        )
+
+    def build_css(self):
+        target = self.static_dir / 'build' / 'app.css'
+        command = self.tailwind_command() + [
+            '--config', str(self.base_dir / 'assets' / 'tailwind.config.js'),
+            '--input', str(self.base_dir / 'assets' / 'app.css'),
+            '--output', str(target),
+            '--minify',
+        ]
+        # cwd — корень проекта: пути в content конфигурации относительные
+        result = subprocess.run(command, cwd=self.base_dir, capture_output=True, text=True)
+        if result.returncode != 0:
+            raise CommandError(f"Tailwind завершился с ошибкой:\n{result.stderr.strip()}")
+        self.log(f"CSS: {target.relative_to(self.base_dir)}, {target.stat().st_size // 1024} КБ")
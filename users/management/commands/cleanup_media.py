@@ -0,0 +1,88 @@
+from collections import Counter
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from users.models import MediaBlob
+from users.signals import MEDIA_FIELDS, media_file_names
+from users.storage import content_addressed_storage
+
+
+class Command(BaseCommand):
+    help = "Удаляет медиафайлы, на которые не ссылается ни один пользователь или район"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--grace-hours', type=int, default=24,
+            help="Не удалять файлы, счётчик которых менялся недавно (по умолчанию 24 ч)",
+        )
+        parser.add_argument(
+            '--recount', action='store_true',
+            help="Перед очисткой пересчитать счётчики ссылок по данным в БД",
+        )
+        parser.add_argument('--dry-run', action='store_true', help="Только показать, что будет удалено")
+
+    def handle(self, *args, **options):
+        if options['recount']:
+            self.recount()
+
+        cutoff = timezone.now() - timedelta(hours=options['grace_hours'])
+        orphans = MediaBlob.objects.filter(refcount__lte=0, updated_at__lt=cutoff)
+
+        deleted = 0
+        for blob in orphans.iterator():
+            if options['dry_run']:
+                self.stdout.write(blob.name)
+                continue
+            # Строку блокируем с повторной проверкой условия: если за время прохода файл
+            # снова назначили (refcount > 0) или загрузили (updated_at), она не выберется,
+            # и файл остаётся. Пока блокировка держится, MediaBlob.register и
+            # change_refcount ждут — загрузка увидит, что строки и файла уже нет
+            with transaction.atomic():
+                claimed = MediaBlob.objects.select_for_update().filter(
+                    pk=blob.pk, refcount__lte=0, updated_at__lt=cutoff,
+                ).first()
+                if claimed:
+                    content_addressed_storage.delete(claimed.name)
+                    claimed.delete()
+                    deleted += 1
+
+        if options['dry_run']:
+            self.stdout.write(f"Будет удалено файлов: {orphans.count()}")
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Удалено файлов: {deleted}"))
+
+    @transaction.atomic
+    def recount(self):
+        """Пересчитывает MediaBlob.refcount по значениям полей в БД"""
+        counts = Counter()
+        for model, field_name in MEDIA_FIELDS.items():
+            values = (
+                model.objects
+                .exclude(**{field_name: ''})
+                .exclude(**{f'{field_name}__isnull': True})
+                .values_list(field_name, flat=True)
+            )
+            for name in values.iterator():
+                counts.update(media_file_names(name))
+
+        known = set(MediaBlob.objects.values_list('name', flat=True))
+        MediaBlob.objects.bulk_create(
+            [MediaBlob(name=name) for name in counts if name not in known],
+            batch_size=500,
+        )
+
+        now = timezone.now()
+        blobs = list(MediaBlob.objects.only('pk', 'name', 'refcount'))
+        changed = []
+        for blob in blobs:
+            refcount = counts.get(blob.name, 0)
+            if blob.refcount != refcount:
+                blob.refcount = refcount
+                blob.updated_at = now
+                changed.append(blob)
+        MediaBlob.objects.bulk_update(changed, ['refcount', 'updated_at'], batch_size=500)
+
+        self.stdout.write(f"Пересчитано счётчиков: {len(changed)}")
@@ -0,0 +1,272 @@
+import random
+import time
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from tasks_app.models import Task
+from users.lookups import LOOKUP_MODELS, invalidate_lookup, invalidate_occupied_positions
+from users.models import CustomUser, District, Event, EventImportance, Participation, Position
+
+# Метки синтетических данных — по ним --clear находит, что удалять
+SYNTHETIC_USERNAME_PREFIX = 'synthetic_'
+SYNTHETIC_DISTRICT_CODE_PREFIX = 'SYN'
+SYNTHETIC_TASK_CREATOR = 'synthetic'
+SYNTHETIC_EVENT_PREFIX = '[synthetic] '
+SYNTHETIC_TELEGRAM_ID_BASE = 9_000_000_000
+SYNTHETIC_PASSWORD = 'synthetic'
+
+HEAD_POSITION = "Руководитель районного отделения"
+DEPUTY_POSITION = "Заместитель руководителя районного отделения"
+MEMBER_POSITIONS = ["Участник", "Активист", "Секретарь", "Волонтёр"]
+
+IMPORTANCE_LEVELS = [("Низкая", 1), ("Средняя", 2), ("Высокая", 3), ("Федеральная", 5)]
+
+FIRST_NAMES = ["Александр", "Мария", "Дмитрий", "Анна", "Сергей", "Елена", "Иван", "Ольга", "Никита", "Дарья"]
+LAST_NAMES = ["Иванов", "Петров", "Сидоров", "Смирнов", "Кузнецов", "Попов", "Васильев", "Соколов", "Морозов", "Волков"]
+
+
+class Command(BaseCommand):
+    help = (
+        "Создаёт синтетические данные заданного масштаба: районы, должности, пользователи, "
+        "задачи всех типов, записи на задачи, мероприятия и участия (bulk_create пачками)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--districts', type=int, default=30)
+        parser.add_argument('--users', type=int, default=20000)
+        parser.add_argument('--tasks', type=int, default=2000)
+        parser.add_argument('--signups-per-task', type=int, default=15, help="В среднем записей на задачу")
+        parser.add_argument('--events', type=int, default=500)
+        parser.add_argument('--participations-per-user', type=int, default=3, help="В среднем участий на пользователя")
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--seed', type=int, default=42, help="Одинаковый seed — одинаковый набор данных")
+        parser.add_argument('--clear', action='store_true', help="Сначала удалить ранее созданные синтетические данные")
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+
+        if options['clear']:
+            self.clear()
+
+        started = time.perf_counter()
+        with transaction.atomic():
+            positions = self.create_positions()
+            importances = self.create_importances()
+            districts = self.create_districts(options['districts'])
+            user_ids = self.create_users(options['users'], districts, positions)
+            task_ids = self.create_tasks(options['tasks'], districts)
+            self.create_signups(task_ids, user_ids, options['signups_per_task'])
+            event_ids = self.create_events(options['events'], importances)
+            self.create_participations(user_ids, event_ids, options['participations_per_user'])
+
+        # bulk_create не отправляет post_save — сбрасываем кэш справочников вручную
+        for name in LOOKUP_MODELS:
+            invalidate_lookup(name)
+        invalidate_occupied_positions()
+
+        self.stdout.write(self.style.SUCCESS(f"Готово за {time.perf_counter() - started:.1f} с"))
+
+    def log(self, message):
+        self.stdout.write(f"  {message}")
+
+    # --- Справочники ---
+
+    def create_positions(self):
+        titles = [HEAD_POSITION, DEPUTY_POSITION] + MEMBER_POSITIONS
+        Position.objects.bulk_create([Position(title=title) for title in titles], ignore_conflicts=True)
+        positions = {position.title: position.pk for position in Position.objects.filter(title__in=titles)}
+        self.log(f"должностей: {len(positions)}")
+        return positions
+
+    def create_importances(self):
+        existing_weights = set(EventImportance.objects.values_list('weight', flat=True))
+        EventImportance.objects.bulk_create(
+            [EventImportance(level=level, weight=weight)
+             for level, weight in IMPORTANCE_LEVELS if weight not in existing_weights],
+            ignore_conflicts=True,
+        )
+        return list(EventImportance.objects.values_list('pk', flat=True))
+
+    def create_districts(self, count):
+        existing = District.objects.filter(code__startswith=SYNTHETIC_DISTRICT_CODE_PREFIX).count()
+        District.objects.bulk_create([
+            District(name=f"Синтетический район {i + 1}", code=f"{SYNTHETIC_DISTRICT_CODE_PREFIX}{i + 1}")
+            for i in range(existing, count)
+        ], batch_size=self.batch_size)
+        districts = list(
+            District.objects.filter(code__startswith=SYNTHETIC_DISTRICT_CODE_PREFIX)
+            .order_by('pk').values_list('pk', flat=True)[:count]
+        )
+        self.log(f"районов: {len(districts)}")
+        return districts
+
+    # --- Пользователи ---
+
+    def create_users(self, count, districts, positions):
+        start = CustomUser.objects.filter(username__startswith=SYNTHETIC_USERNAME_PREFIX).count()
+        # Хэш пароля считается один раз — make_password на каждого занял бы минуты
+        password = make_password(SYNTHETIC_PASSWORD)
+        member_positions = [positions[title] for title in MEMBER_POSITIONS]
+        # Районы, где руководитель и заместитель уже есть (после прерванного запуска,
+        # в том числе заведённые не этой командой) — второй раз их не назначаем
+        occupied_heads, occupied_deputies = (
+            set(
+                CustomUser.objects.filter(position_id=positions[title], district_id__in=districts)
+                .values_list('district_id', flat=True)
+            )
+            for title in (HEAD_POSITION, DEPUTY_POSITION)
+        )
+
+        batch = []
+        for i in range(start, count):
+            district_id = districts[i % len(districts)]
+            # Первые пользователи каждого района — руководитель и заместитель
+            if district_id not in occupied_heads:
+                position_id = positions[HEAD_POSITION]
+                occupied_heads.add(district_id)
+            elif district_id not in occupied_deputies:
+                position_id = positions[DEPUTY_POSITION]
+                occupied_deputies.add(district_id)
+            else:
+                position_id = self.random.choice(member_positions)
+
+            batch.append(CustomUser(
+                username=f"{SYNTHETIC_USERNAME_PREFIX}{i}",
+                password=password,
+                first_name=self.random.choice(FIRST_NAMES),
+                last_name=self.random.choice(LAST_NAMES),
+                email=f"{SYNTHETIC_USERNAME_PREFIX}{i}@example.com",
+                department_type='district',
+                district_id=district_id,
+                position_id=position_id,
+                telegram_id=SYNTHETIC_TELEGRAM_ID_BASE + i,
+            ))
+            if len(batch) >= self.batch_size:
+                CustomUser.objects.bulk_create(batch)
+                batch = []
+        CustomUser.objects.bulk_create(batch)
+
+        user_ids = list(
+            CustomUser.objects.filter(username__startswith=SYNTHETIC_USERNAME_PREFIX)
+            .values_list('pk', 'district_id')
+        )
+        self.log(f"пользователей: {len(user_ids)}")
+        return user_ids
+
+    # --- Задачи и записи ---
+
+    def create_tasks(self, count, districts):
+        today = timezone.now().date()
+        types = [code for code, _ in Task.TYPE_CHOICES]
+        statuses = [code for code, _ in Task.STATUS_CHOICES]
+        start = Task.objects.filter(created_by_username=SYNTHETIC_TASK_CREATOR).count()
+
+        batch = []
+        for i in range(start, count):
+            # Все типы задач по кругу, районные — с районом
+            task_type = types[i % len(types)]
+            deadline = today + timedelta(days=self.random.randint(-60, 60))
+            batch.append(Task(
+                title=f"Задача {i + 1}",
+                description="Синтетическая задача для проверки производительности",
+                type=task_type,
+                status=self.random.choice(statuses),
+                deadline=deadline,
+                event_date=deadline if self.random.random() < 0.5 else None,
+                district_id=self.random.choice(districts) if task_type == 'district' else None,
+                created_by_username=SYNTHETIC_TASK_CREATOR,
+            ))
+            if len(batch) >= self.batch_size:
+                Task.objects.bulk_create(batch)
+                batch = []
+        Task.objects.bulk_create(batch)
+
+        task_ids = list(Task.objects.filter(created_by_username=SYNTHETIC_TASK_CREATOR).values_list('pk', flat=True))
+        self.log(f"задач: {len(task_ids)}")
+        return task_ids
+
+    def create_signups(self, task_ids, user_ids, per_task):
+        Signup = Task.users_signed_up.through
+        users_by_district = {}
+        for user_id, district_id in user_ids:
+            users_by_district.setdefault(district_id, []).append(user_id)
+        districts = list(users_by_district)
+
+        total = 0
+        batch = []
+        for task_id in task_ids:
+            # Записываются в основном люди из одного района
+            pool = users_by_district[self.random.choice(districts)]
+            size = min(len(pool), self.random.randint(0, per_task * 2))
+            for user_id in self.random.sample(pool, size):
+                batch.append(Signup(task_id=task_id, customuser_id=user_id))
+            if len(batch) >= self.batch_size:
+                Signup.objects.bulk_create(batch, ignore_conflicts=True)
+                total += len(batch)
+                batch = []
+        Signup.objects.bulk_create(batch, ignore_conflicts=True)
+        total += len(batch)
+        self.log(f"записей на задачи: {total}")
+
+    # --- Мероприятия и участия ---
+
+    def create_events(self, count, importances):
+        today = timezone.now().date()
+        event_types = [code for code, _ in Event.EVENT_TYPE_CHOICES]
+        start = Event.objects.filter(name__startswith=SYNTHETIC_EVENT_PREFIX).count()
+        Event.objects.bulk_create([
+            Event(
+                name=f"{SYNTHETIC_EVENT_PREFIX}Мероприятие {i + 1}",
+                date=today - timedelta(days=self.random.randint(0, 730)),
+                event_type=self.random.choice(event_types),
+                importance_id=self.random.choice(importances) if importances else None,
+            )
+            for i in range(start, count)
+        ], batch_size=self.batch_size)
+
+        event_ids = list(Event.objects.filter(name__startswith=SYNTHETIC_EVENT_PREFIX).values_list('pk', flat=True))
+        self.log(f"мероприятий: {len(event_ids)}")
+        return event_ids
+
+    def create_participations(self, user_ids, event_ids, per_user):
+        if not event_ids:
+            return
+        roles = [code for code, _ in Participation.ROLE_CHOICES]
+
+        batch = []
+        for user_id, _district_id in user_ids:
+            size = min(len(event_ids), self.random.randint(0, per_user * 2))
+            for event_id in self.random.sample(event_ids, size):
+                batch.append(Participation(user_id=user_id, event_id=event_id, role=self.random.choice(roles)))
+            if len(batch) >= self.batch_size:
+                Participation.objects.bulk_create(batch, ignore_conflicts=True)
+                batch = []
+        Participation.objects.bulk_create(batch, ignore_conflicts=True)
+
+        # participants_count — по сгруппированным участиям, bulk_update пачками
+        counts = (
+            Participation.objects.filter(event_id__in=event_ids)
+            .values('event_id').annotate(total=Count('pk'))
+        )
+        events = [Event(pk=row['event_id'], participants_count=row['total']) for row in counts]
+        Event.objects.bulk_update(events, ['participants_count'], batch_size=self.batch_size)
+        self.log(f"участий: {sum(event.participants_count for event in events)}")
+
+    # --- Очистка ---
+
+    @transaction.atomic
+    def clear(self):
+        deleted = {
+            'участий': Participation.objects.filter(event__name__startswith=SYNTHETIC_EVENT_PREFIX).delete()[0],
+            'мероприятий': Event.objects.filter(name__startswith=SYNTHETIC_EVENT_PREFIX).delete()[0],
+            'задач': Task.objects.filter(created_by_username=SYNTHETIC_TASK_CREATOR).delete()[0],
+            'пользователей': CustomUser.objects.filter(username__startswith=SYNTHETIC_USERNAME_PREFIX).delete()[0],
+            'районов': District.objects.filter(code__startswith=SYNTHETIC_DISTRICT_CODE_PREFIX).delete()[0],
+        }
+        self.stdout.write("Удалено: " + ", ".join(f"{name} {count}" for name, count in deleted.items()))
@@ -0,0 +1,58 @@
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from users.onboarding import import_users, read_rows, write_invites_csv
+
+
+class Command(BaseCommand):
+    help = (
+        "Массовое создание пользователей из CSV (bulk_create, без хэширования паролей). "
+        "Колонки: username, last_name, first_name, middle_name, email, district (название или код), "
+        "position, telegram_id, department_type. Пароли задаются по одноразовым ссылкам из отчёта."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('csv_path', help="CSV-файл (UTF-8, разделитель «,» или «;»)")
+        parser.add_argument(
+            '--output',
+            help="Отчёт со ссылками-приглашениями (по умолчанию <файл>-invites.csv, при --dry-run — <файл>-check.csv)",
+        )
+        parser.add_argument('--base-url', default=settings.SITE_URL, help="Адрес сайта для ссылок (SITE_URL)")
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true', help="Только проверить файл, ничего не создавать")
+
+    def handle(self, *args, **options):
+        source = Path(options['csv_path'])
+        try:
+            with open(source, 'rb') as f:
+                rows = read_rows(f)
+        except (OSError, ValueError) as e:
+            raise CommandError(e)
+
+        # Проверка не затирает отчёт с приглашениями, а повторный импорт — отчёт прошлого
+        # (ссылки из него уже не выдать: все строки отклонятся как занятые логины)
+        output = options['output']
+        if not output:
+            output = source.with_name(f"{source.stem}-{'check' if options['dry_run'] else 'invites'}.csv")
+            if not options['dry_run'] and output.exists():
+                raise CommandError(f"Отчёт {output} уже есть — укажите другой файл через --output")
+        output = Path(output)
+
+        result = import_users(rows, batch_size=options['batch_size'], dry_run=options['dry_run'])
+
+        # utf-8-sig — чтобы Excel открыл отчёт с кириллицей без настройки кодировки
+        with open(output, 'w', encoding='utf-8-sig', newline='') as f:
+            write_invites_csv(f, result.rows(options['base_url']))
+
+        verb = "Можно создать" if result.dry_run else "Создано"
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} пользователей: {len(result.created)} за {result.seconds:.2f} с, "
+            f"отклонено строк: {len(result.rejected)}"
+        ))
+        for line, username, error in result.rejected[:20]:
+            self.stdout.write(f"  строка {line} ({username or '—'}): {error}")
+        if len(result.rejected) > 20:
+            self.stdout.write(f"  … и ещё {len(result.rejected) - 20}, см. отчёт")
+        self.stdout.write(f"Отчёт: {output}")
@@ -0,0 +1,78 @@
+import os
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Пакеты проекта — их модули показываем отдельно
+PROJECT_PACKAGES = ('users', 'tasks_app', 'mg_project')
+
+
+def startup_code(urls=True):
+    """Код старта, который профилируется: django.setup() и (как на первом запросе) URLconf"""
+    code = 'import django; django.setup()'
+    if urls:
+        code += '; from django.urls import get_resolver; get_resolver().url_patterns'
+    return code
+
+
+def parse_importtime(output):
+    """
+    Строки python -X importtime: 'import time: <self мкс> | <cumulative мкс> | <отступ><модуль>'
+    → список (модуль, self_us, cumulative_us) в порядке завершения импорта
+    """
+    modules = []
+    for line in output.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        parts = line[len('import time:'):].split('|')
+        if len(parts) != 3 or not parts[0].strip().isdigit():
+            continue  # заголовок
+        modules.append((parts[2].strip(), int(parts[0]), int(parts[1])))
+    return modules
+
+
+class Command(BaseCommand):
+    help = (
+        "Время импорта модулей при старте (python -X importtime в новом процессе): "
+        "django.setup() и загрузка URLconf, как у воркера на первом запросе. Показывает "
+        "модули проекта (с тем, что они подгружают) и самые тяжёлые пакеты."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=15, help="Сколько строк в каждой таблице")
+        parser.add_argument('--no-urls', action='store_true', help="Только django.setup(), без URLconf")
+        parser.add_argument('--all', action='store_true', help="Все модули, а не только модули проекта")
+
+    def handle(self, *args, **options):
+        env = {**os.environ, 'DJANGO_SETTINGS_MODULE': settings.SETTINGS_MODULE}
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', startup_code(urls=not options['no_urls'])],
+            cwd=settings.BASE_DIR, env=env, capture_output=True, text=True,
+        )
+        modules = parse_importtime(result.stderr)
+        if result.returncode != 0 or not modules:
+            raise CommandError(f"Не удалось выполнить старт проекта:\n{result.stderr.strip()[-2000:]}")
+
+        total_ms = sum(self_us for _, self_us, _ in modules) / 1000
+        self.stdout.write(f"Импорт при старте: {total_ms:.1f} мс, модулей: {len(modules)}\n")
+
+        if options['all']:
+            selected = modules
+            title = "модуль"
+        else:
+            selected = [row for row in modules if row[0].split('.')[0] in PROJECT_PACKAGES]
+            title = "модуль проекта"
+        self.stdout.write(f"{title:<48}{'свой, мс':>10}{'всего, мс':>11}")
+        for name, self_us, cumulative_us in sorted(selected, key=lambda row: -row[2])[:options['top']]:
+            self.stdout.write(f"{name:<48}{self_us / 1000:>10.1f}{cumulative_us / 1000:>11.1f}")
+
+        # Собственное время, сложенное по пакету верхнего уровня (django, PIL, redis, ...)
+        packages = {}
+        for name, self_us, _ in modules:
+            package = name.split('.')[0]
+            packages[package] = packages.get(package, 0) + self_us
+        self.stdout.write(f"\n{'пакет':<48}{'мс':>10}{'доля':>11}")
+        for package, self_us in sorted(packages.items(), key=lambda item: -item[1])[:options['top']]:
+            self.stdout.write(f"{package:<48}{self_us / 1000:>10.1f}{self_us / 10 / total_ms:>10.0f}%")
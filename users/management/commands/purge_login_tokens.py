@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from users.telegram_tokens import purge_expired_login_tokens
+
+
+class Command(BaseCommand):
+    help = "Удаляет истёкшие токены входа через Telegram"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help="Размер пачки удаления")
+
+    def handle(self, *args, **options):
+        deleted = purge_expired_login_tokens(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Удалено токенов: {deleted}"))
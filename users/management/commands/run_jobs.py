@@ -0,0 +1,33 @@
+import signal
+
+from django.core.management.base import BaseCommand
+
+from users.jobs import Worker
+
+
+class Command(BaseCommand):
+    help = (
+        "Воркер очереди фоновых заданий (users.jobs). Выполняет задания в пуле потоков "
+        "или процессов; SIGTERM/Ctrl+C — доделать начатые задания и выйти."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, help="Размер пула (по умолчанию JOB_WORKER_CONCURRENCY)")
+        parser.add_argument('--pool', choices=('thread', 'process'), help="Пул потоков или процессов (JOB_WORKER_POOL)")
+        parser.add_argument('--poll-interval', type=float, help="Пауза опроса пустой очереди, сек (JOB_POLL_INTERVAL)")
+        parser.add_argument('--burst', action='store_true', help="Выполнить готовые задания и выйти")
+
+    def handle(self, *args, **options):
+        worker = Worker(
+            concurrency=options['concurrency'],
+            pool=options['pool'],
+            poll_interval=options['poll_interval'],
+        )
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, lambda *_: worker.stop())
+
+        self.stdout.write(f"Воркер {worker.worker_id}: пул {worker.pool} × {worker.concurrency}")
+        worker.run(burst=options['burst'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Выполнено заданий: {worker.processed}, с ошибкой: {worker.failed}"
+        ))
@@ -0,0 +1,211 @@
+import bisect
+import os
+import threading
+import time
+from contextvars import ContextVar
+
+from . import tracing
+
+# --- МЕТРИКИ ЗАПРОСОВ ---
+# Сбор идёт в памяти процесса (у каждого gunicorn-воркера — свои значения,
+# в выдаче они помечены меткой pid). Для одного запроса данные копятся в
+# RequestMetrics, который доступен через ContextVar — без блокировок.
+# /metrics/ отвечает тот воркер, к которому попал запрос: Prometheus должен
+# опрашивать каждый воркер отдельно (или суммировать по pid несколько опросов),
+# иначе в выдаче только часть трафика. После перезапуска воркера счётчики
+# начинаются с нуля — rate()/increase() это учитывают.
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_current = ContextVar('request_metrics', default=None)
+
+
+class RequestMetrics:
+    __slots__ = ('started', 'db_queries', 'db_time', 'cache_hits', 'cache_misses',
+                 'template_time', '_template_depth')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.db_queries = 0
+        self.db_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.template_time = 0.0
+        self._template_depth = 0
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def server_timing(self):
+        """Значение заголовка Server-Timing (длительности — в миллисекундах)"""
+        return ', '.join([
+            f'total;dur={self.elapsed * 1000:.1f}',
+            f'db;dur={self.db_time * 1000:.1f};desc="{self.db_queries} queries"',
+            f'tpl;dur={self.template_time * 1000:.1f}',
+            f'cache;desc="hits={self.cache_hits} misses={self.cache_misses}"',
+        ])
+
+
+def start_request():
+    metrics = RequestMetrics()
+    return metrics, _current.set(metrics)
+
+
+def finish_request(token):
+    _current.reset(token)
+
+
+def current():
+    return _current.get()
+
+
+def record_cache(hits=0, misses=0):
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.cache_hits += hits
+        metrics.cache_misses += misses
+
+
+def db_execute_wrapper(execute, sql, params, many, context):
+    """Обёртка для connection.execute_wrapper(): число и время SQL-запросов"""
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.db_queries += 1
+        metrics.db_time += time.perf_counter() - started
+
+
+# --- ВРЕМЯ РЕНДЕРИНГА ШАБЛОНОВ ---
+_templates_instrumented = False
+
+
+def instrument_templates():
+    """
+    Оборачивает django.template.base.Template.render (один раз на процесс):
+    время рендеринга для метрик и спан template.render для трассировки
+    """
+    global _templates_instrumented
+    if _templates_instrumented:
+        return
+    from django.template.base import Template
+
+    original_render = Template.render
+
+    def render(self, context):
+        with tracing.span('template.render', template=self.origin.template_name or self.origin.name):
+            metrics = _current.get()
+            if metrics is None:
+                return original_render(self, context)
+            # Вложенные шаблоны (extends/include) не считаем повторно
+            metrics._template_depth += 1
+            started = time.perf_counter()
+            try:
+                return original_render(self, context)
+            finally:
+                metrics._template_depth -= 1
+                if metrics._template_depth == 0:
+                    metrics.template_time += time.perf_counter() - started
+
+    Template.render = render
+    _templates_instrumented = True
+
+
+# --- АГРЕГАЦИЯ ПО URL NAME ---
+
+class Histogram:
+    __slots__ = ('buckets', 'counts', 'total', 'count')
+
+    def __init__(self, buckets=DURATION_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.count += 1
+
+
+class ViewStats:
+    __slots__ = ('duration', 'db_queries', 'db_time', 'cache_hits', 'cache_misses', 'template_time')
+
+    def __init__(self):
+        self.duration = Histogram()
+        self.db_queries = 0
+        self.db_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.template_time = 0.0
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._views = {}
+
+    def observe(self, view, method, status, metrics):
+        key = (view, method, str(status // 100) + 'xx')
+        elapsed = metrics.elapsed
+        with self._lock:
+            stats = self._views.get(key)
+            if stats is None:
+                stats = self._views[key] = ViewStats()
+            stats.duration.observe(elapsed)
+            stats.db_queries += metrics.db_queries
+            stats.db_time += metrics.db_time
+            stats.cache_hits += metrics.cache_hits
+            stats.cache_misses += metrics.cache_misses
+            stats.template_time += metrics.template_time
+
+    def render_prometheus(self, extra_counters=None, extra_gauges=None):
+        """
+        Текстовый формат Prometheus (exposition format 0.0.4).
+        extra_counters / extra_gauges — метрики процесса: {имя: (описание, значение)}
+        """
+        pid = os.getpid()
+        with self._lock:
+            items = sorted(self._views.items())
+            lines = [
+                '# HELP http_request_duration_seconds Время обработки запроса',
+                '# TYPE http_request_duration_seconds histogram',
+            ]
+            counters = {
+                'http_request_db_queries_total': ('SQL-запросов', 'db_queries'),
+                'http_request_db_seconds_total': ('Время SQL-запросов', 'db_time'),
+                'http_request_template_seconds_total': ('Время рендеринга шаблонов', 'template_time'),
+                'http_request_cache_hits_total': ('Попаданий в кэш', 'cache_hits'),
+                'http_request_cache_misses_total': ('Промахов кэша', 'cache_misses'),
+            }
+            for (view, method, status), stats in items:
+                labels = f'view="{view}",method="{method}",status="{status}",pid="{pid}"'
+                cumulative = 0
+                for bound, count in zip(stats.duration.buckets, stats.duration.counts):
+                    cumulative += count
+                    lines.append(f'http_request_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f'http_request_duration_seconds_bucket{{{labels},le="+Inf"}} {stats.duration.count}')
+                lines.append(f'http_request_duration_seconds_sum{{{labels}}} {stats.duration.total:.6f}')
+                lines.append(f'http_request_duration_seconds_count{{{labels}}} {stats.duration.count}')
+
+            for name, (help_text, attr) in counters.items():
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} counter')
+                for (view, method, status), stats in items:
+                    labels = f'view="{view}",method="{method}",status="{status}",pid="{pid}"'
+                    lines.append(f'{name}{{{labels}}} {getattr(stats, attr)}')
+
+        for kind, extra in (('counter', extra_counters), ('gauge', extra_gauges)):
+            for name, (help_text, value) in (extra or {}).items():
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} {kind}')
+                lines.append(f'{name}{{pid="{pid}"}} {value}')
+
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
@@ -1,8 +1,18 @@
+import logging
 import re
+from contextlib import ExitStack
+
 from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
 from django.shortcuts import redirect
 from django.urls import reverse
 
+from . import metrics, profiling, tracing
+
+logger = logging.getLogger(__name__)
+
+
 class LoginExemptMiddleware:
     def __init__(self, get_response):
         self.get_response = get_response
@@ -27,3 +37,153 @@ class LoginExemptMiddleware:
             return redirect(settings.LOGIN_URL)
 
         return self.get_response(request)
+
+
+class PerformanceMiddleware:
+    """
+    Метрики каждого запроса: общее время, число и время SQL-запросов,
+    попадания/промахи кэша, время рендеринга шаблонов.
+
+    Сотрудникам (is_staff) они отдаются в заголовке Server-Timing (видно во
+    вкладке Network браузера), а в агрегированном виде — по url name в
+    users.metrics.registry, откуда их читает metrics_view (формат Prometheus).
+    Медленные запросы (дольше SLOW_REQUEST_THRESHOLD сек) пишутся в лог.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = getattr(settings, 'PERFORMANCE_METRICS_ENABLED', True)
+        self.slow_threshold = getattr(settings, 'SLOW_REQUEST_THRESHOLD', 1.0)
+        if self.enabled:
+            metrics.instrument_templates()
+
+    def __call__(self, request):
+        if not self.enabled:
+            return self.get_response(request)
+
+        request_metrics, token = metrics.start_request()
+        try:
+            with ExitStack() as stack:
+                # Обёртка ставится на объект-алиас, а не на открытое соединение —
+                # запросы учтутся, даже если соединение откроется внутри view
+                for conn in connections.all():
+                    stack.enter_context(conn.execute_wrapper(metrics.db_execute_wrapper))
+                response = self.get_response(request)
+        finally:
+            metrics.finish_request(token)
+
+        match = getattr(request, 'resolver_match', None)
+        view_name = (match.view_name if match else None) or 'unresolved'
+        metrics.registry.observe(view_name, request.method, response.status_code, request_metrics)
+
+        elapsed = request_metrics.elapsed
+        if elapsed >= self.slow_threshold:
+            logger.warning(
+                f"Медленный запрос {request.method} {request.path}: {elapsed * 1000:.0f} мс, "
+                f"SQL: {request_metrics.db_queries} ({request_metrics.db_time * 1000:.0f} мс)"
+            )
+
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated and user.is_staff:
+            response['Server-Timing'] = request_metrics.server_timing()
+        return response
+
+
+class ProfilerMiddleware:
+    """
+    Профилирование отдельного запроса по флагу сотрудника: ?_profile=1 или
+    заголовок X-Profile. Профиль сохраняется в RequestProfile (список — в
+    админке), в ответ добавляются X-Profile-Id и X-Profile-Url.
+    Без флага middleware ничего не делает; PROFILER_ENABLED = False
+    убирает её из цепочки совсем.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'PROFILER_ENABLED', True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.keep = getattr(settings, 'PROFILER_KEEP', 50)
+
+    def __call__(self, request):
+        if not profiling.profiling_requested(request) or not request.user.is_staff:
+            return self.get_response(request)
+
+        from .models import RequestProfile
+        from .query_budget import QueryRecorder
+
+        # Под профилировщиком время и запросы искажены — бюджеты не проверяем
+        request.profiled = True
+        with ExitStack() as stack:
+            recorder = QueryRecorder().record(stack)
+            with profiling.RequestProfiler() as profiler:
+                response = self.get_response(request)
+
+        match = getattr(request, 'resolver_match', None)
+        profile = RequestProfile.objects.create(
+            user=request.user,
+            method=request.method,
+            path=request.get_full_path()[:500],
+            view_name=(match.view_name if match else '') or '',
+            status_code=response.status_code,
+            duration_ms=profiler.duration * 1000,
+            query_count=recorder.count,
+            samples=sum(profiler.sampler.stacks.values()),
+            stacks=profiler.sampler.collapsed(),
+            stats=profiler.stats_text(),
+        )
+        # Храним только последние PROFILER_KEEP профилей
+        stale = RequestProfile.objects.values_list('pk', flat=True)[self.keep:]
+        RequestProfile.objects.filter(pk__in=list(stale)).delete()
+
+        response['X-Profile-Id'] = str(profile.pk)
+        response['X-Profile-Url'] = reverse('admin:users_requestprofile_change', args=[profile.pk])
+        return response
+
+
+class TracingMiddleware:
+    """
+    Корневой спан запроса и спаны SQL-запросов (users.tracing). В выборку
+    попадает доля TRACING_SAMPLE_RATE запросов и запросы с флагом sampled во
+    входящем traceparent. trace_id есть у каждого запроса — он пишется в логи
+    и возвращается в заголовке X-Trace-Id.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, 'TRACING_SAMPLE_RATE', 0.0)
+        metrics.instrument_templates()
+
+    def __call__(self, request):
+        incoming = tracing.parse_traceparent(request.headers.get('traceparent'))
+        sampled = incoming[2] if incoming else tracing.should_sample(self.sample_rate)
+
+        if not sampled:
+            with tracing.bind_trace_id(incoming[0] if incoming else None) as trace_id:
+                response = self.get_response(request)
+            response['X-Trace-Id'] = trace_id
+            return response
+
+        context = incoming[:2] if incoming else None
+        with tracing.trace('http.request', context, queries=True, method=request.method, path=request.path) as root:
+            response = self.get_response(request)
+            root.set_attribute('status_code', response.status_code)
+        response['X-Trace-Id'] = root.trace_id
+        return response
+
+
+class TracingViewMiddleware:
+    """
+    Спан view: стоит последним в MIDDLEWARE, поэтому внутри него — только
+    разрешение URL, сама view и рендеринг TemplateResponse.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with tracing.span('view') as span:
+            response = self.get_response(request)
+            match = getattr(request, 'resolver_match', None)
+            if match is not None:
+                span.set_name(f'view {match.view_name}')
+        return response
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.7 on 2026-10-19 02:14
+
+import django.utils.timezone
+import users.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0010_customuser_district_last_name_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='customuser',
+            name='avatar',
+            field=models.ImageField(blank=True, null=True, storage=users.storage.ContentAddressedStorage(), upload_to='avatars/', verbose_name='Аватар'),
+        ),
+        migrations.AlterField(
+            model_name='district',
+            name='team_photo',
+            field=models.ImageField(blank=True, null=True, storage=users.storage.ContentAddressedStorage(), upload_to='district_teams/', verbose_name='Фотография команды района'),
+        ),
+        migrations.CreateModel(
+            name='MediaBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True, verbose_name='Имя файла')),
+                ('refcount', models.IntegerField(default=0, verbose_name='Число ссылок')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Создан')),
+                ('updated_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Изменён')),
+            ],
+            options={
+                'verbose_name': 'Медиафайл',
+                'verbose_name_plural': 'Медиафайлы',
+                'indexes': [models.Index(fields=['refcount', 'updated_at'], name='users_media_refcoun_745ca3_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.7 on 2026-10-19 02:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0011_mediablob_content_addressed_storage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TelegramLoginToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.CharField(max_length=64, unique=True, verbose_name='Токен')),
+                ('telegram_id', models.BigIntegerField(verbose_name='Telegram ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Создан')),
+                ('expires_at', models.DateTimeField(db_index=True, verbose_name='Действует до')),
+            ],
+            options={
+                'verbose_name': 'Токен входа через Telegram',
+                'verbose_name_plural': 'Токены входа через Telegram',
+            },
+        ),
+    ]
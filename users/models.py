@@ -1,7 +1,12 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F
 from django.contrib.auth.models import AbstractUser
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
+from .images import AVATAR_SIZES, AVATAR_VARIANT_RE, avatar_variant_name
+from .storage import content_addressed_storage, versioned_url
+
 
 # --- СПРАВОЧНЫЕ МОДЕЛИ (LOOKUP TABLES) ---
 
@@ -19,6 +24,7 @@ class District(models.Model):
 
     team_photo = models.ImageField(
         upload_to='district_teams/',
+        storage=content_addressed_storage,
         null=True,
         blank=True,
         verbose_name=_("Фотография команды района")
@@ -127,15 +133,59 @@ class CustomUser(AbstractUser):
     # Опционально: аватарка
     avatar = models.ImageField(
         upload_to='avatars/',
+        storage=content_addressed_storage,
         null=True,
         blank=True,
         verbose_name="Аватар"
     )
 
-    def get_avatar_url(self):
-        if self.avatar:
-            return self.avatar.url
-        return '/static/default_avatar.jpg'
+    def get_avatar_url(self, size=None):
+        """URL аватара; size — один из AVATAR_SIZES (для старых аватаров игнорируется)"""
+        if not self.avatar:
+            return '/static/default_avatar.jpg'
+        match = AVATAR_VARIANT_RE.match(self.avatar.name)
+        if match and size in AVATAR_SIZES:
+            return self.avatar.storage.url(avatar_variant_name(match['base'], size))
+        # Старый аватар с обычным именем — версия по времени изменения файла
+        return versioned_url(self.avatar)
+
+    def get_avatar_srcset(self, ext='jpg'):
+        """srcset со всеми размерами аватара ('' — если вариантов нет)"""
+        match = AVATAR_VARIANT_RE.match(self.avatar.name) if self.avatar else None
+        if not match:
+            return ''
+        storage = self.avatar.storage
+        return ', '.join(
+            f"{storage.url(avatar_variant_name(match['base'], size, ext))} {size}w"
+            for size in AVATAR_SIZES
+        )
+
+    # Должность и район из кэша справочников (users.lookups) — без запроса к БД
+    @property
+    def cached_position(self):
+        from .lookups import get_position
+        return get_position(self.position_id) or self.position
+
+    @property
+    def cached_district(self):
+        from .lookups import get_district
+        return get_district(self.district_id) or self.district
+
+    @property
+    def position_title(self):
+        """Название должности в нижнем регистре ('' — если должности нет)"""
+        position = self.cached_position
+        return position.title.strip().lower() if position else ''
+
+    @property
+    def is_leader(self):
+        """Руководитель районного отделения"""
+        return "руководитель" in self.position_title
+
+    @property
+    def is_leader_or_deputy(self):
+        """Руководитель или заместитель"""
+        return self.is_leader or "заместитель" in self.position_title
 
     # Методы для красивого отображения ФИО
     def get_full_name_official(self):
@@ -155,11 +205,38 @@ class CustomUser(AbstractUser):
     class Meta:
         verbose_name = _("Пользователь")
         verbose_name_plural = _("Пользователи")
+        indexes = [
+            models.Index(fields=['district', 'last_name']),
+            # Поиск в админке и автодополнение — по началу фамилии и email
+            models.Index(fields=['last_name']),
+            models.Index(fields=['email']),
+        ]
 
     def __str__(self):
         return self.get_full_name_official() or self.username
 
 
+# --- ТОКЕНЫ ВХОДА ЧЕРЕЗ TELEGRAM ---
+
+class TelegramLoginToken(models.Model):
+    """
+    Одноразовая ссылка входа из Telegram-бота.
+    Хранится в БД (не теряется при перезапуске/вытеснении Redis),
+    погашается атомарно — удалением одной строки по уникальному индексу.
+    """
+    token = models.CharField(max_length=64, unique=True, verbose_name=_("Токен"))
+    telegram_id = models.BigIntegerField(verbose_name=_("Telegram ID"))
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name=_("Создан"))
+    expires_at = models.DateTimeField(db_index=True, verbose_name=_("Действует до"))
+
+    class Meta:
+        verbose_name = _("Токен входа через Telegram")
+        verbose_name_plural = _("Токены входа через Telegram")
+
+    def __str__(self):
+        return f"{self.telegram_id} до {self.expires_at:%d.%m.%Y %H:%M}"
+
+
 # --- МОДЕЛИ МЕРОПРИЯТИЙ (ДЛЯ ОТЧЕТОВ) ---
 
 class Event(models.Model):
@@ -190,6 +267,10 @@ class Event(models.Model):
         verbose_name = _("Мероприятие")
         verbose_name_plural = _("Мероприятия")
         ordering = ['-date']
+        indexes = [
+            # Поиск по началу названия (админка, автодополнение)
+            models.Index(fields=['name']),
+        ]
 
     def __str__(self):
         return self.name
@@ -233,4 +314,141 @@ class Participation(models.Model):
         unique_together = ('user', 'event')
 
     def __str__(self):
-        return f"{self.get_role_display()} в {self.event.name} (User: {self.user.username})"
\ No newline at end of file
+        return f"{self.get_role_display()} в {self.event.name} (User: {self.user.username})"
+
+
+# --- МЕДИАФАЙЛЫ ---
+
+class MediaBlob(models.Model):
+    """
+    Файл в контентно-адресуемом хранилище и число ссылок на него.
+    Файлы с refcount = 0 удаляет команда cleanup_media.
+    """
+    name = models.CharField(max_length=255, unique=True, verbose_name=_("Имя файла"))
+    refcount = models.IntegerField(default=0, verbose_name=_("Число ссылок"))
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name=_("Создан"))
+    updated_at = models.DateTimeField(default=timezone.now, verbose_name=_("Изменён"))
+
+    class Meta:
+        verbose_name = _("Медиафайл")
+        verbose_name_plural = _("Медиафайлы")
+        indexes = [
+            models.Index(fields=['refcount', 'updated_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.name} ({self.refcount})"
+
+    @classmethod
+    def register(cls, *names):
+        """
+        Учитывает файлы (без ссылок, пока их не назначат полю) и возвращает имена,
+        для которых строк не было. У существующих строк сдвигает updated_at: повторно
+        загруженный «сирота» снова попадает под отсрочку и cleanup_media его не удалит.
+        UPDATE ждёт, пока cleanup_media держит блокировку строки, — после неё строки
+        уже нет (файл удалён), и вызывающий должен записать файл заново.
+        """
+        names = list(dict.fromkeys(names))
+        with transaction.atomic():
+            if cls.objects.filter(name__in=names).update(updated_at=timezone.now()) == len(names):
+                return []
+            existing = set(cls.objects.filter(name__in=names).values_list('name', flat=True))
+            created = [name for name in names if name not in existing]
+            cls.objects.bulk_create([cls(name=name) for name in created], ignore_conflicts=True)
+        return created
+
+    @classmethod
+    def change_refcount(cls, names, delta):
+        """Атомарно меняет счётчик ссылок у файлов: недостающие строки — одним INSERT, счётчики — одним UPDATE"""
+        names = list(dict.fromkeys(name for name in names if name))
+        if not names:
+            return
+        with transaction.atomic():
+            cls.objects.bulk_create([cls(name=name) for name in names], ignore_conflicts=True)
+            cls.objects.filter(name__in=names).update(
+                refcount=F('refcount') + delta,
+                updated_at=timezone.now(),
+            )
+
+
+# --- ПРОФИЛИ ЗАПРОСОВ (users.profiling) ---
+
+class RequestProfile(models.Model):
+    """
+    Профиль одного запроса, снятый по флагу сотрудника (?_profile=1 или
+    заголовок X-Profile). stacks — свёрнутые стеки («a;b;c 12») для
+    flamegraph.pl / speedscope, stats — сводка cProfile.
+    """
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True, verbose_name=_("Снят"))
+    user = models.ForeignKey(
+        CustomUser,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+',
+        verbose_name=_("Пользователь")
+    )
+    method = models.CharField(max_length=10, verbose_name=_("Метод"))
+    path = models.CharField(max_length=500, verbose_name=_("Путь"))
+    view_name = models.CharField(max_length=200, blank=True, verbose_name=_("View"))
+    status_code = models.PositiveSmallIntegerField(verbose_name=_("Код ответа"))
+    duration_ms = models.FloatField(verbose_name=_("Время, мс"))
+    query_count = models.PositiveIntegerField(default=0, verbose_name=_("SQL-запросов"))
+    samples = models.PositiveIntegerField(default=0, verbose_name=_("Сэмплов"))
+    stacks = models.TextField(blank=True, verbose_name=_("Свёрнутые стеки"))
+    stats = models.TextField(blank=True, verbose_name=_("Сводка cProfile"))
+
+    class Meta:
+        verbose_name = _("Профиль запроса")
+        verbose_name_plural = _("Профили запросов")
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.method} {self.path} — {self.duration_ms:.0f} мс"
+
+
+# --- ОЧЕРЕДЬ ФОНОВЫХ ЗАДАНИЙ ---
+
+class Job(models.Model):
+    """
+    Фоновое задание (users.jobs, бэкенд 'db'). Воркер (manage.py run_jobs)
+    забирает готовые задания по приоритету: run_at <= сейчас, status=queued.
+    unique_key занят, пока задание в очереди или выполняется, — повторная
+    постановка с тем же ключом возвращает уже существующее задание.
+    """
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (QUEUED, _('В очереди')),
+        (RUNNING, _('Выполняется')),
+        (DONE, _('Выполнено')),
+        (FAILED, _('Ошибка')),
+    ]
+
+    name = models.CharField(max_length=200, verbose_name=_("Задание"))
+    payload = models.JSONField(default=dict, verbose_name=_("Аргументы"))
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED, verbose_name=_("Статус"))
+    priority = models.SmallIntegerField(default=0, verbose_name=_("Приоритет"))
+    run_at = models.DateTimeField(default=timezone.now, verbose_name=_("Выполнить не раньше"))
+    unique_key = models.CharField(max_length=200, null=True, blank=True, unique=True, verbose_name=_("Ключ уникальности"))
+    attempts = models.PositiveSmallIntegerField(default=0, verbose_name=_("Попыток"))
+    max_attempts = models.PositiveSmallIntegerField(default=3, verbose_name=_("Максимум попыток"))
+    last_error = models.TextField(blank=True, verbose_name=_("Последняя ошибка"))
+    locked_by = models.CharField(max_length=100, blank=True, verbose_name=_("Воркер"))
+    locked_at = models.DateTimeField(null=True, blank=True, verbose_name=_("Взято в работу"))
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name=_("Создано"))
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name=_("Завершено"))
+
+    class Meta:
+        verbose_name = _("Фоновое задание")
+        verbose_name_plural = _("Фоновые задания")
+        ordering = ['-created_at']
+        indexes = [
+            # Выборка воркера: WHERE status='queued' AND run_at <= now ORDER BY priority DESC, run_at
+            models.Index(fields=['status', 'run_at', 'priority'], name='job_ready_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} #{self.pk} ({self.get_status_display()})"
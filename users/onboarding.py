@@ -0,0 +1,296 @@
+import csv
+import io
+import secrets
+import time
+
+from django.conf import settings
+from django.contrib.auth.hashers import UNUSABLE_PASSWORD_PREFIX
+from django.contrib.auth.tokens import default_token_generator
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import transaction
+from django.urls import reverse
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+
+from .lookups import (
+    all_districts, all_positions, head_position_id, invalidate_occupied_positions, occupied_positions,
+)
+from .models import CustomUser
+from .telegram_tokens import issue_login_tokens
+
+# --- МАССОВЫЙ ИМПОРТ ПОЛЬЗОВАТЕЛЕЙ ИЗ CSV ---
+# RegisterView тратит на каждого пользователя сотни мс — PBKDF2-хэш пароля.
+# При импорте пароль сразу «непригодный» (как make_password(None) — без хэширования),
+# район и должность ищутся в кэше справочников, вставка — bulk_create пачками.
+# Пароль человек задаёт сам по одноразовой ссылке (та же, что при сбросе пароля),
+# а у кого указан telegram_id — получает ещё и ссылку входа через Telegram.
+
+# Колонки входного CSV (обязательна только username).
+# district — название или код района, position — название должности.
+CSV_COLUMNS = (
+    'username', 'last_name', 'first_name', 'middle_name', 'email',
+    'district', 'position', 'telegram_id', 'department_type',
+)
+# Колонки отчёта: ссылки-приглашения и причины отказа по строкам
+INVITE_COLUMNS = ('line', 'username', 'full_name', 'email', 'password_url', 'telegram_url', 'error')
+
+NAME_MAX_LENGTH = 150
+
+
+def invite_ttl():
+    """Срок жизни ссылки входа через Telegram (ссылка установки пароля — PASSWORD_RESET_TIMEOUT)"""
+    return getattr(settings, 'USER_INVITE_TTL', settings.PASSWORD_RESET_TIMEOUT)
+
+
+def read_rows(file):
+    """
+    CSV (UTF-8, разделитель «,» или «;» — как сохраняет Excel)
+    → [(номер строки, {колонка: значение})]
+    """
+    data = file.read()
+    if isinstance(data, bytes):
+        try:
+            data = data.decode('utf-8-sig')
+        except UnicodeDecodeError:
+            raise ValueError("Файл должен быть в кодировке UTF-8")
+    data = data.lstrip('\ufeff')
+    try:
+        dialect = csv.Sniffer().sniff(data[:4096], delimiters=',;')
+    except csv.Error:
+        dialect = csv.excel
+
+    reader = csv.DictReader(io.StringIO(data), dialect=dialect)
+    columns = {(name or '').strip().lower() for name in reader.fieldnames or ()}
+    if 'username' not in columns:
+        raise ValueError(f"В первой строке нет колонки username (ожидаются: {', '.join(CSV_COLUMNS)})")
+
+    rows = []
+    for row in reader:
+        # Лишние значения без заголовка DictReader кладёт под ключ None — пропускаем
+        fields = {key.strip().lower(): (value or '').strip() for key, value in row.items() if key}
+        if any(fields.values()):
+            rows.append((reader.line_num, fields))
+    return rows
+
+
+def lookup_maps():
+    """Справочники для разбора строк: районы по названию и коду, должности по названию"""
+    districts = {}
+    for district in all_districts():
+        districts[district.name.strip().lower()] = district
+        if district.code:
+            districts[district.code.strip().lower()] = district
+    positions = {position.title.strip().lower(): position for position in all_positions()}
+    return districts, positions
+
+
+def build_user(fields, districts, positions):
+    """Несохранённый пользователь из строки CSV; ошибки строки — ValidationError"""
+    errors = []
+
+    username = CustomUser.normalize_username(fields.get('username', ''))
+    if not username:
+        errors.append("Не указан логин")
+    else:
+        try:
+            CustomUser.username_validator(username)
+        except ValidationError as e:
+            errors.extend(e.messages)
+
+    for name in ('username', 'last_name', 'first_name', 'middle_name'):
+        if len(fields.get(name, '')) > NAME_MAX_LENGTH:
+            errors.append(f"Поле {name} длиннее {NAME_MAX_LENGTH} символов")
+
+    email = CustomUser.objects.normalize_email(fields.get('email', ''))
+    if email:
+        try:
+            validate_email(email)
+        except ValidationError:
+            errors.append(f"Некорректный email «{email}»")
+
+    district = position = None
+    if fields.get('district'):
+        district = districts.get(fields['district'].lower())
+        if district is None:
+            errors.append(f"Неизвестный район «{fields['district']}»")
+    if fields.get('position'):
+        position = positions.get(fields['position'].lower())
+        if position is None:
+            errors.append(f"Неизвестная должность «{fields['position']}»")
+
+    telegram_id = None
+    if fields.get('telegram_id'):
+        try:
+            telegram_id = int(fields['telegram_id'])
+        except ValueError:
+            errors.append(f"Telegram ID должен быть числом, а не «{fields['telegram_id']}»")
+
+    department_type = fields.get('department_type') or ('district' if district else 'apparat')
+    if department_type not in dict(CustomUser.DEPARTMENT_TYPE_CHOICES):
+        errors.append(f"Неизвестный тип отдела «{department_type}»")
+
+    if errors:
+        raise ValidationError(errors)
+
+    # Объекты справочников общие для всех запросов — в пользователя кладём только id
+    return CustomUser(
+        username=username,
+        last_name=fields.get('last_name', ''),
+        first_name=fields.get('first_name', ''),
+        middle_name=fields.get('middle_name', ''),
+        email=email,
+        department_type=department_type,
+        district_id=district.pk if district else None,
+        position_id=position.pk if position else None,
+        telegram_id=telegram_id,
+        password=unusable_password(),
+    )
+
+
+def unusable_password():
+    """
+    То же, что make_password(None): «!» и 40 случайных символов. get_random_string
+    выбирает их по одному (на тысячах строк это заметно) — здесь одно чтение urandom
+    """
+    return UNUSABLE_PASSWORD_PREFIX + secrets.token_urlsafe(30)
+
+
+def existing_values(field, values, batch_size):
+    """Какие из значений поля уже заняты в БД (запрос на пачку, а не на строку)"""
+    values = list(values)
+    taken = set()
+    for start in range(0, len(values), batch_size):
+        taken.update(
+            CustomUser.objects
+            .filter(**{f'{field}__in': values[start:start + batch_size]})
+            .values_list(field, flat=True)
+        )
+    return taken
+
+
+class ImportResult:
+    """Итог импорта: созданные (номер строки, пользователь) и отклонённые (номер строки, логин, причина)"""
+    __slots__ = ('created', 'rejected', 'dry_run', 'seconds')
+
+    def __init__(self, created, rejected, dry_run, seconds):
+        self.created = created
+        self.rejected = rejected
+        self.dry_run = dry_run
+        self.seconds = seconds
+
+    def rows(self, base_url):
+        """Строки отчёта (INVITE_COLUMNS) в порядке файла; при dry_run — без ссылок"""
+        users = [user for _, user in self.created]
+        links = [{}] * len(users) if self.dry_run else invite_links(users, base_url)
+        rows = [
+            {**invite_row(user, link), 'line': line}
+            for (line, user), link in zip(self.created, links)
+        ]
+        rows += [{'line': line, 'username': username, 'error': error} for line, username, error in self.rejected]
+        return sorted(rows, key=lambda row: row['line'])
+
+
+def import_users(rows, batch_size=1000, dry_run=False):
+    """Создаёт пользователей из строк read_rows(); строки с ошибками пропускаются"""
+    started = time.perf_counter()
+    districts, positions = lookup_maps()
+
+    candidates, rejected = [], []
+    for line, fields in rows:
+        try:
+            candidates.append((line, build_user(fields, districts, positions)))
+        except ValidationError as e:
+            rejected.append((line, fields.get('username', ''), '; '.join(e.messages)))
+
+    # Занятые логины и Telegram ID — несколькими запросами на весь файл
+    taken_usernames = {
+        username.lower()
+        for username in existing_values('username', [user.username for _, user in candidates], batch_size)
+    }
+    taken_telegram_ids = existing_values(
+        'telegram_id', [user.telegram_id for _, user in candidates if user.telegram_id], batch_size,
+    )
+    # Руководитель в районе может быть только один (как при регистрации)
+    head_id = head_position_id()
+    head_districts = {district_id for district_id, ids in occupied_positions().items() if head_id in ids}
+
+    created = []
+    for line, user in candidates:
+        if user.username.lower() in taken_usernames:
+            error = "Логин уже занят"
+        elif user.telegram_id and user.telegram_id in taken_telegram_ids:
+            error = "Telegram ID уже привязан к другому пользователю"
+        elif head_id and user.position_id == head_id and user.district_id in head_districts:
+            error = "В этом районе уже есть Руководитель"
+        else:
+            error = None
+        if error:
+            rejected.append((line, user.username, error))
+            continue
+
+        taken_usernames.add(user.username.lower())
+        if user.telegram_id:
+            taken_telegram_ids.add(user.telegram_id)
+        if head_id and user.position_id == head_id and user.district_id:
+            head_districts.add(user.district_id)
+        created.append((line, user))
+
+    if created and not dry_run:
+        with transaction.atomic():
+            for start in range(0, len(created), batch_size):
+                batch = [user for _, user in created[start:start + batch_size]]
+                CustomUser.objects.bulk_create(batch)
+                if batch[0].pk is None:
+                    # MySQL не возвращает id из INSERT — дочитываем одним запросом на пачку
+                    ids = dict(
+                        CustomUser.objects
+                        .filter(username__in=[user.username for user in batch])
+                        .values_list('username', 'pk')
+                    )
+                    for user in batch:
+                        user.pk = ids[user.username]
+            # bulk_create не отправляет post_save — сбрасываем занятые должности сами
+            transaction.on_commit(invalidate_occupied_positions)
+
+    return ImportResult(created, rejected, dry_run, time.perf_counter() - started)
+
+
+def invite_links(users, base_url, ttl=None):
+    """
+    Одноразовые ссылки для сохранённых пользователей: установка пароля и, при наличии
+    telegram_id, вход через Telegram. Ссылка установки пароля перестаёт работать после
+    смены пароля или любого входа (токен зависит от password и last_login) — тогда
+    новую выдаёт действие «Выдать ссылки-приглашения» в админке.
+    """
+    base_url = base_url.rstrip('/')
+    telegram_tokens = issue_login_tokens(
+        [user.telegram_id for user in users if user.telegram_id], ttl=ttl or invite_ttl(),
+    )
+    links = []
+    for user in users:
+        password_path = reverse('password_reset_confirm', kwargs={
+            'uidb64': urlsafe_base64_encode(force_bytes(user.pk)),
+            'token': default_token_generator.make_token(user),
+        })
+        telegram_url = ''
+        if user.telegram_id:
+            telegram_url = f"{base_url}{reverse('telegram_login')}?token={telegram_tokens[user.telegram_id]}"
+        links.append({'password_url': base_url + password_path, 'telegram_url': telegram_url})
+    return links
+
+
+def invite_row(user, link):
+    return {
+        'line': '',
+        'username': user.username,
+        'full_name': ' '.join(filter(None, (user.last_name, user.first_name, user.middle_name))),
+        'email': user.email,
+        **link,
+    }
+
+
+def write_invites_csv(file, rows):
+    writer = csv.DictWriter(file, fieldnames=INVITE_COLUMNS, restval='')
+    writer.writeheader()
+    writer.writerows(rows)
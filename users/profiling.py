@@ -0,0 +1,87 @@
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+
+# --- ПРОФИЛИРОВАНИЕ ОТДЕЛЬНЫХ ЗАПРОСОВ ---
+# Включается только для сотрудников и только по флагу в запросе, поэтому
+# в остальных запросах не стоит ничего, кроме проверки флага.
+# Результат — два вида данных:
+#   * свёрнутые стеки (collapsed stacks) от сэмплера: «view;render;query 42»,
+#     формат flamegraph.pl и speedscope (https://www.speedscope.app);
+#   * сводка cProfile по функциям (cumulative time).
+
+PROFILE_QUERY_PARAM = '_profile'
+PROFILE_HEADER = 'HTTP_X_PROFILE'
+SAMPLE_INTERVAL = 0.001
+STATS_LIMIT = 40
+
+
+def profiling_requested(request):
+    # Сначала дешёвая проверка строки запроса, QueryDict разбираем только при совпадении
+    if PROFILE_HEADER in request.META:
+        return True
+    return PROFILE_QUERY_PARAM in request.META.get('QUERY_STRING', '') and PROFILE_QUERY_PARAM in request.GET
+
+
+def frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class StackSampler:
+    """Фоновый поток раз в interval снимает стек профилируемого потока"""
+
+    def __init__(self, thread_id, interval=SAMPLE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='request-profiler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(frame_label(frame))
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def collapsed(self):
+        return '\n'.join(f'{stack} {count}' for stack, count in self.stacks.most_common())
+
+
+class RequestProfiler:
+    """Контекстный менеджер: сэмплер стеков + cProfile для текущего потока"""
+
+    def __enter__(self):
+        self.sampler = StackSampler(threading.get_ident())
+        self.profile = cProfile.Profile()
+        self.started = time.perf_counter()
+        self.sampler.start()
+        self.profile.enable()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.profile.disable()
+        self.sampler.stop()
+        self.duration = time.perf_counter() - self.started
+        return False
+
+    def stats_text(self):
+        output = io.StringIO()
+        pstats.Stats(self.profile, stream=output).sort_stats('cumulative').print_stats(STATS_LIMIT)
+        return output.getvalue()
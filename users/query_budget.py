@@ -0,0 +1,242 @@
+import logging
+import os
+import re
+import sys
+from collections import Counter
+from contextlib import ContextDecorator, ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+# --- БЮДЖЕТ SQL-ЗАПРОСОВ ---
+# Бюджет задаётся тремя способами:
+#   @query_budget(8)                        — на view-функцию (для CBV — через method_decorator)
+#   with query_budget(3, name='...'):       — на участок кода
+#   settings.QUERY_BUDGETS = {'tasks': 8}   — на url name (проверяет QueryBudgetMiddleware)
+# При превышении пишется предупреждение в лог, а при QUERY_BUDGET_STRICT = True
+# выбрасывается QueryBudgetExceeded. В тестах — QueryBudgetTestMixin.
+
+# Сколько одинаковых по форме запросов за один запрос считать N+1
+N_PLUS_ONE_THRESHOLD = 3
+
+_IN_LIST_RE = re.compile(r'\(\s*%s(?:\s*,\s*%s)*\s*\)')
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r'\b\d+\b')
+_SPACES_RE = re.compile(r'\s+')
+
+_DJANGO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__import__('django').__file__)))
+_THIS_FILE = os.path.abspath(__file__)
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def normalize_sql(sql):
+    """Форма запроса: без значений и с одинаковыми IN (...) — для поиска повторов"""
+    sql = _IN_LIST_RE.sub('(...)', sql)
+    sql = _STRING_RE.sub('?', sql)
+    sql = _NUMBER_RE.sub('?', sql)
+    return _SPACES_RE.sub(' ', sql).strip()
+
+
+def query_location():
+    """
+    Откуда выполнен запрос: строка шаблона (если запрос сделан при рендеринге)
+    и ближайшая строка кода проекта. Обход стека дорогой — только для отладки.
+    """
+    template = code = None
+    frame = sys._getframe(1)
+    while frame is not None and not (template and code):
+        filename = frame.f_code.co_filename
+        if template is None and frame.f_code.co_name == 'render_annotated':
+            node = frame.f_locals.get('self')
+            token = getattr(node, 'token', None)
+            origin = getattr(node, 'origin', None)
+            if token is not None and origin is not None:
+                template = f'{origin.template_name or origin.name}:{token.lineno}'
+        elif (code is None and filename != _THIS_FILE
+              and not filename.startswith(_DJANGO_DIR) and 'site-packages' not in filename
+              and filename.startswith(str(settings.BASE_DIR))):
+            code = f'{os.path.relpath(filename, settings.BASE_DIR)}:{frame.f_lineno} ({frame.f_code.co_name})'
+        frame = frame.f_back
+    return ', '.join(filter(None, [code, template and f'шаблон {template}'])) or 'неизвестно'
+
+
+class QueryRecorder:
+    """
+    Обёртка для connection.execute_wrapper(): считает запросы, а при
+    collect_shapes=True запоминает формы запросов и место первого вызова.
+    """
+
+    def __init__(self, collect_shapes=False):
+        self.collect_shapes = collect_shapes
+        self.count = 0
+        self.queries = []
+        self.shapes = Counter()
+        self.locations = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        if self.collect_shapes:
+            self.queries.append(sql)
+            shape = normalize_sql(sql)
+            self.shapes[shape] += 1
+            if shape not in self.locations:
+                self.locations[shape] = query_location()
+        return execute(sql, params, many, context)
+
+    def record(self, stack):
+        for conn in connections.all():
+            stack.enter_context(conn.execute_wrapper(self))
+        return self
+
+    def repeated(self, threshold=N_PLUS_ONE_THRESHOLD):
+        """[(форма запроса, сколько раз, где впервые)] — кандидаты в N+1"""
+        return [
+            (shape, count, self.locations.get(shape, 'неизвестно'))
+            for shape, count in self.shapes.most_common()
+            if count >= threshold
+        ]
+
+
+def format_repeated(repeated):
+    return '\n'.join(f'  {count}× {shape[:200]}\n     ← {location}' for shape, count, location in repeated)
+
+
+def budget_exceeded(name, count, max_queries, recorder=None):
+    message = f"Бюджет SQL-запросов превышен: {name} — {count} при лимите {max_queries}"
+    if recorder is not None and recorder.collect_shapes:
+        repeated = recorder.repeated()
+        if repeated:
+            message += "\nПовторяющиеся запросы:\n" + format_repeated(repeated)
+    if getattr(settings, 'QUERY_BUDGET_STRICT', False):
+        raise QueryBudgetExceeded(message)
+    logger.warning(message)
+
+
+class query_budget(ContextDecorator):
+    """Декоратор / контекстный менеджер: не больше max_queries SQL-запросов"""
+
+    def __init__(self, max_queries, name=None):
+        self.max_queries = max_queries
+        self.name = name
+
+    def __call__(self, func):
+        wrapper = super().__call__(func)
+        wrapper.query_budget = self.max_queries
+        if self.name is None:
+            self.name = func.__qualname__
+        return wrapper
+
+    def _recreate_cm(self):
+        # Каждый вызов декорированной функции — со своим счётчиком (потоки gthread)
+        return query_budget(self.max_queries, self.name)
+
+    def __enter__(self):
+        self._stack = ExitStack()
+        self.recorder = QueryRecorder(collect_shapes=settings.DEBUG).record(self._stack)
+        return self.recorder
+
+    def __exit__(self, *exc_info):
+        self._stack.close()
+        if exc_info[0] is None and self.recorder.count > self.max_queries:
+            budget_exceeded(self.name or 'блок кода', self.recorder.count, self.max_queries, self.recorder)
+        return False
+
+
+def view_query_budget(request):
+    """Бюджет для запроса: из settings.QUERY_BUDGETS по url name (или None)"""
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return None
+    return getattr(settings, 'QUERY_BUDGETS', {}).get(match.view_name)
+
+
+class QueryBudgetMiddleware:
+    """
+    Проверяет бюджеты из settings.QUERY_BUDGETS, а в режиме отладки (DEBUG)
+    ищет N+1: одинаковые по форме запросы, повторённые N_PLUS_ONE_THRESHOLD
+    и более раз, — и пишет в лог, откуда они выполнены (код и строка шаблона).
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.detect_n_plus_one = getattr(settings, 'QUERY_DETECT_N_PLUS_ONE', settings.DEBUG)
+
+    def __call__(self, request):
+        request_metrics = metrics.current()
+        if self.detect_n_plus_one or request_metrics is None:
+            # Формы запросов нужны только для поиска N+1; свой счётчик — и когда
+            # PerformanceMiddleware выключена
+            with ExitStack() as stack:
+                recorder = QueryRecorder(collect_shapes=self.detect_n_plus_one).record(stack)
+                response = self.get_response(request)
+            count = recorder.count
+        else:
+            # Запросы уже считает PerformanceMiddleware — вторая обёртка не нужна
+            recorder = None
+            before = request_metrics.db_queries
+            response = self.get_response(request)
+            count = request_metrics.db_queries - before
+
+        if getattr(request, 'profiled', False):
+            return response
+
+        max_queries = view_query_budget(request)
+        if max_queries is not None and count > max_queries:
+            budget_exceeded(request.resolver_match.view_name, count, max_queries, recorder)
+        elif self.detect_n_plus_one:
+            repeated = recorder.repeated()
+            if repeated:
+                logger.warning(
+                    f"Возможный N+1 в {request.method} {request.path} ({count} запросов):\n"
+                    f"{format_repeated(repeated)}"
+                )
+        return response
+
+
+# --- ПОМОЩНИКИ ДЛЯ ТЕСТОВ ---
+
+class QueryBudgetTestMixin:
+    """
+    Для TestCase: assertQueryBudget() выполняет запрос тестовым клиентом и
+    падает, если SQL-запросов больше бюджета; в сообщении — повторы и места вызова.
+    """
+
+    def assertQueryBudget(self, url, max_queries=None, method='get', data=None, **extra):
+        from django.urls import resolve
+
+        if max_queries is None:
+            view_name = resolve(url.split('?')[0]).view_name
+            max_queries = getattr(settings, 'QUERY_BUDGETS', {}).get(view_name)
+            if max_queries is None:
+                self.fail(f"Для '{view_name}' не задан бюджет в settings.QUERY_BUDGETS")
+
+        with ExitStack() as stack:
+            recorder = QueryRecorder(collect_shapes=True).record(stack)
+            response = getattr(self.client, method)(url, data, **extra)
+
+        if recorder.count > max_queries:
+            message = f"{method.upper()} {url}: {recorder.count} SQL-запросов при бюджете {max_queries}"
+            repeated = recorder.repeated()
+            if repeated:
+                message += "\nПовторяющиеся запросы:\n" + format_repeated(repeated)
+            else:
+                message += "\n" + '\n'.join(f'  {sql[:200]}' for sql in recorder.queries)
+            self.fail(message)
+        return response
+
+    def assertNoRepeatedQueries(self, url, threshold=N_PLUS_ONE_THRESHOLD, method='get', data=None, **extra):
+        with ExitStack() as stack:
+            recorder = QueryRecorder(collect_shapes=True).record(stack)
+            response = getattr(self.client, method)(url, data, **extra)
+
+        repeated = recorder.repeated(threshold)
+        if repeated:
+            self.fail(f"{method.upper()} {url}: повторяющиеся запросы (N+1):\n" + format_repeated(repeated))
+        return response
@@ -0,0 +1,136 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_init, post_save, pre_save
+
+from tasks_app.models import Task
+
+from .dashboard import bump_tasks_version, bump_user_versions
+from .images import avatar_variant_names
+from .lookups import LOOKUP_MODELS, invalidate_lookup, invalidate_occupied_positions
+from .models import CustomUser, District, MediaBlob, Participation, Position
+
+# Поля, файлы которых лежат в контентно-адресуемом хранилище
+MEDIA_FIELDS = {
+    CustomUser: 'avatar',
+    District: 'team_photo',
+}
+
+_INITIAL_ATTR = '_media_initial_name'
+_UNKNOWN = object()
+
+
+def media_file_names(name):
+    """Все физические файлы, на которые ссылается значение поля (у аватара — все варианты)"""
+    return avatar_variant_names(name)
+
+
+def _field_name_value(instance, field_name):
+    value = instance.__dict__.get(field_name, _UNKNOWN)
+    if value is _UNKNOWN:
+        return _UNKNOWN
+    return getattr(value, 'name', value) or ''
+
+
+def remember_media_name(sender, instance, **kwargs):
+    # Отложенное поле (.only()/.defer()) не трогаем — это был бы лишний запрос
+    setattr(instance, _INITIAL_ATTR, _field_name_value(instance, MEDIA_FIELDS[sender]))
+
+
+def load_media_name(sender, instance, update_fields=None, **kwargs):
+    field_name = MEDIA_FIELDS[sender]
+    if update_fields is not None and field_name not in update_fields:
+        return
+    # Значение при загрузке неизвестно (поле было отложено) — читаем из БД
+    if getattr(instance, _INITIAL_ATTR, _UNKNOWN) is _UNKNOWN and instance.pk:
+        old = sender.objects.filter(pk=instance.pk).values_list(field_name, flat=True).first()
+        setattr(instance, _INITIAL_ATTR, old or '')
+
+
+def update_media_refcount(sender, instance, created, update_fields=None, **kwargs):
+    field_name = MEDIA_FIELDS[sender]
+    if update_fields is not None and field_name not in update_fields:
+        return
+
+    old = '' if created else getattr(instance, _INITIAL_ATTR, '')
+    new = _field_name_value(instance, field_name)
+    if new is _UNKNOWN or old is _UNKNOWN or old == new:
+        return
+
+    MediaBlob.change_refcount(media_file_names(new), +1)
+    MediaBlob.change_refcount(media_file_names(old), -1)
+    setattr(instance, _INITIAL_ATTR, new)
+
+
+def release_media(sender, instance, **kwargs):
+    name = _field_name_value(instance, MEDIA_FIELDS[sender])
+    if name is not _UNKNOWN:
+        MediaBlob.change_refcount(media_file_names(name), -1)
+
+
+for model in MEDIA_FIELDS:
+    post_init.connect(remember_media_name, sender=model, dispatch_uid=f'media_init_{model.__name__}')
+    pre_save.connect(load_media_name, sender=model, dispatch_uid=f'media_pre_save_{model.__name__}')
+    post_save.connect(update_media_refcount, sender=model, dispatch_uid=f'media_post_save_{model.__name__}')
+    post_delete.connect(release_media, sender=model, dispatch_uid=f'media_delete_{model.__name__}')
+
+
+# --- СБРОС КЭША СПРАВОЧНИКОВ (users.lookups) ---
+
+def lookup_changed(sender, instance, **kwargs):
+    # После коммита — иначе другой воркер успеет закэшировать старые данные
+    name = LOOKUP_NAMES[sender]
+    transaction.on_commit(partial(invalidate_lookup, name))
+    if sender is Position:
+        transaction.on_commit(invalidate_occupied_positions)
+
+
+def user_assignment_changed(sender, instance, update_fields=None, **kwargs):
+    # Вход пользователя (last_login), аватар и т.п. не влияют на занятость должностей
+    if update_fields is not None and not {'district', 'position'} & set(update_fields):
+        return
+    transaction.on_commit(invalidate_occupied_positions)
+
+
+LOOKUP_NAMES = {model: name for name, model in LOOKUP_MODELS.items()}
+
+for model, name in LOOKUP_NAMES.items():
+    post_save.connect(lookup_changed, sender=model, dispatch_uid=f'lookups_{name}_saved')
+    post_delete.connect(lookup_changed, sender=model, dispatch_uid=f'lookups_{name}_deleted')
+post_save.connect(user_assignment_changed, sender=CustomUser, dispatch_uid='lookups_user_saved')
+post_delete.connect(user_assignment_changed, sender=CustomUser, dispatch_uid='lookups_user_deleted')
+
+
+# --- СБРОС КЭША ГЛАВНОЙ СТРАНИЦЫ (users.dashboard) ---
+
+def task_changed(sender, instance, **kwargs):
+    transaction.on_commit(bump_tasks_version)
+
+
+def signups_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear':
+        # После clear() pk_set пуст — запоминаем, чьи записи удаляются
+        instance._dashboard_cleared_ids = (
+            [instance.pk] if reverse
+            else list(sender.objects.filter(task_id=instance.pk).values_list('customuser_id', flat=True))
+        )
+        return
+    if action == 'post_clear':
+        user_ids = getattr(instance, '_dashboard_cleared_ids', [])
+    elif action in ('post_add', 'post_remove'):
+        user_ids = [instance.pk] if reverse else list(pk_set or ())
+    else:
+        return
+    if user_ids:
+        transaction.on_commit(partial(bump_user_versions, user_ids))
+
+
+def participation_changed(sender, instance, **kwargs):
+    transaction.on_commit(partial(bump_user_versions, [instance.user_id]))
+
+
+post_save.connect(task_changed, sender=Task, dispatch_uid='dashboard_task_saved')
+post_delete.connect(task_changed, sender=Task, dispatch_uid='dashboard_task_deleted')
+m2m_changed.connect(signups_changed, sender=Task.users_signed_up.through, dispatch_uid='dashboard_signups_changed')
+post_save.connect(participation_changed, sender=Participation, dispatch_uid='dashboard_participation_saved')
+post_delete.connect(participation_changed, sender=Participation, dispatch_uid='dashboard_participation_deleted')
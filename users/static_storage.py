@@ -0,0 +1,41 @@
+import gzip
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+
+try:
+    import brotli
+except ImportError:  # необязательная зависимость: без неё — только .gz
+    brotli = None
+
+# Отдельно от users.storage: модели импортируют тот модуль при каждом старте,
+# а ManifestStaticFilesStorage (и brotli) нужны только collectstatic и отдаче статики
+COMPRESSIBLE_EXTENSIONS = ('.css', '.js', '.svg', '.json', '.txt', '.xml', '.map', '.ico', '.html')
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """
+    collectstatic: имена с хэшем содержимого (можно кэшировать «навсегда»)
+    и рядом с каждым текстовым файлом — сжатые копии .gz и .br, чтобы при
+    отдаче не сжимать на лету (см. views.serve_static).
+    """
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run=dry_run, **options)
+        if dry_run:
+            return
+        for name in self.hashed_files.values():
+            if name.endswith(COMPRESSIBLE_EXTENSIONS):
+                self.compress(name)
+
+    def compress(self, name):
+        path = self.path(name)
+        with open(path, 'rb') as f:
+            data = f.read()
+        variants = {'.gz': gzip.compress(data, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            variants['.br'] = brotli.compress(data, quality=11)
+        for ext, compressed in variants.items():
+            # Сжатие не помогло — отдаём оригинал
+            if len(compressed) < len(data):
+                with open(path + ext, 'wb') as f:
+                    f.write(compressed)
@@ -0,0 +1,95 @@
+import hashlib
+import os
+import re
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+# <каталог>/<хэш>[-<суффикс>].<расширение> — имя уже построено по содержимому
+CONTENT_HASHED_NAME_RE = re.compile(r'(^|/)[0-9a-f]{20}(-\d+)?\.[a-z0-9]+$')
+HASH_LENGTH = 20
+
+
+def is_content_hashed(name):
+    return bool(name and CONTENT_HASHED_NAME_RE.search(name))
+
+
+def media_version(storage, name):
+    """
+    Версия файла для URL: '' для контентно-адресуемых имён (версия уже в имени),
+    иначе время изменения файла. Не меняется, пока не меняется файл.
+    """
+    if not name or is_content_hashed(name):
+        return ''
+    try:
+        return str(int(storage.get_modified_time(name).timestamp()))
+    except (OSError, NotImplementedError):
+        return ''
+
+
+def versioned_url(file):
+    """URL файла поля (FieldFile) со стабильной версией: ...?v=<mtime> для старых имён"""
+    if not file:
+        return ''
+    version = media_version(file.storage, file.name)
+    return f'{file.url}?v={version}' if version else file.url
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Хранилище, которое называет файлы по SHA-256 содержимого.
+
+    Один и тот же файл хранится один раз: повторная загрузка возвращает имя
+    существующего файла. Имена не меняются при неизменном содержимом, поэтому
+    URL можно отдавать с Cache-Control: immutable.
+    Каждый записанный файл регистрируется в MediaBlob (счётчик ссылок),
+    чтобы cleanup_media мог удалить файлы, на которые никто не ссылается.
+    """
+
+    def content_name(self, name, content):
+        """Имя по содержимому: <каталог из upload_to>/<хэш>.<расширение>"""
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+
+        dirname, filename = os.path.split(name)
+        ext = os.path.splitext(filename)[1].lower()
+        return os.path.join(dirname, digest.hexdigest()[:HASH_LENGTH] + ext).replace('\\', '/')
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+
+        # Имена вариантов аватара уже построены по хэшу исходника — не переименовываем
+        if not is_content_hashed(name):
+            name = self.content_name(name, content)
+
+        # Сначала регистрируем, потом проверяем файл: register дождётся cleanup_media,
+        # если тот как раз удаляет этот файл, и exists увидит уже результат удаления
+        self.register(name)
+        if not self.exists(name):
+            name = super().save(name, content, max_length=max_length)
+        return name
+
+    def register(self, *names):
+        """Учитывает файлы в MediaBlob; возвращает имена, для которых строк не было"""
+        from .models import MediaBlob
+        return MediaBlob.register(*names)
+
+
+content_addressed_storage = ContentAddressedStorage()
+
+
+# --- СТАТИКА ---
+# Хранилище для collectstatic — в users.static_storage (не грузится при каждом старте)
+# <имя>.<12 hex>.<расширение> — имя с хэшем от ManifestStaticFilesStorage
+HASHED_STATIC_NAME_RE = re.compile(r'\.[0-9a-f]{12}\.[a-z0-9]+$')
+
+
+def is_hashed_static(name):
+    return bool(HASHED_STATIC_NAME_RE.search(name))
@@ -0,0 +1,95 @@
+import secrets
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from .models import TelegramLoginToken
+
+# --- ХРАНИЛИЩЕ ТОКЕНОВ ВХОДА ЧЕРЕЗ TELEGRAM ---
+# Источник истины — таблица TelegramLoginToken (индекс по token и expires_at).
+# Кэш — необязательный read-through уровень: экономит SELECT при погашении,
+# но его потеря (вытеснение, перезапуск Redis) ссылку не ломает.
+TOKEN_CACHE_PREFIX = 'telegram_login_token_'
+# Старый формат: бот сам клал telegram_id в кэш под этим ключом
+LEGACY_CACHE_PREFIX = 'telegram_login_'
+
+
+def login_token_ttl():
+    return getattr(settings, 'TELEGRAM_LOGIN_TOKEN_TTL', 600)
+
+
+def issue_login_token(telegram_id, ttl=None):
+    """Создаёт одноразовый токен входа для telegram_id и возвращает его"""
+    ttl = ttl or login_token_ttl()
+    token = secrets.token_urlsafe(32)
+    TelegramLoginToken.objects.create(
+        token=token,
+        telegram_id=telegram_id,
+        expires_at=timezone.now() + timedelta(seconds=ttl),
+    )
+    cache.set(TOKEN_CACHE_PREFIX + token, telegram_id, ttl)
+    return token
+
+
+def issue_login_tokens(telegram_ids, ttl=None, batch_size=1000):
+    """То же для многих telegram_id сразу (одним bulk_create): {telegram_id: токен}"""
+    ttl = ttl or login_token_ttl()
+    expires_at = timezone.now() + timedelta(seconds=ttl)
+    tokens = {telegram_id: secrets.token_urlsafe(32) for telegram_id in telegram_ids}
+    TelegramLoginToken.objects.bulk_create(
+        [TelegramLoginToken(token=token, telegram_id=telegram_id, expires_at=expires_at)
+         for telegram_id, token in tokens.items()],
+        batch_size=batch_size,
+    )
+    # Кэш не заполняем: ссылки-приглашения живут дольше кэша, погашение прочитает из БД
+    return tokens
+
+
+def redeem_login_token(token):
+    """
+    Погашает токен и возвращает telegram_id (None — токен неизвестен, истёк или уже использован).
+    Из нескольких одновременных попыток успешна ровно одна: погашение — это
+    DELETE одной строки по уникальному индексу, выигрывает тот, у кого удалилась строка.
+    """
+    now = timezone.now()
+    cache_key = TOKEN_CACHE_PREFIX + token
+
+    telegram_id = cache.get(cache_key)
+    if telegram_id is None:
+        telegram_id = (
+            TelegramLoginToken.objects
+            .filter(token=token, expires_at__gt=now)
+            .values_list('telegram_id', flat=True)
+            .first()
+        )
+
+    if telegram_id is not None:
+        deleted, _ = TelegramLoginToken.objects.filter(token=token, expires_at__gt=now).delete()
+        cache.delete(cache_key)
+        return telegram_id if deleted else None
+
+    # Токен старого формата (только в кэше): удаление ключа — тоже «сравнить и удалить»,
+    # delete() вернёт True только одному из конкурирующих запросов
+    legacy_key = LEGACY_CACHE_PREFIX + token
+    telegram_id = cache.get(legacy_key)
+    if telegram_id is not None and cache.delete(legacy_key):
+        return telegram_id
+    return None
+
+
+def purge_expired_login_tokens(batch_size=1000):
+    """Удаляет истёкшие токены пачками (короткие транзакции, без долгих блокировок)"""
+    now = timezone.now()
+    total = 0
+    while True:
+        ids = list(
+            TelegramLoginToken.objects
+            .filter(expires_at__lte=now)
+            .values_list('pk', flat=True)[:batch_size]
+        )
+        if not ids:
+            return total
+        deleted, _ = TelegramLoginToken.objects.filter(pk__in=ids).delete()
+        total += deleted
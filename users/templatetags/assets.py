@@ -0,0 +1,33 @@
+import logging
+from functools import lru_cache
+
+from django import template
+from django.contrib.staticfiles import finders
+
+logger = logging.getLogger(__name__)
+
+register = template.Library()
+
+# Файлы, которые делает python manage.py build_assets
+BUNDLE_FILES = ('build/app.css', 'build/icons.svg')
+
+
+@lru_cache(maxsize=None)
+def bundle_built():
+    """Собрана ли статика (проверяется один раз на процесс)"""
+    missing = [name for name in BUNDLE_FILES if not finders.find(name)]
+    if missing:
+        logger.warning(
+            f"Нет собранной статики ({', '.join(missing)}) — подключаются CDN. "
+            f"Запустите python manage.py build_assets"
+        )
+    return not missing
+
+
+@register.inclusion_tag('includes/assets_head.html')
+def asset_bundle():
+    """
+    CSS, шрифты и иконки в <head>: локальный бандл, а пока он не собран —
+    Tailwind CDN, Google Fonts и unpkg, как раньше.
+    """
+    return {'built': bundle_built()}
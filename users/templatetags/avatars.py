@@ -0,0 +1,20 @@
+from django import template
+
+register = template.Library()
+
+
+@register.inclusion_tag('includes/avatar_picture.html')
+def avatar_picture(user, size=96, css_class='', sizes=None, img_id=''):
+    """
+    <picture> с WebP и JPEG вариантами аватара.
+    size — размер (px) для src по умолчанию, sizes — атрибут sizes для srcset.
+    """
+    return {
+        'user': user,
+        'src': user.get_avatar_url(size),
+        'srcset_jpg': user.get_avatar_srcset('jpg'),
+        'srcset_webp': user.get_avatar_srcset('webp'),
+        'sizes': sizes or f'{size}px',
+        'css_class': css_class,
+        'img_id': img_id,
+    }
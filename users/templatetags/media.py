@@ -0,0 +1,14 @@
+from django import template
+
+from ..storage import versioned_url as _versioned_url
+
+register = template.Library()
+
+
+@register.filter
+def versioned_url(file):
+    """
+    URL медиафайла со стабильной версией вместо «?t=<сейчас>»:
+    {{ district.team_photo|versioned_url }}
+    """
+    return _versioned_url(file)
@@ -1,3 +1,1054 @@
-from django.test import TestCase
+import logging
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+from contextlib import ExitStack
+from unittest import mock
+from datetime import timedelta
+from io import BytesIO, StringIO
 
-# Create your tests here.
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection, connections
+from django.test.utils import CaptureQueriesContext
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from PIL import Image
+
+from tasks_app.models import Task
+
+from . import metrics, tracing
+from .admin import EstimatedCountPaginator
+from .cache import INVALIDATE_ALL, CircuitBreakerCache, LRUCache, TieredCache
+from .dashboard import get_dashboard
+from .db_router import REPLICA_PIN_COOKIE, replica_reads
+from .jobs import DatabaseBackend, Worker, enqueue, get_spec, job
+from .images import avatar_variant_names, process_avatar
+from .lookups import lookup_cache
+from .management.commands.profile_imports import parse_importtime, startup_code
+from .models import (
+    CustomUser, District, Event, Job, MediaBlob, Participation, Position, RequestProfile, TelegramLoginToken,
+)
+from .onboarding import import_users, read_rows
+from .query_budget import (
+    QueryBudgetExceeded, QueryBudgetTestMixin, QueryRecorder, normalize_sql, query_budget,
+)
+from .storage import ContentAddressedStorage, media_version
+from .telegram_tokens import (
+    LEGACY_CACHE_PREFIX, issue_login_token, issue_login_tokens, purge_expired_login_tokens, redeem_login_token,
+)
+from .views import IMMUTABLE_CACHE_CONTROL, serve_media, serve_static
+
+
+class QueryBudgetTestCase(QueryBudgetTestMixin, TestCase):
+    """Общие данные: район, руководитель, рядовые участники и задачи с записями"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.district = District.objects.create(name="Центральный")
+        cls.head = Position.objects.create(title="Руководитель районного отделения")
+        cls.member = Position.objects.create(title="Участник")
+        cls.leader = CustomUser.objects.create_user(
+            'leader', password='x', district=cls.district, position=cls.head,
+            first_name='Иван', last_name='Иванов',
+        )
+        cls.members = [
+            CustomUser.objects.create_user(
+                f'member{i}', password='x', district=cls.district, position=cls.member,
+                first_name='Участник', last_name=f'Номер{i}',
+            )
+            for i in range(5)
+        ]
+
+    def setUp(self):
+        cache.clear()
+        lookup_cache.local.clear()
+        self.client.force_login(self.leader)
+
+    def create_tasks(self, count):
+        deadline = timezone.now().date() + timedelta(days=7)
+        for i in range(count):
+            task = Task.objects.create(
+                title=f"Задача {i}", description="Описание", type='district',
+                deadline=deadline, district=self.district,
+            )
+            task.users_signed_up.add(self.leader, *self.members)
+
+
+class QueryBudgetToolsTests(QueryBudgetTestCase):
+
+    def test_normalize_sql_collapses_values_and_in_lists(self):
+        self.assertEqual(
+            normalize_sql("SELECT * FROM t WHERE id IN (%s, %s, %s) AND name = 'x'  AND n = 5"),
+            normalize_sql("SELECT * FROM t WHERE id IN (%s) AND name = 'y' AND n = 10"),
+        )
+
+    def test_recorder_reports_repeated_shapes(self):
+        self.create_tasks(3)
+        with ExitStack() as stack:
+            recorder = QueryRecorder(collect_shapes=True).record(stack)
+            for task in Task.objects.all():
+                task.users_signed_up.count()
+
+        repeated = recorder.repeated()
+        self.assertEqual(len(repeated), 1)
+        shape, count, location = repeated[0]
+        self.assertEqual(count, 3)
+        self.assertIn('users/tests.py', location)
+
+    @override_settings(QUERY_BUDGET_STRICT=True)
+    def test_query_budget_raises_in_strict_mode(self):
+        with self.assertRaises(QueryBudgetExceeded):
+            with query_budget(1, name='два запроса'):
+                list(CustomUser.objects.all())
+                list(District.objects.all())
+
+    def test_query_budget_decorator_within_limit(self):
+        @query_budget(1)
+        def one_query():
+            return CustomUser.objects.count()
+
+        self.assertEqual(one_query(), 6)
+        self.assertEqual(one_query.query_budget, 1)
+
+    @override_settings(QUERY_BUDGETS={'tasks': 1}, QUERY_BUDGET_STRICT=True, QUERY_DETECT_N_PLUS_ONE=False)
+    def test_middleware_reuses_request_metrics_count(self):
+        # Без поиска N+1 своя обёртка execute_wrapper не ставится — счёт из PerformanceMiddleware
+        self.client.force_login(self.leader)
+        with mock.patch.object(QueryRecorder, 'record') as record, self.assertRaises(QueryBudgetExceeded):
+            self.client.get('/tasks/')
+        record.assert_not_called()
+
+
+class ViewQueryBudgetTests(QueryBudgetTestCase):
+
+    def test_tasks_view_within_budget(self):
+        self.create_tasks(10)
+        response = self.assertQueryBudget('/tasks/')
+        self.assertEqual(len(response.context['tasks']), 10)
+        self.assertEqual(response.context['tasks'][0].signed_up_count_in_district, 6)
+
+    def test_tasks_view_has_no_per_task_queries(self):
+        self.create_tasks(10)
+        self.assertNoRepeatedQueries('/tasks/')
+
+    def test_home_within_budget(self):
+        self.assertQueryBudget('/')
+
+    def test_profile_within_budget(self):
+        self.assertQueryBudget('/profile/')
+
+    def test_user_list_within_budget(self):
+        self.assertQueryBudget('/users/')
+
+    def test_get_positions_within_budget(self):
+        self.assertQueryBudget(f'/get-positions/?district_id={self.district.pk}')
+
+    def test_reports_within_budget(self):
+        self.assertQueryBudget('/reports/')
+
+    def test_settings_within_budget(self):
+        self.assertQueryBudget('/settings/')
+
+
+class UserListViewTests(QueryBudgetTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.other_district = District.objects.create(name="Северный", code="north")
+        cls.outsider = CustomUser.objects.create_user(
+            'outsider', password='x', district=cls.other_district, position=cls.member, last_name='Петров',
+        )
+
+    def usernames(self, query=''):
+        response = self.client.get(f'/users/{query}')
+        self.assertEqual(response.status_code, 200)
+        return [user.username for user in response.context['users']]
+
+    def test_own_district_by_default(self):
+        self.assertEqual(self.usernames(), [f'member{i}' for i in range(5)])
+
+    def test_all_districts(self):
+        self.assertEqual(self.usernames('?all=1'), [f'member{i}' for i in range(5)] + ['outsider'])
+
+    def test_last_name_prefix_search(self):
+        self.assertEqual(self.usernames('?q=Номер3'), ['member3'])
+        self.assertEqual(self.usernames('?q=Петр'), [])
+        self.assertEqual(self.usernames('?q=Петр&all=1'), ['outsider'])
+
+    def test_pagination(self):
+        CustomUser.objects.bulk_create([
+            CustomUser(username=f'extra{i:02}', district=self.district, last_name=f'Яковлев{i:02}')
+            for i in range(20)
+        ])
+        self.assertEqual(len(self.usernames()), 24)
+        self.assertEqual(self.usernames('?page=2'), ['extra19'])
+
+    def test_forbidden_without_leader_position(self):
+        self.client.force_login(self.members[0])
+        self.assertEqual(self.client.get('/users/').status_code, 404)
+
+
+class GetPositionsTests(QueryBudgetTestCase):
+
+    def setUp(self):
+        super().setUp()
+        # Форма регистрации: запросы анонимные, сессия и пользователь не читаются
+        self.client.logout()
+        self.free_district = District.objects.create(name="Северный", code="north")
+        self.url = f'/get-positions/?district_id={self.free_district.pk}'
+
+    def test_repeated_request_is_304_without_queries(self):
+        first = self.client.get(self.url)
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(first['Cache-Control'], 'private, no-cache')
+
+        with self.assertNumQueries(0):
+            second = self.client.get(self.url, headers={'if-none-match': first['ETag']})
+        self.assertEqual(second.status_code, 304)
+        self.assertEqual(second['ETag'], first['ETag'])
+        self.assertEqual(second.content, b'')
+
+    def test_etag_changes_when_head_is_assigned(self):
+        first = self.client.get(self.url)
+        self.assertIn(self.head.pk, [position['id'] for position in first.json()['positions']])
+
+        # Кэш занятых должностей сбрасывается после коммита
+        with self.captureOnCommitCallbacks(execute=True):
+            self.members[0].district = self.free_district
+            self.members[0].position = self.head
+            self.members[0].save()
+
+        second = self.client.get(self.url, headers={'if-none-match': first['ETag']})
+        self.assertEqual(second.status_code, 200)
+        self.assertNotEqual(second['ETag'], first['ETag'])
+        self.assertNotIn(self.head.pk, [position['id'] for position in second.json()['positions']])
+
+
+class DashboardTests(QueryBudgetTestCase):
+
+    def test_widgets(self):
+        self.create_tasks(2)
+        soon = Task.objects.create(
+            title="Срочная", description="Описание", type='online', deadline=timezone.now().date(),
+        )
+        event = Event.objects.create(name="Форум", date=timezone.now().date())
+        Participation.objects.create(user=self.leader, event=event, role='delegate')
+
+        data = get_dashboard(self.leader)
+        self.assertEqual(data['open_total'], 3)
+        counts = {row['type']: row['count'] for row in data['open_by_type']}
+        self.assertEqual((counts['district'], counts['online']), (2, 1))
+        self.assertEqual([task['title'] for task in data['deadlines']], [soon.title])
+        self.assertFalse(data['deadlines'][0]['is_signed_up'])
+        self.assertEqual(len(data['my_tasks']), 2)
+        self.assertEqual(data['participations'][0]['event__name'], "Форум")
+
+    def test_cached_dashboard_costs_no_queries(self):
+        self.create_tasks(2)
+        self.client.get('/')
+        with self.assertNumQueries(0):
+            get_dashboard(self.leader)
+
+    def test_signup_invalidates_only_that_user(self):
+        task = Task.objects.create(
+            title="Новая", description="Описание", type='online', deadline=timezone.now().date(),
+        )
+        get_dashboard(self.leader)
+        get_dashboard(self.members[0])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            task.users_signed_up.add(self.leader)
+
+        self.assertEqual([t['title'] for t in get_dashboard(self.leader)['my_tasks']], ["Новая"])
+        with self.assertNumQueries(0):
+            get_dashboard(self.members[0])
+
+    def test_task_change_invalidates_everyone(self):
+        get_dashboard(self.members[0])
+        with self.captureOnCommitCallbacks(execute=True):
+            Task.objects.create(
+                title="Новая", description="Описание", type='district',
+                deadline=timezone.now().date(), district=self.district,
+            )
+        self.assertEqual(get_dashboard(self.members[0])['open_total'], 1)
+
+
+class MediaCacheTests(SimpleTestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        os.makedirs(os.path.join(self.root, 'district_teams'))
+        for name in ('district_teams/photo.jpg', 'district_teams/0123456789abcdef0123.jpg'):
+            with open(os.path.join(self.root, name), 'wb') as f:
+                f.write(b'jpeg')
+        self.factory = RequestFactory()
+
+    def get(self, path, query='', **headers):
+        request = self.factory.get(f'/media/{path}{query}', headers=headers)
+        return serve_media(request, path, document_root=self.root)
+
+    def test_media_version_is_stable(self):
+        storage = FileSystemStorage(location=self.root)
+        version = media_version(storage, 'district_teams/photo.jpg')
+        self.assertTrue(version)
+        self.assertEqual(version, media_version(storage, 'district_teams/photo.jpg'))
+        # Версия уже в имени файла
+        self.assertEqual(media_version(storage, 'district_teams/0123456789abcdef0123.jpg'), '')
+
+    def test_hashed_and_versioned_urls_are_immutable(self):
+        self.assertEqual(self.get('district_teams/0123456789abcdef0123.jpg')['Cache-Control'], IMMUTABLE_CACHE_CONTROL)
+        self.assertEqual(self.get('district_teams/photo.jpg', '?v=1')['Cache-Control'], IMMUTABLE_CACHE_CONTROL)
+        self.assertIn('no-cache', self.get('district_teams/photo.jpg')['Cache-Control'])
+
+    def test_conditional_requests_return_304(self):
+        response = self.get('district_teams/photo.jpg')
+        self.assertEqual(response.status_code, 200)
+
+        by_etag = self.get('district_teams/photo.jpg', if_none_match=response['ETag'])
+        self.assertEqual(by_etag.status_code, 304)
+        self.assertEqual(by_etag['ETag'], response['ETag'])
+
+        by_date = self.get('district_teams/photo.jpg', if_modified_since=response['Last-Modified'])
+        self.assertEqual(by_date.status_code, 304)
+
+
+class StaticServeTests(SimpleTestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        os.makedirs(os.path.join(self.root, 'build'))
+        for name, data in (('build/app.0123456789ab.css', b'body{}' * 100), ('build/app.0123456789ab.css.gz', b'gz')):
+            with open(os.path.join(self.root, name), 'wb') as f:
+                f.write(data)
+        self.factory = RequestFactory()
+
+    def get(self, path, **headers):
+        with override_settings(STATIC_ROOT=self.root):
+            return serve_static(self.factory.get(f'/static/{path}', headers=headers), path)
+
+    def test_precompressed_variant_by_accept_encoding(self):
+        response = self.get('build/app.0123456789ab.css', accept_encoding='gzip, deflate')
+        self.addCleanup(response.close)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Content-Type'], 'text/css')
+        self.assertEqual(b''.join(response.streaming_content), b'gz')
+        self.assertEqual(response['Cache-Control'], IMMUTABLE_CACHE_CONTROL)
+
+        plain = self.get('build/app.0123456789ab.css')
+        self.addCleanup(plain.close)
+        self.assertFalse(plain.has_header('Content-Encoding'))
+        self.assertNotEqual(plain['ETag'], response['ETag'])
+        self.assertEqual(self.get('build/app.0123456789ab.css', if_none_match=plain['ETag']).status_code, 304)
+
+
+
+@unittest.skipUnless('replica' in connections.settings, "нужна БД 'replica' (mg_project.settings_test)")
+class ReplicaRoutingTests(TransactionTestCase):
+    """
+    Реплика в тестах — отдельная SQLite без репликации: задача с заголовком
+    «реплика» есть только в ней, «основная» — только в основной БД.
+    """
+    databases = '__all__'
+
+    def setUp(self):
+        cache.clear()
+        lookup_cache.local.clear()
+        for alias in ('default', 'replica'):
+            district = District.objects.using(alias).create(pk=1, name="Центральный", code='C')
+            head = Position.objects.using(alias).create(pk=1, title="Руководитель районного отделения")
+            leader = CustomUser(pk=1, username='leader', district=district, position=head)
+            leader.set_password('x')
+            leader.save(using=alias)
+            Task.objects.using(alias).create(
+                pk=1, title="основная" if alias == 'default' else "реплика", description="Описание",
+                type='district', deadline=timezone.now().date() + timedelta(days=7), district=district,
+            )
+        self.leader = CustomUser.objects.get(pk=1)
+        self.client.force_login(self.leader)
+
+    def task_titles(self, response):
+        return [task.title for task in response.context['tasks']]
+
+    def test_read_only_views_use_replica(self):
+        self.assertEqual(self.task_titles(self.client.get('/tasks/')), ["реплика"])
+
+        CustomUser.objects.using('replica').create(pk=2, username='only_on_replica', district_id=1)
+        response = self.client.get('/users/')
+        self.assertEqual([user.username for user in response.context['users']], ['only_on_replica'])
+
+    def test_other_views_use_primary(self):
+        Task.objects.get(pk=1).users_signed_up.add(self.leader)
+        response = self.client.get('/')
+        self.assertEqual([task['title'] for task in response.context['dashboard']['my_tasks']], ["основная"])
+
+    def test_write_pins_user_to_primary(self):
+        response = self.client.post('/tasks/1/signup/')
+        self.assertIn(REPLICA_PIN_COOKIE, response.cookies)
+        # Следующий запрос (редирект после записи) читает с основной БД
+        self.assertEqual(self.task_titles(self.client.get('/tasks/')), ["основная"])
+
+    def test_reads_after_write_in_same_block_use_primary(self):
+        with replica_reads():
+            self.assertEqual(Task.objects.get(pk=1).title, "реплика")
+            Task.objects.filter(pk=1).update(status='done')
+            self.assertEqual(Task.objects.get(pk=1).status, 'done')
+        self.assertEqual(Task.objects.get(pk=1).title, "основная")
+
+
+JOB_CALLS = []
+
+
+def _record_job_failure(label, fail=False):
+    JOB_CALLS.append(('failed', label))
+
+
+@job(max_attempts=2, on_failure=_record_job_failure)
+def record_job(label, fail=False):
+    if fail:
+        raise ValueError(label)
+    JOB_CALLS.append(label)
+
+
+@override_settings(JOB_QUEUE_BACKEND='db', JOB_RETRY_BASE_DELAY=0)
+class JobQueueTests(TestCase):
+    """Задания тестов не обращаются к БД: потоки пула не видят транзакцию теста"""
+
+    def setUp(self):
+        JOB_CALLS.clear()
+
+    def run_worker(self):
+        worker = Worker(concurrency=1, pool='thread', poll_interval=0.01, backend=DatabaseBackend())
+        worker.run(burst=True)
+        return worker
+
+    def test_priority_and_delayed_jobs(self):
+        enqueue(record_job, args=['low'])
+        enqueue(record_job, args=['high'], priority=5)
+        delayed = enqueue(record_job, args=['later'], delay=60)
+
+        worker = self.run_worker()
+        self.assertEqual(JOB_CALLS, ['high', 'low'])
+        self.assertEqual(worker.processed, 2)
+        self.assertEqual(Job.objects.get(pk=delayed).status, Job.QUEUED)
+
+    def test_unique_key_deduplicates_until_finished(self):
+        first = enqueue(record_job, args=['a'], unique_key='report_1')
+        self.assertEqual(enqueue(record_job, args=['b'], unique_key='report_1'), first)
+
+        self.run_worker()
+        self.assertEqual(JOB_CALLS, ['a'])
+        self.assertNotEqual(enqueue(record_job, args=['c'], unique_key='report_1'), first)
+
+    def test_retries_then_calls_on_failure(self):
+        job_id = enqueue(record_job, args=['broken'], kwargs={'fail': True})
+
+        worker = self.run_worker()
+        failed = Job.objects.get(pk=job_id)
+        self.assertEqual(failed.status, Job.FAILED)
+        self.assertEqual(failed.attempts, 2)
+        self.assertIn('ValueError: broken', failed.last_error)
+        self.assertEqual(JOB_CALLS, [('failed', 'broken')])
+        self.assertEqual(worker.failed, 1)
+
+    def test_stale_jobs_are_requeued(self):
+        job_id = enqueue(record_job, args=['stale'])
+        Job.objects.filter(pk=job_id).update(
+            status=Job.RUNNING, attempts=1, locked_by='dead:1', locked_at=timezone.now() - timedelta(hours=1),
+        )
+        self.run_worker()
+        self.assertEqual(Job.objects.get(pk=job_id).status, Job.DONE)
+        self.assertEqual(JOB_CALLS, ['stale'])
+
+    def test_team_photo_upload_is_processed_by_job(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        district = District.objects.create(name="Центральный")
+        head = Position.objects.create(title="Руководитель районного отделения")
+        leader = CustomUser.objects.create_user('leader', password='x', district=district, position=head)
+        self.client.force_login(leader)
+
+        photo = BytesIO()
+        Image.new('RGB', (64, 48), 'red').save(photo, format='PNG')
+        with override_settings(MEDIA_ROOT=os.path.join(root, 'media'), JOB_FILES_ROOT=os.path.join(root, 'jobs')):
+            response = self.client.post('/upload-team-photo/', {
+                'team_photo': SimpleUploadedFile('team.png', photo.getvalue(), content_type='image/png'),
+            })
+            self.assertEqual(response.status_code, 202)
+            self.assertEqual(self.client.get('/upload-team-photo/status/').json()['status'], 'pending')
+
+            # Выполняем задание в потоке теста (в нём видны данные теста)
+            queued = Job.objects.get(name='users.views.process_team_photo')
+            get_spec(queued.name).func(*queued.payload['args'])
+
+            self.assertEqual(self.client.get('/upload-team-photo/status/').json()['status'], 'success')
+            district.refresh_from_db()
+            self.assertTrue(district.team_photo.name.endswith('.jpg'))
+            self.assertEqual(os.listdir(os.path.join(root, 'jobs', 'team_photo')), [])
+
+
+class StartupImportTests(SimpleTestCase):
+
+    def test_heavy_modules_are_not_imported_at_startup(self):
+        code = startup_code() + '; import sys; print(" ".join(sorted(sys.modules)))'
+        result = subprocess.run(
+            [sys.executable, '-c', code], cwd=settings.BASE_DIR, capture_output=True, text=True,
+            env={**os.environ, 'DJANGO_SETTINGS_MODULE': settings.SETTINGS_MODULE},
+        )
+        self.assertEqual(result.returncode, 0, result.stderr)
+        modules = set(result.stdout.split())
+        self.assertIn('users.views', modules)
+        for heavy in ('PIL', 'PIL.Image', 'django.contrib.staticfiles.storage'):
+            self.assertNotIn(heavy, modules)
+
+    def test_parse_importtime(self):
+        output = (
+            "import time: self [us] | cumulative | imported package\n"
+            "import time:       120 |        120 |   users.metrics\n"
+            "import time:      2075 |       2195 | users.cache\n"
+        )
+        self.assertEqual(parse_importtime(output), [('users.metrics', 120, 120), ('users.cache', 2075, 2195)])
+
+
+class AdminChangelistTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = CustomUser.objects.create_superuser('admin', 'admin@example.com', 'x')
+        cls.district = District.objects.create(name="Центральный")
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def create_participations(self, start, count):
+        event = Event.objects.create(name=f"Форум {start}", date=timezone.now().date())
+        users = CustomUser.objects.bulk_create(
+            CustomUser(username=f'user{i}', district=self.district) for i in range(start, start + count)
+        )
+        Participation.objects.bulk_create(Participation(user=user, event=event) for user in users)
+
+    def changelist_queries(self, url):
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response, len(captured)
+
+    def test_queries_do_not_grow_with_rows(self):
+        self.create_participations(0, 2)
+        few = [self.changelist_queries(url)[1] for url in ('/admin/users/participation/', '/admin/users/customuser/')]
+        self.create_participations(100, 30)
+        many = [self.changelist_queries(url)[1] for url in ('/admin/users/participation/', '/admin/users/customuser/')]
+        self.assertEqual(few, many)
+
+    def test_participation_search_by_prefix(self):
+        self.create_participations(0, 3)
+        self.create_participations(10, 2)
+
+        response, _ = self.changelist_queries('/admin/users/participation/?q=user1')
+        self.assertEqual(sorted(p.user.username for p in response.context['cl'].result_list), ['user1', 'user10', 'user11'])
+
+        response, _ = self.changelist_queries('/admin/users/participation/?q=Форум 10')
+        self.assertEqual(len(response.context['cl'].result_list), 2)
+
+    def test_estimated_count_only_without_filters(self):
+        self.create_participations(0, 3)
+        participations = Participation.objects.order_by('pk')
+        with mock.patch('users.admin.estimated_row_count', return_value=250_000):
+            self.assertEqual(EstimatedCountPaginator(participations, 100).count, 250_000)
+            self.assertEqual(EstimatedCountPaginator(participations.filter(role='listener'), 100).count, 3)
+        # Без статистики СУБД (SQLite) — обычный COUNT(*)
+        self.assertEqual(EstimatedCountPaginator(participations, 100).count, 3)
+
+
+class UserImportTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.district = District.objects.create(name="Центральный", code="C")
+        cls.head = Position.objects.create(title="Руководитель районного отделения")
+        cls.member = Position.objects.create(title="Участник")
+        CustomUser.objects.create_user('taken', password='x')
+
+    def setUp(self):
+        cache.clear()
+        lookup_cache.local.clear()
+
+    def csv_rows(self, lines):
+        header = 'username;last_name;first_name;district;position;telegram_id\n'
+        return read_rows(BytesIO((header + '\n'.join(lines)).encode('utf-8-sig')))
+
+    def test_import_resolves_lookups_and_rejects_bad_rows(self):
+        rows = self.csv_rows([
+            'ivanov;Иванов;Иван;C;Руководитель районного отделения;111',
+            'petrov;Петров;Пётр;центральный;Руководитель районного отделения;',
+            'taken;Занят;Логин;C;Участник;',
+            'sidorov;Сидоров;Сидор;Северный;Участник;',
+            'smirnov;Смирнов;Семён;Центральный;участник;abc',
+        ])
+        result = import_users(rows)
+
+        self.assertEqual([user.username for _, user in result.created], ['ivanov'])
+        self.assertEqual(
+            [(line, error) for line, _, error in sorted(result.rejected)],
+            [(3, "В этом районе уже есть Руководитель"), (4, "Логин уже занят"),
+             (5, "Неизвестный район «Северный»"), (6, "Telegram ID должен быть числом, а не «abc»")],
+        )
+        user = CustomUser.objects.get(username='ivanov')
+        self.assertFalse(user.has_usable_password())
+        self.assertEqual((user.district, user.position, user.department_type), (self.district, self.head, 'district'))
+
+    def test_queries_do_not_grow_with_rows(self):
+        def queries(start, count):
+            rows = self.csv_rows([f'user{i};Фамилия;Имя;C;Участник;' for i in range(start, start + count)])
+            with CaptureQueriesContext(connection) as captured:
+                import_users(rows)
+            return len(captured)
+
+        queries(0, 1)  # прогрев кэша справочников
+        self.assertEqual(queries(100, 2), queries(200, 40))
+        self.assertEqual(CustomUser.objects.filter(username__startswith='user').count(), 43)
+
+    def test_invite_links_set_password_and_log_in_via_telegram(self):
+        result = import_users(self.csv_rows(['ivanov;Иванов;Иван;C;Участник;111']))
+        row = result.rows('http://testserver/')[0]
+
+        response = self.client.get(row['password_url'], follow=True)
+        self.client.post(response.redirect_chain[-1][0], {'new_password1': 'Secret-pass-42', 'new_password2': 'Secret-pass-42'})
+        self.assertTrue(CustomUser.objects.get(username='ivanov').check_password('Secret-pass-42'))
+        # Ссылка одноразовая: после установки пароля токен больше не действует
+        response = self.client.get(row['password_url'], follow=True)
+        self.assertFalse(response.context['validlink'])
+
+        response = self.client.get(row['telegram_url'])
+        self.assertRedirects(response, '/', fetch_redirect_response=False)
+        self.assertEqual(int(self.client.session['_auth_user_id']), result.created[0][1].pk)
+
+    def test_command_keeps_existing_reports(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        source = os.path.join(root, 'users.csv')
+        with open(source, 'w', encoding='utf-8') as f:
+            f.write('username,last_name,district\nnew1,Новиков,C\n')
+
+        call_command('import_users', source, '--dry-run', stdout=StringIO())
+        self.assertEqual(sorted(os.listdir(root)), ['users-check.csv', 'users.csv'])
+        self.assertFalse(CustomUser.objects.filter(username='new1').exists())
+
+        call_command('import_users', source, stdout=StringIO())
+        with open(os.path.join(root, 'users-invites.csv'), encoding='utf-8-sig') as f:
+            self.assertIn('/reset/', f.read())
+
+        # Повторный запуск не затирает ссылки из первого отчёта
+        with self.assertRaisesMessage(CommandError, 'уже есть'):
+            call_command('import_users', source, stdout=StringIO())
+
+    def test_admin_import_and_invite_action(self):
+        admin_user = CustomUser.objects.create_superuser('admin', 'admin@example.com', 'x')
+        self.client.force_login(admin_user)
+        upload = SimpleUploadedFile('users.csv', 'username,last_name,district\nnew1,Новиков,C\n,,\n'.encode())
+
+        response = self.client.post('/admin/users/customuser/import/', {'file': upload})
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        report = response.content.decode('utf-8-sig').splitlines()
+        self.assertEqual(report[0], 'line,username,full_name,email,password_url,telegram_url,error')
+        self.assertIn('/reset/', report[1])
+
+        new_user = CustomUser.objects.get(username='new1')
+        response = self.client.post('/admin/users/customuser/', {
+            'action': 'issue_invites', '_selected_action': [new_user.pk, admin_user.pk],
+        })
+        self.assertEqual(len(response.content.decode('utf-8-sig').splitlines()), 2)
+
+
+class MetricsTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.member = CustomUser.objects.create_user('member', password='x')
+        cls.staff = CustomUser.objects.create_user('staff', password='x', is_staff=True)
+
+    def test_server_timing_only_for_staff(self):
+        self.client.force_login(self.member)
+        self.assertFalse(self.client.get('/metrics/').has_header('Server-Timing'))
+
+        self.client.force_login(self.staff)
+        self.assertIn('db;dur=', self.client.get('/metrics/')['Server-Timing'])
+
+    def test_observe_puts_duration_into_first_fitting_bucket(self):
+        registry = metrics.Registry()
+        for elapsed in (0.03, 0.05, 20):
+            registry.observe('view', 'GET', 200, mock.Mock(
+                elapsed=elapsed, db_queries=1, db_time=0, cache_hits=0, cache_misses=0, template_time=0,
+            ))
+        output = registry.render_prometheus()
+        self.assertIn('le="0.025"} 0\n', output)
+        self.assertIn('le="0.05"} 2\n', output)
+        self.assertIn('le="10.0"} 2\n', output)
+        self.assertIn('le="+Inf"} 3\n', output)
+        self.assertIn('http_request_db_queries_total{view="view",method="GET",status="2xx"', output)
+
+    def test_metrics_view_is_staff_only(self):
+        self.client.force_login(self.member)
+        self.assertEqual(self.client.get('/metrics/').status_code, 404)
+
+        self.client.force_login(self.staff)
+        stats = {'state': 'open', 'hits': 5, 'misses': 1, 'errors': 2, 'fallback_calls': 3, 'trips': 1}
+        with mock.patch('users.views.cache', mock.Mock(stats=lambda: stats)):
+            response = self.client.get('/metrics/')
+        self.assertEqual(response.status_code, 200)
+        body = response.content.decode()
+        self.assertIn('# TYPE cache_backend_hits_total counter\n', body)
+        self.assertIn('cache_backend_errors_total{pid=', body)
+        self.assertIn('# TYPE cache_backend_circuit_open gauge\n', body)
+        self.assertRegex(body, r'cache_backend_circuit_open\{pid="\d+"\} 1\n')
+
+
+@override_settings(PROFILER_KEEP=2)
+class ProfilerMiddlewareTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.member = CustomUser.objects.create_user('member', password='x')
+        cls.staff = CustomUser.objects.create_user('staff', password='x', is_staff=True)
+
+    def test_flag_is_ignored_for_non_staff(self):
+        self.client.force_login(self.member)
+        response = self.client.get('/login/?_profile=1')
+        self.assertFalse(response.has_header('X-Profile-Id'))
+        self.assertFalse(RequestProfile.objects.exists())
+
+    def test_staff_request_is_profiled_and_old_profiles_dropped(self):
+        old = timezone.now() - timedelta(hours=1)
+        for minutes in (1, 2):
+            profile = RequestProfile.objects.create(method='GET', path='/old/', duration_ms=1, status_code=200)
+            RequestProfile.objects.filter(pk=profile.pk).update(created_at=old - timedelta(minutes=minutes))
+        self.client.force_login(self.staff)
+
+        response = self.client.get('/login/', headers={'x-profile': '1'})
+        profile = RequestProfile.objects.get(pk=response['X-Profile-Id'])
+        self.assertEqual((profile.path, profile.view_name, profile.status_code), ('/login/', 'login', 200))
+        self.assertEqual(response['X-Profile-Url'], f'/admin/users/requestprofile/{profile.pk}/change/')
+        # PROFILER_KEEP = 2: новый и самый свежий из старых
+        self.assertEqual(RequestProfile.objects.count(), 2)
+        self.assertEqual(RequestProfile.objects.last().created_at, old - timedelta(minutes=1))
+
+
+class TracingTests(TestCase):
+    TRACE_ID = '0af7651916cd43dd8448eb211c80319c'
+    PARENT_ID = 'b7ad6b7169203331'
+
+    def test_parse_traceparent(self):
+        self.assertEqual(
+            tracing.parse_traceparent(f'00-{self.TRACE_ID}-{self.PARENT_ID}-01'),
+            (self.TRACE_ID, self.PARENT_ID, True),
+        )
+        self.assertEqual(tracing.parse_traceparent(f'00-{self.TRACE_ID}-{self.PARENT_ID}-00')[2], False)
+        for value in (None, '', 'garbage', f'00-{self.TRACE_ID}-{self.PARENT_ID}-zz', f'00-abc-{self.PARENT_ID}-01'):
+            self.assertIsNone(tracing.parse_traceparent(value))
+
+    def test_should_sample(self):
+        self.assertFalse(tracing.should_sample(0))
+        self.assertTrue(tracing.should_sample(1))
+        with mock.patch('users.tracing.random.random', return_value=0.3):
+            self.assertTrue(tracing.should_sample(0.5))
+            self.assertFalse(tracing.should_sample(0.2))
+
+    def test_trace_id_header_and_export(self):
+        # В settings_test выборка 0: трассируются только запросы с флагом sampled
+        with mock.patch('users.tracing.get_exporter') as get_exporter:
+            response = self.client.get('/login/')
+            self.assertEqual(len(response['X-Trace-Id']), 32)
+            get_exporter.assert_not_called()
+
+            response = self.client.get('/login/', headers={'traceparent': f'00-{self.TRACE_ID}-{self.PARENT_ID}-01'})
+        self.assertEqual(response['X-Trace-Id'], self.TRACE_ID)
+        records = get_exporter.return_value.export.call_args.args[0]
+        root = next(record for record in records if record['name'] == 'http.request')
+        self.assertEqual((root['trace_id'], root['parent_id']), (self.TRACE_ID, self.PARENT_ID))
+        self.assertEqual(root['attributes']['status_code'], 200)
+
+    def test_log_records_carry_trace_id(self):
+        record = logging.LogRecord('users', logging.INFO, __file__, 1, 'msg', None, None)
+        with tracing.bind_trace_id(self.TRACE_ID):
+            tracing.TraceIdFilter().filter(record)
+        self.assertEqual(record.trace_id, self.TRACE_ID)
+        tracing.TraceIdFilter().filter(record)
+        self.assertEqual(record.trace_id, '-')
+
+    def test_jsonl_exporter_rotates_by_size(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        path = os.path.join(root, 'traces.jsonl')
+        exporter = tracing.JsonLinesExporter(path, max_bytes=5, backups=2)
+        for n in range(4):
+            exporter.write([{'n': n}])
+        self.assertEqual(sorted(os.listdir(root)), ['traces.jsonl', 'traces.jsonl.1', 'traces.jsonl.2'])
+        for name, n in (('traces.jsonl', 3), ('traces.jsonl.1', 2), ('traces.jsonl.2', 1)):
+            with open(os.path.join(root, name)) as f:
+                self.assertEqual(f.read(), f'{{"n": {n}}}\n')
+
+
+class MediaBlobTests(TestCase):
+
+    def test_change_refcount_is_one_insert_and_one_update(self):
+        names = [f'avatars/abc_{size}.jpg' for size in (64, 128, 256)]
+        MediaBlob.change_refcount(names[:1], +1)
+        with CaptureQueriesContext(connection) as captured:
+            MediaBlob.change_refcount(names, +1)
+        statements = [q['sql'].split()[0] for q in captured if not q['sql'].startswith(('SAVEPOINT', 'RELEASE'))]
+        self.assertEqual(statements, ['INSERT', 'UPDATE'])
+        self.assertEqual(
+            dict(MediaBlob.objects.values_list('name', 'refcount')),
+            {names[0]: 2, names[1]: 1, names[2]: 1},
+        )
+
+    def test_cleanup_keeps_blob_referenced_during_run(self):
+        old = timezone.now() - timedelta(days=2)
+        orphan = MediaBlob.objects.create(name='avatars/orphan.jpg', updated_at=old)
+        reused = MediaBlob.objects.create(name='avatars/reused.jpg', updated_at=old)
+        stale = list(MediaBlob.objects.order_by('pk'))
+        # Между выборкой сирот и удалением файл снова назначили пользователю
+        MediaBlob.change_refcount([reused.name], +1)
+
+        with mock.patch('django.db.models.query.QuerySet.iterator', return_value=iter(stale)), \
+                mock.patch('users.management.commands.cleanup_media.content_addressed_storage.delete') as delete:
+            call_command('cleanup_media', stdout=StringIO())
+
+        delete.assert_called_once_with(orphan.name)
+        self.assertEqual(list(MediaBlob.objects.values_list('name', flat=True)), [reused.name])
+
+    def test_register_moves_existing_blob_out_of_grace_period(self):
+        blob = MediaBlob.objects.create(name='avatars/old.jpg', updated_at=timezone.now() - timedelta(days=2))
+        self.assertFalse(MediaBlob.register(blob.name))
+        blob.refresh_from_db()
+        self.assertGreater(blob.updated_at, timezone.now() - timedelta(minutes=1))
+        self.assertTrue(MediaBlob.register('avatars/new.jpg'))
+
+    def test_reupload_after_cleanup_restores_rows_and_files(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        storage = ContentAddressedStorage(location=root)
+        image = BytesIO()
+        Image.new('RGB', (300, 300), 'red').save(image, 'PNG')
+
+        name = process_avatar(SimpleUploadedFile('a.png', image.getvalue()), storage=storage)
+        names = avatar_variant_names(name)
+        self.assertEqual(set(MediaBlob.objects.values_list('name', flat=True)), set(names))
+
+        # cleanup_media удалил сироту, пока её загружали снова: строк нет, файлов нет
+        MediaBlob.objects.update(updated_at=timezone.now() - timedelta(days=2))
+        with mock.patch('users.management.commands.cleanup_media.content_addressed_storage', storage):
+            call_command('cleanup_media', stdout=StringIO())
+        self.assertFalse(MediaBlob.objects.exists())
+        self.assertFalse(storage.exists(name))
+
+        self.assertEqual(process_avatar(SimpleUploadedFile('a.png', image.getvalue()), storage=storage), name)
+        self.assertEqual(set(MediaBlob.objects.values_list('name', flat=True)), set(names))
+        self.assertTrue(all(storage.exists(variant) for variant in names))
+
+
+class TelegramLoginTokenTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_token_is_redeemed_once(self):
+        token = issue_login_token(42)
+        self.assertEqual(redeem_login_token(token), 42)
+        self.assertIsNone(redeem_login_token(token))
+        self.assertFalse(TelegramLoginToken.objects.exists())
+
+    def test_expired_token_is_rejected(self):
+        token = issue_login_token(42)
+        TelegramLoginToken.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        cache.clear()
+        self.assertIsNone(redeem_login_token(token))
+
+    def test_redeem_survives_cache_loss(self):
+        token = issue_login_token(42)
+        cache.clear()
+        self.assertEqual(redeem_login_token(token), 42)
+
+    def test_legacy_cache_token_is_redeemed_once(self):
+        cache.set(LEGACY_CACHE_PREFIX + 'old', 7)
+        self.assertEqual(redeem_login_token('old'), 7)
+        self.assertIsNone(redeem_login_token('old'))
+
+    def test_purge_removes_only_expired_tokens(self):
+        live = issue_login_token(1)
+        issue_login_tokens([2, 3])
+        TelegramLoginToken.objects.exclude(token=live).update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(purge_expired_login_tokens(batch_size=1), 2)
+        self.assertEqual(list(TelegramLoginToken.objects.values_list('token', flat=True)), [live])
+
+
+class AvatarUploadTests(TestCase):
+
+    def setUp(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        storage = ContentAddressedStorage(location=root)
+        patcher = mock.patch.object(CustomUser._meta.get_field('avatar'), 'storage', storage)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.storage = storage
+        self.user = CustomUser.objects.create_user('avatar', password='x')
+        self.client.force_login(self.user)
+
+    def upload(self, size):
+        photo = BytesIO()
+        Image.new('RGB', size, 'red').save(photo, format='JPEG')
+        return self.client.post('/upload-avatar/', {
+            'avatar': SimpleUploadedFile('me.jpg', photo.getvalue(), content_type='image/jpeg'),
+        })
+
+    def test_large_jpeg_is_decoded_in_draft_mode(self):
+        with mock.patch('PIL.JpegImagePlugin.JpegImageFile.draft', autospec=True,
+                        side_effect=Image.Image.draft) as draft:
+            response = self.upload((1600, 1200))
+        self.assertEqual(response.json()['status'], 'success')
+        draft.assert_called_once_with(mock.ANY, 'RGB', (512, 512))
+        self.user.refresh_from_db()
+        with self.storage.open(self.user.avatar.name) as f, Image.open(f) as img:
+            self.assertEqual(img.size, (256, 256))
+
+    def test_limits_are_checked_before_decoding(self):
+        with mock.patch('users.views.AVATAR_MAX_PIXELS', 1000), \
+                mock.patch('users.images.normalize_image') as normalize:
+            response = self.upload((64, 64))
+        self.assertEqual(response.status_code, 413)
+        normalize.assert_not_called()
+        self.assertFalse(MediaBlob.objects.exists())
+
+        with mock.patch('users.views.AVATAR_MAX_BYTES', 10):
+            self.assertEqual(self.upload((64, 64)).status_code, 413)
+
+
+LOCMEM = 'django.core.cache.backends.locmem.LocMemCache'
+
+
+@override_settings(CACHES={
+    'default': {'BACKEND': LOCMEM},
+    'primary': {'BACKEND': LOCMEM, 'LOCATION': 'breaker-primary'},
+})
+class CircuitBreakerTests(SimpleTestCase):
+    """Вместо Redis — locmem-кэш 'primary'; отключение — вручную через _record_failure"""
+
+    def setUp(self):
+        self.primary = caches['primary']
+        self.primary.clear()
+        self.breaker = CircuitBreakerCache('', {'OPTIONS': {'PRIMARY': 'primary', 'FAILURE_THRESHOLD': 1}})
+
+    def trip(self):
+        with mock.patch.object(self.breaker, '_start_probe'):
+            self.breaker._record_failure(OSError("Redis недоступен"))
+        self.assertEqual(self.breaker.state, CircuitBreakerCache.OPEN)
+
+    def test_keys_changed_during_outage_are_dropped_from_redis(self):
+        self.breaker.set('tasks_version', 1)
+        self.breaker.set('session', 'alive')
+        self.breaker.set('untouched', 'kept')
+        self.trip()
+
+        self.breaker.set('tasks_version', 2)
+        self.breaker.delete('session')
+        self.assertEqual(self.primary.get('session'), 'alive')
+
+        self.breaker._reconcile()
+        self.assertEqual(self.breaker.state, CircuitBreakerCache.CLOSED)
+        self.assertIsNone(self.breaker.get('session'))
+        self.assertIsNone(self.breaker.get('tasks_version'))
+        self.assertEqual(self.breaker.get('untouched'), 'kept')
+
+    def test_too_many_changed_keys_clear_redis(self):
+        self.breaker.set('untouched', 'kept')
+        self.trip()
+        with mock.patch.object(CircuitBreakerCache, 'DIRTY_KEYS_LIMIT', 2):
+            self.breaker.set_many({'a': 1, 'b': 2, 'c': 3})
+        self.breaker._reconcile()
+        self.assertIsNone(self.primary.get('untouched'))
+
+
+@override_settings(
+    CACHES={
+        'default': {'BACKEND': 'users.cache.CircuitBreakerCache', 'OPTIONS': {'PRIMARY': 'primary', 'FAILURE_THRESHOLD': 1}},
+        'primary': {'BACKEND': LOCMEM, 'LOCATION': 'sessions-primary'},
+    },
+    SESSION_ENGINE='django.contrib.sessions.backends.cached_db',
+    SESSION_CACHE_ALIAS='default',
+)
+class CachedSessionOutageTests(TestCase):
+
+    def test_logout_during_outage_does_not_resurrect_session(self):
+        user = CustomUser.objects.create_user('member', password='x')
+        self.client.force_login(user)
+        session_cookie = self.client.cookies[settings.SESSION_COOKIE_NAME].value
+
+        breaker = caches['default']
+        with mock.patch.object(breaker, '_start_probe'):
+            breaker._record_failure(OSError("Redis недоступен"))
+        self.client.post('/logout/')
+        breaker._reconcile()
+
+        # Redis снова в работе: старая кука не должна снова войти в систему
+        self.client.cookies[settings.SESSION_COOKIE_NAME] = session_cookie
+        response = self.client.get('/profile/')
+        self.assertEqual(response.status_code, 302)
+        self.assertIn('/login/', response['Location'])
+
+
+class TieredCacheTests(SimpleTestCase):
+    """Два экземпляра TieredCache с общей шиной — два воркера; общий кэш — locmem"""
+
+    def setUp(self):
+        cache.clear()
+        self.worker_a = TieredCache('tiered-test')
+        self.worker_b = TieredCache('tiered-test')
+        # Шина одна на «кластер»: сброс из A доходит до B, как через Redis pub/sub
+        self.worker_b.bus = self.worker_a.bus
+        self.worker_a.bus.subscribe(self.worker_b._on_invalidate)
+
+    def test_lru_evicts_oldest_and_expires(self):
+        lru = LRUCache(maxsize=2, ttl=10)
+        with mock.patch('users.cache.time.monotonic', return_value=100):
+            lru.set('a', 1)
+            lru.set('b', 2)
+            lru.get('a')
+            lru.set('c', 3)
+            self.assertEqual((lru.get('a'), lru.get('b'), lru.get('c')), (1, None, 3))
+        with mock.patch('users.cache.time.monotonic', return_value=111):
+            self.assertIsNone(lru.get('a'))
+
+    def test_read_through_and_invalidation_across_workers(self):
+        self.assertEqual(self.worker_a.get_or_load('k', lambda: 'v1'), 'v1')
+        # B берёт значение из общего кэша, loader не вызывается
+        self.assertEqual(self.worker_b.get_or_load('k', lambda: 'unused'), 'v1')
+
+        self.worker_a.invalidate('k')
+        self.assertEqual(self.worker_b.get_or_load('k', lambda: 'v2'), 'v2')
+        self.assertEqual(self.worker_a.get_or_load('k', lambda: 'unused'), 'v2')
+
+    def test_invalidation_during_load_does_not_write_back_stale_value(self):
+        def slow_loader():
+            # Пока A читает БД, B сохраняет изменение и сбрасывает ключ
+            self.worker_b.invalidate('k')
+            return 'stale'
+
+        self.assertEqual(self.worker_a.get_or_load('k', slow_loader), 'stale')
+        self.assertEqual(self.worker_a.get_or_load('k', lambda: 'fresh'), 'fresh')
+        self.assertEqual(self.worker_b.get_or_load('k', lambda: 'unused'), 'fresh')
+
+    def test_invalidate_all_clears_local_level(self):
+        self.worker_b.get_or_load('k', lambda: 'v1')
+        cache.clear()
+        self.worker_a.bus.publish(INVALIDATE_ALL)
+        self.assertEqual(self.worker_b.get_or_load('k', lambda: 'v2'), 'v2')
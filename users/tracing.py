@@ -0,0 +1,360 @@
+import json
+import logging
+import os
+import queue
+import random
+import secrets
+import threading
+import time
+import urllib.request
+from contextlib import ExitStack
+from contextvars import ContextVar
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# --- ТРАССИРОВКА ЗАПРОСОВ ---
+# Лёгкие спаны без внешних зависимостей: view, SQL-запросы, вызовы кэша,
+# рендеринг шаблонов, декодирование/кодирование изображений Pillow.
+# Трассируется доля запросов TRACING_SAMPLE_RATE (и все, у кого во входящем
+# заголовке traceparent стоит флаг sampled). Для остальных span() возвращает
+# общий пустой контекстный менеджер — стоимость одного ContextVar.get().
+# trace_id попадает в логи (TraceIdFilter) и в заголовок ответа X-Trace-Id.
+# Экспорт — в JSON-lines файл (по строке на спан) или в локальный
+# OTLP/HTTP-коллектор (формат OTLP/JSON), из фонового потока.
+
+_current_span = ContextVar('tracing_span', default=None)
+# trace_id есть и у неотслеживаемых запросов — чтобы связать строки логов
+_current_trace_id = ContextVar('tracing_trace_id', default=None)
+
+
+def new_trace_id():
+    return secrets.token_hex(16)
+
+
+def new_span_id():
+    return secrets.token_hex(8)
+
+
+class Span:
+    __slots__ = ('trace_id', 'span_id', 'parent_id', 'name', 'start_ns', '_started',
+                 'duration_ms', 'attributes', 'error', 'collector')
+
+    def __init__(self, trace_id, name, parent_id=None, attributes=None, collector=None):
+        self.trace_id = trace_id
+        self.span_id = new_span_id()
+        self.parent_id = parent_id
+        self.name = name
+        self.start_ns = time.time_ns()
+        self._started = time.perf_counter()
+        self.duration_ms = None
+        self.attributes = attributes or {}
+        self.error = None
+        self.collector = collector if collector is not None else []
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def set_name(self, name):
+        self.name = name
+
+    def end(self):
+        self.duration_ms = (time.perf_counter() - self._started) * 1000
+        self.collector.append(self)
+
+    def to_dict(self):
+        return {
+            'trace_id': self.trace_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'name': self.name,
+            'start_unix_nano': self.start_ns,
+            'duration_ms': round(self.duration_ms, 3),
+            'attributes': self.attributes,
+            'error': self.error,
+        }
+
+
+class _NoopSpan:
+    """Спан неотслеживаемого запроса: ничего не делает"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def set_attribute(self, key, value):
+        pass
+
+    def set_name(self, name):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class _SpanContext:
+    __slots__ = ('span', '_token')
+
+    def __init__(self, span):
+        self.span = span
+
+    def __enter__(self):
+        self._token = _current_span.set(self.span)
+        return self.span
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc is not None:
+            self.span.error = f'{exc_type.__name__}: {exc}'
+        self.span.end()
+        _current_span.reset(self._token)
+        return False
+
+    def set_attribute(self, key, value):
+        self.span.set_attribute(key, value)
+
+
+def span(name, **attributes):
+    """Дочерний спан текущей трассы (или пустышка, если запрос не трассируется)"""
+    parent = _current_span.get()
+    if parent is None:
+        return NOOP_SPAN
+    return _SpanContext(Span(parent.trace_id, name, parent.span_id, attributes, parent.collector))
+
+
+def db_execute_wrapper(execute, sql, params, many, context):
+    """Обёртка для connection.execute_wrapper(): спан на каждый SQL-запрос"""
+    with span('db.query', **{'db.statement': sql[:500], 'db.alias': context['connection'].alias}):
+        return execute(sql, params, many, context)
+
+
+def current_trace_id():
+    return _current_trace_id.get()
+
+
+class bind_trace_id:
+    """trace_id для логов без записи спанов (запрос не попал в выборку)"""
+
+    def __init__(self, trace_id=None):
+        self.trace_id = trace_id or new_trace_id()
+
+    def __enter__(self):
+        self._token = _current_trace_id.set(self.trace_id)
+        return self.trace_id
+
+    def __exit__(self, *exc_info):
+        _current_trace_id.reset(self._token)
+        return False
+
+
+def current_context():
+    """(trace_id, span_id) текущего спана — для передачи в другой поток/процесс"""
+    current = _current_span.get()
+    return (current.trace_id, current.span_id) if current is not None else None
+
+
+class trace:
+    """
+    Корневой спан: начинает новую трассу или продолжает переданную
+    (context — результат current_context()). По выходу все спаны трассы
+    отправляются экспортёру. queries=True — спаны на SQL-запросы этого потока.
+    """
+
+    def __init__(self, name, context=None, queries=False, **attributes):
+        trace_id, parent_id = context if context else (new_trace_id(), None)
+        self.root = Span(trace_id, name, parent_id, attributes)
+        self.queries = queries
+        self._context = _SpanContext(self.root)
+        self._trace_id = bind_trace_id(trace_id)
+        self._stack = ExitStack()
+
+    def __enter__(self):
+        self._trace_id.__enter__()
+        root = self._context.__enter__()
+        if self.queries:
+            from django.db import connections
+            for conn in connections.all():
+                self._stack.enter_context(conn.execute_wrapper(db_execute_wrapper))
+        return root
+
+    def __exit__(self, *exc_info):
+        self._stack.close()
+        self._context.__exit__(*exc_info)
+        self._trace_id.__exit__(*exc_info)
+        export_spans(self.root.collector)
+        return False
+
+
+def parse_traceparent(value):
+    """W3C traceparent: 00-<trace_id>-<parent_id>-<flags> → (trace_id, parent_id, sampled) или None"""
+    parts = (value or '').split('-')
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    try:
+        sampled = bool(int(parts[3], 16) & 1)
+    except ValueError:
+        return None
+    return parts[1], parts[2], sampled
+
+
+def should_sample(rate):
+    return rate > 0 and (rate >= 1 or random.random() < rate)
+
+
+# --- ЭКСПОРТ ---
+
+class JsonLinesExporter:
+    """
+    Дописывает спаны в файл. Файл больше max_bytes переименовывается, как у
+    RotatingFileHandler: traces.jsonl → traces.jsonl.1 → … → .<backups>, самый
+    старый удаляется (max_bytes=0 — без ротации, например под logrotate).
+    Воркеры пишут в один файл и могут повернуть его почти одновременно — тогда
+    в .1 окажется короткий файл; спаны при этом не теряются, кроме самых старых.
+    """
+
+    def __init__(self, path, max_bytes=0, backups=3):
+        self.path = str(path)
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self._lock = threading.Lock()
+
+    def write(self, records):
+        lines = ''.join(json.dumps(record, ensure_ascii=False, default=str) + '\n' for record in records)
+        with self._lock:
+            if self.max_bytes:
+                self._rotate()
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(lines)
+
+    def _rotate(self):
+        try:
+            if os.path.getsize(self.path) < self.max_bytes:
+                return
+        except OSError:
+            return  # файла ещё нет
+        for i in range(self.backups - 1, 0, -1):
+            if os.path.exists(f'{self.path}.{i}'):
+                os.replace(f'{self.path}.{i}', f'{self.path}.{i + 1}')
+        if self.backups:
+            os.replace(self.path, f'{self.path}.1')
+        else:
+            os.remove(self.path)
+
+
+class OTLPHttpExporter:
+    """Отправка в OTLP/HTTP-коллектор (например, локальный otel-collector на :4318)"""
+
+    def __init__(self, endpoint, service_name, timeout=2.0):
+        self.endpoint = endpoint
+        self.service_name = service_name
+        self.timeout = timeout
+
+    def write(self, records):
+        body = json.dumps({'resourceSpans': [{
+            'resource': {'attributes': [_otlp_attribute('service.name', self.service_name)]},
+            'scopeSpans': [{
+                'scope': {'name': __name__},
+                'spans': [{
+                    'traceId': record['trace_id'],
+                    'spanId': record['span_id'],
+                    'parentSpanId': record['parent_id'] or '',
+                    'name': record['name'],
+                    'kind': 1,
+                    'startTimeUnixNano': str(record['start_unix_nano']),
+                    'endTimeUnixNano': str(record['start_unix_nano'] + int(record['duration_ms'] * 1_000_000)),
+                    'attributes': [_otlp_attribute(key, value) for key, value in record['attributes'].items()],
+                    'status': {'code': 2, 'message': record['error']} if record['error'] else {},
+                } for record in records],
+            }],
+        }]}).encode()
+        request = urllib.request.Request(self.endpoint, body, {'Content-Type': 'application/json'})
+        urllib.request.urlopen(request, timeout=self.timeout).close()
+
+
+def _otlp_attribute(key, value):
+    if isinstance(value, bool):
+        return {'key': key, 'value': {'boolValue': value}}
+    if isinstance(value, int):
+        return {'key': key, 'value': {'intValue': str(value)}}
+    if isinstance(value, float):
+        return {'key': key, 'value': {'doubleValue': value}}
+    return {'key': key, 'value': {'stringValue': str(value)}}
+
+
+class BackgroundExporter:
+    """Очередь + фоновый поток: запрос не ждёт записи на диск или в сеть"""
+    MAX_QUEUE = 1000
+
+    def __init__(self, exporter):
+        self.exporter = exporter
+        self._queue = queue.Queue(self.MAX_QUEUE)
+        self._pid = None
+        self._lock = threading.Lock()
+        self._failing = False
+
+    def export(self, records):
+        self._ensure_thread()
+        try:
+            self._queue.put_nowait(records)
+        except queue.Full:
+            pass  # при перегрузке трассы теряем, а не тормозим запросы
+
+    def _ensure_thread(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                threading.Thread(target=self._run, name='trace-exporter', daemon=True).start()
+
+    def _run(self):
+        while True:
+            records = self._queue.get()
+            try:
+                self.exporter.write(records)
+                self._failing = False
+            except Exception as e:
+                # Пишем в лог один раз на каждую серию ошибок
+                if not self._failing:
+                    logger.warning(f"Не удалось экспортировать трассы: {e}")
+                self._failing = True
+
+
+_exporter = None
+
+
+def get_exporter():
+    global _exporter
+    if _exporter is None:
+        if getattr(settings, 'TRACING_EXPORTER', 'jsonl') == 'otlp':
+            exporter = OTLPHttpExporter(
+                getattr(settings, 'TRACING_OTLP_ENDPOINT', 'http://127.0.0.1:4318/v1/traces'),
+                getattr(settings, 'TRACING_SERVICE_NAME', 'mg_project'),
+            )
+        else:
+            exporter = JsonLinesExporter(
+                getattr(settings, 'TRACING_JSONL_PATH', os.path.join(settings.BASE_DIR, 'traces.jsonl')),
+                max_bytes=getattr(settings, 'TRACING_JSONL_MAX_BYTES', 0),
+                backups=getattr(settings, 'TRACING_JSONL_BACKUPS', 3),
+            )
+        _exporter = BackgroundExporter(exporter)
+    return _exporter
+
+
+def export_spans(spans):
+    """Экспорт закрытых спанов"""
+    records = [span.to_dict() for span in spans]
+    if records:
+        get_exporter().export(records)
+
+
+# --- ЛОГИ ---
+
+class TraceIdFilter(logging.Filter):
+    """Добавляет в запись лога trace_id текущей трассы ('-' вне трассы)"""
+
+    def filter(self, record):
+        record.trace_id = current_trace_id() or '-'
+        return True
@@ -1,7 +1,7 @@
 from django.contrib.auth import views as auth_views
 from django.contrib.auth.views import LogoutView
 from django.conf import settings
-from django.urls import path, include
+from django.urls import path, include, re_path
 from django.conf.urls.static import static
 from tasks_app.views import TaskUpdateView
 
@@ -10,7 +10,8 @@ from .views import (
     CustomLoginView, RegisterView, UserListView, UserUpdateView,
     home_dashboard_view, profile_view, tasks_view, reports_view,
     settings_view, get_positions, upload_avatar, UserDeleteView,
-    task_create_view, upload_team_photo, telegram_login, task_signup_toggle
+    task_create_view, upload_team_photo, telegram_login, task_signup_toggle,
+    serve_media, serve_static, team_photo_status, issue_telegram_login_token, metrics_view,
 )
 
 urlpatterns = [
@@ -20,6 +21,7 @@ urlpatterns = [
     path('register/', RegisterView.as_view(), name='register'),
     path('upload-avatar/', upload_avatar, name='upload_avatar'),
     path('upload-team-photo/', upload_team_photo, name='upload_team_photo'),
+    path('upload-team-photo/status/', team_photo_status, name='team_photo_status'),
 
     # === AJAX ===
     path('get-positions/', get_positions, name='get_positions'),
@@ -34,6 +36,7 @@ urlpatterns = [
     path('users/<int:pk>/delete/', UserDeleteView.as_view(), name='user_delete'),
 
     path("telegram-login/", telegram_login, name="telegram_login"),
+    path("api/telegram/login-token/", issue_telegram_login_token, name="api_telegram_login_token"),
 
     # === ЗАДАЧИ ===
     path('tasks/', tasks_view, name='tasks'),
@@ -45,6 +48,7 @@ urlpatterns = [
     # === ОСТАЛЬНЫЕ РАЗДЕЛЫ ===
     path('reports/', reports_view, name='reports'),
     path('settings/', settings_view, name='settings'),
+    path('metrics/', metrics_view, name='metrics'),
 
     # === СБРОС ПАРОЛЯ (должны идти ПОСЛЕ всех остальных, особенно после /create/) ===
     path('password_reset/', auth_views.PasswordResetView.as_view(
@@ -75,4 +79,7 @@ urlpatterns = [
 # Медиафайлы в DEBUG
 if settings.DEBUG:
     urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+    urlpatterns += static(settings.MEDIA_URL, view=serve_media, document_root=settings.MEDIA_ROOT)
+# Собранная статика без DEBUG (если её не отдаёт nginx)
+elif settings.SERVE_STATIC:
+    urlpatterns += [re_path(rf'^{settings.STATIC_URL.lstrip("/")}(?P<path>.*)$', serve_static)]
@@ -3,24 +3,43 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.views import LoginView
 from django.views.decorators.csrf import csrf_exempt
 from django.views.generic import ListView, CreateView, UpdateView
-from django.urls import reverse_lazy
+from django.urls import reverse, reverse_lazy
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.views.decorators.http import require_GET
 from django import forms
-from django.http import Http404, HttpResponseBadRequest
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseBadRequest, HttpResponseNotModified
+from django.utils.http import http_date, parse_etags, quote_etag
+import hashlib
+import json
 import logging
+import mimetypes
+import os
+import uuid
 from django.http import JsonResponse
 from django.contrib.auth.decorators import login_required
 from django.views.generic import DeleteView
 from django.contrib.messages.views import SuccessMessageMixin
 from django.contrib import messages
-from django.core.files.uploadedfile import InMemoryUploadedFile
-from io import BytesIO
-from PIL import Image
+from django.core.files.base import ContentFile
+from django.core.exceptions import SuspiciousFileOperation
+from django.utils._os import safe_join
 from django.contrib.auth import login
 from django.db import models
 
+from django.views.static import serve
+from django.conf import settings
+
+from . import metrics, tracing
+from .dashboard import get_dashboard
 from .forms import UserLoginForm, UserRegistrationForm
+from .images import (
+    AVATAR_DEFAULT_SIZE, AVATAR_MAX_BYTES, AVATAR_MAX_PIXELS, TEAM_PHOTO_MAX_BYTES, TEAM_PHOTO_MAX_PIXELS,
+    ImageTooLargeError, check_image_limits, encode_team_photo, process_avatar,
+)
+from .jobs import enqueue, job, job_files_storage
+from .lookups import available_positions
+from .storage import is_content_hashed, is_hashed_static, versioned_url
+from .telegram_tokens import issue_login_token, login_token_ttl, redeem_login_token
 from .models import CustomUser, Position, District
 from tasks_app.models import Task
 
@@ -70,22 +89,29 @@ class UserUpdateForm(forms.ModelForm):
 # --- AJAX ВЬЮХА ДЛЯ ДОЛЖНОСТЕЙ ---
 @require_GET
 def get_positions(request):
-    district_id = request.GET.get('district_id')
-    positions = Position.objects.all()
+    """
+    Должности для выбранного района (без занятой должности руководителя).
+    Данные берутся из кэша (users.lookups); повторный запрос с If-None-Match
+    получает 304 без тела.
+    """
+    try:
+        district_id = int(request.GET.get('district_id') or 0)
+    except ValueError:
+        district_id = 0
 
-    if district_id:
-        try:
-            district = District.objects.get(id=district_id)
-            # Ищем должность руководителя (независимо от регистра)
-            head_position = Position.objects.filter(title__iexact="руководитель районного отделения").first()
-            if head_position and CustomUser.objects.filter(district=district, position=head_position).exists():
-                positions = positions.exclude(id=head_position.id)
-        except (ValueError, District.DoesNotExist):
-            pass
+    payload = {'positions': available_positions(district_id)}
+    body = json.dumps(payload, ensure_ascii=False, sort_keys=True)
+    etag = quote_etag(hashlib.md5(body.encode()).hexdigest())
 
-    return JsonResponse({
-        'positions': list(positions.values('id', 'title'))
-    })
+    if etag in parse_etags(request.headers.get('If-None-Match', '')):
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(body, content_type='application/json')
+
+    response['ETag'] = etag
+    # Браузер может хранить ответ, но обязан сверять ETag при каждом запросе
+    response['Cache-Control'] = 'private, no-cache'
+    return response
 
 
 # --- ПРЕДСТАВЛЕНИЯ АУТЕНТИФИКАЦИИ ---
@@ -150,11 +176,11 @@ class UserListView(LoginRequiredMixin, ListView):
         user = request.user
 
         # Проверяем, есть ли у пользователя должность
-        if not user.position:
+        if not user.position_id:
             messages.error(request, "Доступ запрещён: у вас нет должности.")
             raise Http404
 
-        position_title = user.position.title.strip().lower()
+        position_title = user.position_title
 
         allowed_titles = [
             "руководитель районного отделения",
@@ -167,9 +193,43 @@ class UserListView(LoginRequiredMixin, ListView):
 
         return super().dispatch(request, *args, **kwargs)
 
+    paginate_by = 24
+
+    # Только поля, которые реально выводит user_list.html
+    LIST_FIELDS = (
+        'id', 'username', 'first_name', 'last_name', 'middle_name', 'email', 'avatar',
+        'district__id', 'district__name',
+        'position__id', 'position__title',
+    )
+
+    def show_all_districts(self):
+        """Режим «все районы» — ?all=1, либо у пользователя нет района"""
+        return self.request.GET.get('all') == '1' or not self.request.user.district_id
+
     def get_queryset(self):
-        # Показываем всех пользователей кроме себя
-        return CustomUser.objects.exclude(pk=self.request.user.pk).order_by('last_name')
+        # Показываем пользователей своего района (кроме себя), позиция и район — одним JOIN
+        queryset = (
+            CustomUser.objects
+            .exclude(pk=self.request.user.pk)
+            .select_related('position', 'district')
+            .only(*self.LIST_FIELDS)
+        )
+
+        if not self.show_all_districts():
+            queryset = queryset.filter(district_id=self.request.user.district_id)
+
+        # Поиск по фамилии — префиксный, использует индекс (district, last_name)
+        query = self.request.GET.get('q', '').strip()
+        if query:
+            queryset = queryset.filter(last_name__istartswith=query)
+
+        return queryset.order_by('last_name', 'first_name', 'pk')
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['search_query'] = self.request.GET.get('q', '').strip()
+        context['show_all'] = self.show_all_districts()
+        return context
 
 
 class UserDeleteView(LoginRequiredMixin, SuccessMessageMixin, DeleteView):
@@ -182,11 +242,11 @@ class UserDeleteView(LoginRequiredMixin, SuccessMessageMixin, DeleteView):
         user = request.user
         target_user = self.get_object()
 
-        if not user.position or "руководитель" not in user.position.title.lower():
+        if not user.is_leader:
             messages.error(request, "Доступ запрещён: только руководитель может удалять.")
             return redirect('user_list')
 
-        if user.district != target_user.district:
+        if user.district_id != target_user.district_id:
             messages.error(request, "Вы можете удалять только пользователей своего района.")
             return redirect('user_list')
 
@@ -217,9 +277,7 @@ class UserUpdateView(LoginRequiredMixin, UpdateView):
         target_user = self.get_object()
 
         # Если Руководитель редактирует пользователя своего района — полная форма
-        if (user.position and
-                "руководитель" in user.position.title.lower() and
-                user.district == target_user.district):
+        if user.is_leader and user.district_id == target_user.district_id:
             return UserUpdateForm  # Все поля
 
         # Обычный пользователь — только username (и аватар, если добавишь)
@@ -238,8 +296,7 @@ class UserUpdateView(LoginRequiredMixin, UpdateView):
 
     def get_success_url(self):
         # Руководитель → обратно в список
-        if (self.request.user.position and
-                "руководитель" in self.request.user.position.title.lower()):
+        if self.request.user.is_leader:
             return reverse_lazy('user_list')
 
         # Обычный пользователь → в свой профиль
@@ -257,12 +314,14 @@ def home_dashboard_view(request):
     """Главная страница (дашборд)"""
     current_user = request.user
 
-    is_leader = current_user.position and "руководитель" in current_user.position.title.lower()
+    is_leader = current_user.is_leader
 
     context = {
         'page_title': 'Главная',
         'user_data': request.user,
         'is_leader': is_leader,
+        # Виджеты — из кэша пользователя (см. users/dashboard.py)
+        'dashboard': get_dashboard(current_user),
     }
     return render(request, 'users/home_dashboard.html', context)
 
@@ -284,27 +343,35 @@ def tasks_view(request):
 
     tasks = Task.objects.all().order_by('-created_at')
 
-    if current_user.district:
+    if current_user.district_id:
         tasks = tasks.filter(
-            models.Q(district=current_user.district) |
+            models.Q(district_id=current_user.district_id) |
             models.Q(district__isnull=True) |
             ~models.Q(type='district')
         )
 
-    is_leader = current_user.position and (
-        'руководитель' in current_user.position.title.lower() or
-        'заместитель' in current_user.position.title.lower()
-    )
-
-    # Добавляем в каждую задачу список записавшихся из района текущего пользователя (только для лидеров)
-    if is_leader and current_user.district:
-        for task in tasks:
-            task.signed_up_in_district = task.users_signed_up.filter(district=current_user.district)
-            task.signed_up_count_in_district = task.signed_up_in_district.count()
-    else:
-        for task in tasks:
-            task.signed_up_in_district = task.users_signed_up.none()
-            task.signed_up_count_in_district = 0
+    is_leader = current_user.is_leader_or_deputy
+
+    # Записавшиеся из района текущего пользователя (только для лидеров) —
+    # одним запросом на все задачи, а не по запросу на каждую
+    if is_leader and current_user.district_id:
+        tasks = tasks.prefetch_related(models.Prefetch(
+            'users_signed_up',
+            queryset=CustomUser.objects
+                .filter(district_id=current_user.district_id)
+                .only('id', 'first_name', 'last_name', 'username', 'position_id'),
+            to_attr='signed_up_in_district',
+        ))
+
+    # На какие задачи записан сам пользователь — тоже одним запросом
+    my_task_ids = set(current_user.signed_up_tasks.values_list('id', flat=True))
+
+    tasks = list(tasks)
+    for task in tasks:
+        if not hasattr(task, 'signed_up_in_district'):
+            task.signed_up_in_district = []
+        task.signed_up_count_in_district = len(task.signed_up_in_district)
+        task.is_signed_up = task.pk in my_task_ids
 
     context = {
         'page_title': page_title,
@@ -332,8 +399,8 @@ def telegram_login(request):
         messages.error(request, "Токен отсутствует.")
         return redirect('login')
 
-    cache_key = f"telegram_login_{token}"
-    telegram_id = cache.get(cache_key)
+    # Токен одноразовый: погашаем сразу, повторный переход по ссылке уже не сработает
+    telegram_id = redeem_login_token(token)
     if not telegram_id:
         messages.error(request, "Ссылка недействительна или просрочена.")
         return redirect('login')
@@ -355,9 +422,36 @@ def telegram_login(request):
             messages.info(request, "Для завершения привязки Telegram войдите в аккаунт.")
             return redirect('login')
 
-    cache.delete(cache_key)
     return redirect("home")
 
+
+@csrf_exempt
+def issue_telegram_login_token(request):
+    """
+    Эндпоинт для Telegram-бота: выдаёт одноразовую ссылку входа.
+    Защита — тот же токен в заголовке Authorization, что и у api/tasks/create/.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Ожидается метод POST.'}, status=405)
+
+    if request.headers.get('Authorization') != settings.TELEGRAM_BOT_API_TOKEN:
+        logger.warning("Неверный токен бота при запросе ссылки входа")
+        return JsonResponse({'error': 'Доступ запрещён. Неверный токен.'}, status=403)
+
+    try:
+        telegram_id = int(json.loads(request.body).get('telegram_id'))
+    except (json.JSONDecodeError, AttributeError, TypeError, ValueError):
+        return JsonResponse({'error': 'Ожидается JSON с числовым telegram_id.'}, status=400)
+
+    token = issue_login_token(telegram_id)
+    login_url = request.build_absolute_uri(f"{reverse('telegram_login')}?token={token}")
+    return JsonResponse({
+        'token': token,
+        'login_url': login_url,
+        'expires_in': login_token_ttl(),
+    }, status=201)
+
+
 @login_required
 def reports_view(request):
     """Страница отчётов и статистики"""
@@ -387,7 +481,7 @@ def settings_view(request):
     """Страница настроек"""
     current_user = request.user
 
-    is_leader = current_user.position and "руководитель" in current_user.position.title.lower()
+    is_leader = current_user.is_leader
 
     context = {
         'page_title': 'Настройки профиля',
@@ -400,10 +494,21 @@ def settings_view(request):
 @csrf_exempt  # Для простоты (можно заменить на csrf_protect + проверку токена)
 def upload_avatar(request):
     if request.method == 'POST' and request.FILES.get('avatar'):
+        from PIL import Image  # только здесь: не грузим Pillow при старте воркера
+
         user = request.user
-        user.avatar = request.FILES['avatar']
-        user.save()
-        return JsonResponse({'status': 'success', 'avatar_url': user.get_avatar_url()})
+        avatar = request.FILES['avatar']
+        try:
+            # Размер файла и разрешение — ДО декодирования, как у фото команды
+            check_image_limits(avatar, AVATAR_MAX_BYTES, AVATAR_MAX_PIXELS)
+            # Нормализуем и сохраняем все размеры (JPEG + WebP) под хэш-именами
+            user.avatar.name = process_avatar(avatar, storage=user.avatar.storage)
+        except ImageTooLargeError as e:
+            return JsonResponse({'status': 'error', 'message': str(e)}, status=413)
+        except (OSError, Image.DecompressionBombError):
+            return JsonResponse({'status': 'error', 'message': 'Ошибка обработки изображения'}, status=400)
+        user.save(update_fields=['avatar'])
+        return JsonResponse({'status': 'success', 'avatar_url': user.get_avatar_url(AVATAR_DEFAULT_SIZE)})
 
     return JsonResponse({'status': 'error', 'message': 'Invalid request'})
 
@@ -413,53 +518,180 @@ def upload_team_photo(request):
     if request.method != 'POST':
         return JsonResponse({'status': 'error', 'message': 'Метод не разрешён'}, status=405)
 
-    if not request.user.position or "руководитель" not in request.user.position.title.lower():
+    if not request.user.is_leader:
         return JsonResponse({'status': 'error', 'message': 'Доступ запрещён'}, status=403)
 
     if 'team_photo' not in request.FILES:
         return JsonResponse({'status': 'error', 'message': 'Файл не выбран'}, status=400)
 
+    district = request.user.cached_district
+    if not district:
+        return JsonResponse({'status': 'error', 'message': 'У вас не указан район'}, status=400)
+
     original_photo = request.FILES['team_photo']
+    from PIL import Image  # только здесь: не грузим Pillow при старте воркера
 
-    # Открываем изображение через Pillow
+    # Проверяем размер файла и разрешение ДО декодирования
     try:
-        img = Image.open(original_photo)
-
-        # Конвертируем в RGB (на случай PNG с альфа-каналом)
-        if img.mode in ('RGBA', 'P'):
-            img = img.convert('RGB')
-
-        # Максимальная ширина — 1920px (подойдёт для любого экрана)
-        max_width = 1920
-        if img.width > max_width:
-            ratio = max_width / img.width
-            new_height = int(img.height * ratio)
-            img = img.resize((max_width, new_height), Image.LANCZOS)
-
-        # Сохраняем в BytesIO с хорошим качеством
-        output = BytesIO()
-        img.save(output, format='JPEG', quality=90, optimize=True)
-        output.seek(0)
-
-        # Создаём новый файл с тем же именем
-        resized_photo = InMemoryUploadedFile(
-            output,
-            'ImageField',
-            original_photo.name.rsplit('.', 1)[0] + '.jpg',  # сохраняем как JPG
-            'image/jpeg',
-            output.tell(),
-            None
-        )
+        check_image_limits(original_photo, TEAM_PHOTO_MAX_BYTES, TEAM_PHOTO_MAX_PIXELS)
+    except ImageTooLargeError as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=413)
+    except (OSError, Image.DecompressionBombError):
+        return JsonResponse({'status': 'error', 'message': 'Файл не является изображением'}, status=400)
+
+    # Сохраняем загрузку в хранилище файлов заданий — её обработает воркер очереди
+    source_name = job_files_storage().save(f'team_photo/{uuid.uuid4().hex}', original_photo)
+    filename = original_photo.name.rsplit('.', 1)[0] + '.jpg'  # сохраняем как JPG
+    cache.set(team_photo_status_key(district.pk), {'status': 'pending'}, TEAM_PHOTO_STATUS_TIMEOUT)
 
-        # Сохраняем в модель
-        request.user.district.team_photo = resized_photo
-        request.user.district.save()
+    # Декодирование и кодирование — в воркере очереди заданий (manage.py run_jobs), запрос не ждёт
+    enqueue(process_team_photo, args=[district.pk, source_name, filename, tracing.current_context()])
 
-        return JsonResponse({
+    return JsonResponse({
+        'status': 'pending',
+        'status_url': reverse('team_photo_status'),
+    }, status=202)
+
+
+TEAM_PHOTO_STATUS_TIMEOUT = 60 * 60
+
+
+def team_photo_status_key(district_id):
+    return f"team_photo_status_{district_id}"
+
+
+def _team_photo_failed(district_id, source_name, filename, trace_context=None):
+    """Все попытки обработки фото команды исчерпаны: статус — ошибка, загрузку удаляем"""
+    cache.set(team_photo_status_key(district_id), {
+        'status': 'error',
+        'message': 'Ошибка обработки изображения',
+    }, TEAM_PHOTO_STATUS_TIMEOUT)
+    job_files_storage().delete(source_name)
+
+
+@job(max_attempts=2, priority=10, on_failure=_team_photo_failed)
+def process_team_photo(district_id, source_name, filename, trace_context=None):
+    """Задание: уменьшает фото команды, сохраняет в District.team_photo и обновляет статус"""
+    storage = job_files_storage()
+    # Продолжаем трассу запроса, загрузившего фото
+    with tracing.trace('team_photo.process', tuple(trace_context), queries=True) if trace_context else tracing.NOOP_SPAN:
+        with storage.open(source_name) as source:
+            data = encode_team_photo(source)
+        district = District.objects.get(pk=district_id)
+        district.team_photo.save(filename, ContentFile(data))
+        cache.set(team_photo_status_key(district_id), {
             'status': 'success',
-            'photo_url': request.user.district.team_photo.url
-        })
+            'photo_url': versioned_url(district.team_photo),
+        }, TEAM_PHOTO_STATUS_TIMEOUT)
+    storage.delete(source_name)
+
+
+@login_required
+@require_GET
+def team_photo_status(request):
+    """Статус фоновой обработки фото команды (для опроса со страницы настроек)"""
+    if not request.user.district_id:
+        return JsonResponse({'status': 'none'})
+    return JsonResponse(cache.get(team_photo_status_key(request.user.district_id), {'status': 'none'}))
+
+
+# --- МЕДИАФАЙЛЫ ---
+# Файлы с хэшем содержимого в имени никогда не меняются — кэшируем их «навсегда».
+# То же для URL с версией (?v=<mtime>, см. storage.versioned_url): новый файл —
+# новый URL. Остальное браузер сверяет по ETag/Last-Modified и получает 304.
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+REVALIDATE_CACHE_CONTROL = 'public, no-cache'
+
+
+def serve_media(request, path, document_root=None):
+    """Отдача медиа (в DEBUG) с долгим кэшированием и условными запросами"""
+    try:
+        stat = os.stat(safe_join(document_root, path))
+    except (OSError, SuspiciousFileOperation):
+        # 404 и проверки пути — как в django.views.static.serve
+        return serve(request, path, document_root=document_root)
+
+    etag = quote_etag(f'{stat.st_mtime_ns:x}-{stat.st_size:x}')
+    if etag in parse_etags(request.headers.get('If-None-Match', '')):
+        response = HttpResponseNotModified()
+        response['Last-Modified'] = http_date(stat.st_mtime)
+    else:
+        # If-Modified-Since serve() проверяет сам
+        response = serve(request, path, document_root=document_root)
+
+    response['ETag'] = etag
+    if is_content_hashed(path) or request.GET.get('v'):
+        response['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+    else:
+        response['Cache-Control'] = REVALIDATE_CACHE_CONTROL
+    return response
+
 
-    except Exception as e:
-        return JsonResponse({'status': 'error', 'message': 'Ошибка обработки изображения'}, status=500)
+# Статика из STATIC_ROOT (после collectstatic), если её не отдаёт nginx:
+# имена с хэшем — immutable, готовые .br/.gz — по Accept-Encoding
+STATIC_ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+
+def serve_static(request, path):
+    """Отдача собранной статики с предсжатыми копиями и долгим кэшированием"""
+    try:
+        fullpath = safe_join(settings.STATIC_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404
+    if not os.path.isfile(fullpath):
+        raise Http404
+
+    accepted = request.headers.get('Accept-Encoding', '')
+    encoding = None
+    for name, ext in STATIC_ENCODINGS:
+        if name in accepted and os.path.isfile(fullpath + ext):
+            encoding, fullpath = name, fullpath + ext
+            break
+
+    stat = os.stat(fullpath)
+    etag = quote_etag(f'{stat.st_mtime_ns:x}-{stat.st_size:x}' + (f'-{encoding}' if encoding else ''))
+    if etag in parse_etags(request.headers.get('If-None-Match', '')):
+        response = HttpResponseNotModified()
+    else:
+        content_type, _ = mimetypes.guess_type(path)
+        response = FileResponse(open(fullpath, 'rb'), content_type=content_type or 'application/octet-stream')
+        if encoding:
+            response['Content-Encoding'] = encoding
 
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    response['Vary'] = 'Accept-Encoding'
+    response['Cache-Control'] = IMMUTABLE_CACHE_CONTROL if is_hashed_static(path) else REVALIDATE_CACHE_CONTROL
+    return response
+
+
+# --- МЕТРИКИ ---
+# Счётчики CircuitBreakerCache.stats() → описание для /metrics/
+CACHE_BACKEND_COUNTERS = {
+    'hits': "Попаданий в кэш",
+    'misses': "Промахов кэша",
+    'errors': "Ошибок Redis",
+    'fallback_calls': "Обращений к локальному кэшу в обход Redis",
+    'trips': "Срабатываний предохранителя",
+}
+
+
+@require_GET
+def metrics_view(request):
+    """Метрики запросов в текстовом формате Prometheus (только для сотрудников)"""
+    if not request.user.is_staff:
+        raise Http404
+    counters, gauges = {}, {}
+    if hasattr(cache, 'stats'):
+        stats = cache.stats()
+        counters = {
+            f'cache_backend_{name}_total': (help_text, stats[name])
+            for name, help_text in CACHE_BACKEND_COUNTERS.items()
+        }
+        gauges['cache_backend_circuit_open'] = (
+            "Redis отключён предохранителем (1 — да)", int(stats['state'] == 'open'),
+        )
+    return HttpResponse(
+        metrics.registry.render_prometheus(counters, gauges),
+        content_type='text/plain; version=0.0.4; charset=utf-8',
+    )